@@ -0,0 +1,285 @@
+"""
+API JSON versionada (/api/v1) de clientes, reservas, habitaciones y pagos.
+
+Usa las mismas piezas que las rutas HTML: los listados de consultas.py con la
+paginación por clave de paginacion.py, las validaciones de validaciones.py y
+las transiciones de estados.py. La sesión es la misma cookie que la web
+(POST /api/v1/sesion para iniciarla sin formulario).
+
+Cada GET lleva un ETag calculado con las versiones de las tablas de las que
+depende (condicional.py): si el cliente manda If-None-Match y nada cambió,
+responde 304 sin ejecutar la consulta.
+
+    GET  /api/v1/reservas?estado=Confirmada&campos=id,habitacion,estado&por_pagina=100
+    GET  /api/v1/reservas?cursor=<siguiente>
+    GET  /api/v1/habitaciones/3
+    POST /api/v1/reservas                  {"cliente_id": 1, "habitacion": "101", ...}
+    POST /api/v1/reservas/7/estado         {"estado": "Ocupada"}
+"""
+
+import json
+import sqlite3
+from collections import namedtuple
+from functools import wraps
+
+from flask import Blueprint, Response, request, session
+from werkzeug.security import check_password_hash
+
+import consultas
+from condicional import depende_de
+import database
+import disponibilidad
+import estados
+import eventos
+from eventos import registrar_cambio as _evento
+import paginacion
+import validaciones
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la biblioteca estándar
+    orjson = None
+
+VERSION = 'v1'
+
+bp = Blueprint('api', __name__, url_prefix=f'/api/{VERSION}')
+
+# listado: función de consultas.py; filtros: parámetros que acepta
+# validar: validación de altas (None: solo lectura)
+# tablas: de las que dependen sus respuestas (para el ETag)
+Recurso = namedtuple('Recurso', 'listado filtros validar tablas')
+
+RECURSOS = {
+    'clientes': Recurso(consultas.listado_clientes, ('termino', 'campo'),
+                        validaciones.validar_cliente, ('clientes',)),
+    'reservas': Recurso(consultas.listado_reservas, ('termino', 'estado', 'fecha_desde', 'fecha_hasta'),
+                        validaciones.validar_reserva, ('reservas', 'clientes', 'pagos')),
+    'habitaciones': Recurso(consultas.listado_habitaciones, ('estado', 'tipo'),
+                            validaciones.validar_habitacion, ('habitaciones',)),
+    'pagos': Recurso(consultas.listado_pagos, ('estado', 'metodo'),
+                     None, ('pagos', 'clientes', 'reservas')),
+}
+
+_RECURSO = '<any(clientes, reservas, habitaciones, pagos):recurso>'
+
+
+def serializar(datos):
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+
+
+def _json(datos, estado=200):
+    return Response(serializar(datos), status=estado, mimetype='application/json')
+
+
+def _error(mensaje, estado):
+    return _json({'error': mensaje}, estado)
+
+
+def requiere_sesion(f):
+    @wraps(f)
+    def decorada(*args, **kwargs):
+        if 'user_id' not in session:
+            return _error('Debes iniciar sesión.', 401)
+        return f(*args, **kwargs)
+    return decorada
+
+
+def _cuerpo():
+    """Cuerpo JSON de la petición; {} si falta o no es un objeto"""
+    datos = request.get_json(silent=True)
+    return datos if isinstance(datos, dict) else {}
+
+
+def _campos():
+    valor = request.args.get('campos', '')
+    return [campo.strip() for campo in valor.split(',') if campo.strip()] or None
+
+
+def _dict(fila, campos=None):
+    """Fila como dict sin las columnas auxiliares de la paginación, o solo `campos`"""
+    if campos:
+        return {campo: fila[campo] for campo in campos}
+    return {k: fila[k] for k in fila.keys() if not k.startswith('_clave') and k not in eventos.OCULTAS}
+
+
+# ========== SESIÓN ==========
+
+@bp.route('/sesion', methods=['POST'])
+def iniciar_sesion():
+    datos = _cuerpo()
+    username = validaciones.sanitize_input(str(datos.get('username') or ''))
+    password = str(datos.get('password') or '')
+    with database.conexion() as conn:
+        user = conn.execute('SELECT * FROM usuarios WHERE username = ?', (username,)).fetchone()
+    if not user or not check_password_hash(user['password'], password):
+        return _error('Usuario o contraseña incorrectos.', 401)
+    session['user_id'] = user['id']
+    session['username'] = user['username']
+    return _json({'id': user['id'], 'username': user['username']})
+
+
+@bp.route('/sesion', methods=['DELETE'])
+def cerrar_sesion():
+    session.clear()
+    return Response(status=204)
+
+
+# ========== LECTURA ==========
+
+@bp.route(f'/{_RECURSO}')
+@requiere_sesion
+@depende_de(lambda recurso: RECURSOS[recurso].tablas, mensajes=False)
+def listar(recurso):
+    definicion = RECURSOS[recurso]
+    campos = _campos()
+    with database.conexion() as conn:
+        listado = definicion.listado(*(request.args.get(f, '') for f in definicion.filtros))
+        pagina = paginacion.paginar(conn.cursor(), listado,
+                                    token=request.args.get('cursor'),
+                                    por_pagina=paginacion.leer_por_pagina(request.args.get('por_pagina')),
+                                    con_total=request.args.get('total') == '1')
+
+    if campos and pagina.filas:
+        desconocidos = [campo for campo in campos if campo not in pagina.filas[0].keys()]
+        if desconocidos:
+            return _error(f"Campos desconocidos: {', '.join(desconocidos)}", 400)
+    cuerpo = {
+        'datos': [_dict(fila, campos) for fila in pagina.filas],
+        'siguiente': pagina.siguiente,
+        'anterior': pagina.anterior,
+    }
+    if pagina.total is not None:
+        cuerpo['total'] = pagina.total
+    return _json(cuerpo)
+
+
+@bp.route(f'/{_RECURSO}/<int:id>')
+@requiere_sesion
+@depende_de(lambda recurso, id: (recurso,), mensajes=False)  # la fila solo depende de su tabla
+def obtener(recurso, id):
+    campos = _campos()
+    with database.conexion() as conn:
+        fila = conn.execute(f"SELECT * FROM {recurso} WHERE id = ?", (id,)).fetchone()
+
+    if fila is None:
+        return _error(f'{recurso} {id} no encontrado.', 404)
+    if campos:
+        desconocidos = [campo for campo in campos if campo not in fila.keys()]
+        if desconocidos:
+            return _error(f"Campos desconocidos: {', '.join(desconocidos)}", 400)
+    return _json(_dict(fila, campos))
+
+
+# ========== ESCRITURA ==========
+
+# Claves foráneas de cada alta (columna, tabla referida, columna referida):
+# foreign_keys está desactivado, así que se comprueban a mano
+REFERENCIAS = {
+    'reservas': [('cliente_id', 'clientes', 'id'), ('habitacion', 'habitaciones', 'numero')],
+}
+
+
+def _referencias_inexistentes(conn, recurso, datos):
+    """Mensajes de las claves foráneas de `datos` que no existen (como importacion)"""
+    faltan = []
+    for columna, referida, clave in REFERENCIAS.get(recurso, []):
+        if conn.execute(f"SELECT 1 FROM {referida} WHERE {clave} = ?", (datos[columna],)).fetchone() is None:
+            faltan.append(f"{columna} {datos[columna]} no existe en {referida}")
+    return faltan
+
+
+def _crear_reserva(conn, datos):
+    """Como crear_reserva en la web: reserva, pago automático y habitación marcada"""
+    habitacion_antes = eventos.fila(conn, 'habitaciones', datos['habitacion'], 'numero')
+    reserva_id, pago_id = disponibilidad.reservar_con_pago(
+        conn, datos['cliente_id'], datos['habitacion'], datos['fecha_entrada'], datos['fecha_salida'],
+        datos['num_personas'], datos['precio_total'], datos['estado'], datos['notas'])
+    habitacion_despues = eventos.fila(conn, 'habitaciones', datos['habitacion'], 'numero')
+    cambios = [
+        ('crear', 'reservas', None, eventos.fila(conn, 'reservas', reserva_id)),
+        ('crear', 'pagos', None, eventos.fila(conn, 'pagos', pago_id)),
+    ]
+    if habitacion_despues != habitacion_antes:
+        cambios.append(('actualizar', 'habitaciones', habitacion_antes, habitacion_despues))
+    return reserva_id, cambios
+
+
+@bp.route(f'/{_RECURSO}', methods=['POST'])
+@requiere_sesion
+def crear(recurso):
+    definicion = RECURSOS[recurso]
+    if definicion.validar is None:
+        return _error(f'{recurso} no admite altas por la API.', 405)
+    try:
+        datos = definicion.validar(_cuerpo())
+        # Las altas empiezan en un estado inicial; el resto se alcanza con /estado
+        if recurso in estados.INICIALES:
+            estados.validar_inicial(recurso, datos['estado'])
+    except ValueError as e:
+        return _error(str(e), 400)
+    datos.pop('id', None)
+
+    with database.conexion() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            faltan = _referencias_inexistentes(conn, recurso, datos)
+            if faltan:
+                conn.rollback()
+                return _error("; ".join(faltan), 422)
+            if recurso == 'reservas':
+                nuevo_id, cambios = _crear_reserva(conn, datos)
+            else:
+                columnas = ", ".join(datos)
+                marcadores = ", ".join("?" for _ in datos)
+                cursor = conn.execute(f"INSERT INTO {recurso} ({columnas}) VALUES ({marcadores})",
+                                      list(datos.values()))
+                nuevo_id = cursor.lastrowid
+                cambios = [('crear', recurso, None, eventos.fila(conn, recurso, nuevo_id))]
+            fila = conn.execute(f"SELECT * FROM {recurso} WHERE id = ?", (nuevo_id,)).fetchone()
+            conn.commit()
+        except disponibilidad.HabitacionNoDisponible as e:
+            conn.rollback()
+            return _error(str(e), 409)
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            return _error(f'Conflicto con un registro existente: {e}', 409)
+        except ValueError as e:
+            conn.rollback()
+            return _error(str(e), 400)
+
+    for cambio in cambios:
+        _evento(*cambio)
+    respuesta = _json(_dict(fila), 201)
+    respuesta.headers['Location'] = f"{bp.url_prefix}/{recurso}/{nuevo_id}"
+    return respuesta
+
+
+@bp.route('/<any(reservas, habitaciones):recurso>/<int:id>/estado', methods=['POST'])
+@requiere_sesion
+def cambiar_estado(recurso, id):
+    destino = str(_cuerpo().get('estado') or '')
+    with database.conexion() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            antes = eventos.fila(conn, recurso, id)
+            if recurso == 'reservas':
+                habitacion_antes = antes and eventos.fila(conn, 'habitaciones', antes['habitacion'], 'numero')
+                fila, habitacion = estados.cambiar_reserva(conn, id, destino)
+            else:
+                fila, habitacion = estados.cambiar_habitacion(conn, id, destino), None
+            conn.commit()
+        except estados.TransicionNoPermitida as e:
+            conn.rollback()
+            return _error(str(e), 409 if antes else 404)
+        except disponibilidad.HabitacionNoDisponible as e:
+            conn.rollback()
+            return _error(str(e), 409)
+
+    _evento('cambiar_estado', recurso, antes, dict(fila))
+    cuerpo = _dict(fila)
+    if habitacion:
+        _evento('cambiar_estado', 'habitaciones', habitacion_antes, dict(habitacion))
+        cuerpo['habitacion_estado'] = habitacion['estado']
+    return _json(cuerpo)
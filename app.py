@@ -1,18 +1,71 @@
-from flask import Flask, request, render_template, redirect, session, url_for, flash
+from flask import Flask, request, render_template, redirect, session, url_for, flash, jsonify, Response, stream_with_context, stream_template
 import database
+import api
+import auditoria
+import busqueda
+import compresion
+import condicional
+import consultas
+import disponibilidad
+import estadisticas
+import estados
+import estaticos
+import eventos
+import exportacion
+import fix_pagos_reservas
+import fragmentos
+import imagenes
+import ingresos
+import metricas
+import ocupacion
+import paginacion
+import reserva_publica
+import hmac
+import json
+import os
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-import re
+from validaciones import validate_email, validate_phone, sanitize_input
+from condicional import depende_de
+from eventos import registrar_cambio as _evento
 from datetime import datetime
 
 # Crear la aplicación Flask
 app = Flask(__name__)
 app.secret_key = 'hotel-ve2-secret-key-2025'  # Clave secreta para sesiones
 
+# Latencia, SQL y filas por ruta (/metrics); se registra antes que el resto de hooks
+metricas.registrar(app)
+
 # Inicializamos la base de datos (crea tablas si no existen)
 database.init_db()
 
+# API JSON (/api/v1) para integraciones
+app.register_blueprint(api.bp)
+
+# URL con huella y caché de un año para static/ (fotos incluidas)
+estaticos.registrar(app)
+
+# Compresión gzip de las respuestas (HOTEL_COMPRIMIR=1)
+compresion.registrar(app)
+
+# Fotos que quedaron a medio procesar en la ejecución anterior
+imagenes.reanudar()
+
+# Corrección periódica de pagos y reservas en segundo plano (opcional, en segundos)
+if os.environ.get('HOTEL_CORREGIR_PAGOS_CADA'):
+    fix_pagos_reservas.programar(int(os.environ['HOTEL_CORREGIR_PAGOS_CADA']))
+
+@app.after_request
+def invalidar_estadisticas(response):
+    """Tras una escritura de este worker, el panel comprueba las versiones de las tablas
+    y los fragmentos compartidos reciben marcadores nuevos"""
+    if request.method not in ('GET', 'HEAD'):
+        estadisticas.invalidar()
+        fragmentos.publicar()
+    return response
+
 # ========== FUNCIONES DE VALIDACIÓN Y AUTENTICACIÓN ==========
 
 def login_required(f):
@@ -25,22 +78,48 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def validate_email(email):
-    """Valida formato de email"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+def _pagina_listado(cursor, listado):
+    """Página del listado según los parámetros cursor, por_pagina y total de la petición"""
+    pagina = paginacion.paginar(cursor, listado,
+                                token=request.args.get('cursor'),
+                                por_pagina=paginacion.leer_por_pagina(request.args.get('por_pagina')),
+                                con_total=request.args.get('total') == '1')
+    # Los enlaces conservan los filtros actuales
+    argumentos = request.args.to_dict()
+    argumentos.update(request.view_args or {})
+    if pagina.siguiente:
+        pagina.url_siguiente = url_for(request.endpoint, **dict(argumentos, cursor=pagina.siguiente))
+    if pagina.anterior:
+        pagina.url_anterior = url_for(request.endpoint, **dict(argumentos, cursor=pagina.anterior))
+    return pagina
+
+# Bytes de HTML que se juntan antes de enviar cada trozo de una plantilla en streaming
+TROZO_STREAMING = 16 * 1024
+
+def _agrupar(trozos, tamano=TROZO_STREAMING):
+    """El primer trozo sale enseguida; el resto, en bloques de `tamano` bytes"""
+    bloque, acumulado, primero = [], 0, True
+    for trozo in trozos:
+        bloque.append(trozo)
+        acumulado += len(trozo)
+        if primero or acumulado >= tamano:
+            yield ''.join(bloque)
+            bloque, acumulado, primero = [], 0, False
+    if bloque:
+        yield ''.join(bloque)
 
-def validate_phone(phone):
-    """Valida formato de teléfono"""
-    clean_phone = re.sub(r'[^\d+]', '', phone)
-    return len(clean_phone) >= 7
+def _plantilla_en_streaming(plantilla, **contexto):
+    """Envía la plantilla a medida que se renderiza.
 
-def sanitize_input(text):
-    """Sanitiza texto de entrada"""
-    if not text:
-        return ""
-    text = re.sub(r'[<>"\']', '', text)
-    return text.strip()
+    Las consultas se hacen antes, al preparar el contexto: una vez enviadas
+    las cabeceras, un error de la base ya no podría convertirse en un mensaje
+    ni en otro código de estado. Con mensajes flash pendientes se renderiza
+    entera: al leerlos en mitad del streaming la cookie de sesión ya habría
+    salido sin el cambio.
+    """
+    if session.get('_flashes'):
+        return render_template(plantilla, **contexto)
+    return Response(_agrupar(stream_template(plantilla, **contexto)), mimetype='text/html')
 
 # Ruta principal: dashboard con botones de navegación
 @app.route("/")
@@ -51,47 +130,23 @@ def home():
 
 # Ruta para la lista de clientes
 @app.route("/clientes", methods=['GET', 'POST'])
+@depende_de('clientes')
 def lista_clientes():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
     # Obtener parámetros de filtro
     termino_busqueda = request.args.get('termino', '')
     campo_filtro = request.args.get('campo', 'todos')
     
-    # Construir la consulta base
-    query = "SELECT * FROM clientes"
-    params = []
-    
-    # Aplicar filtros
-    if termino_busqueda:
-        if campo_filtro == 'nombre':
-            query += " WHERE nombre LIKE ?"
-            params.append(f"%{termino_busqueda}%")
-        elif campo_filtro == 'identificacion':
-            query += " WHERE identificacion LIKE ?"
-            params.append(f"%{termino_busqueda}%")
-        elif campo_filtro == 'correo':
-            query += " WHERE correo LIKE ?"
-            params.append(f"%{termino_busqueda}%")
-        elif campo_filtro == 'telefono':
-            query += " WHERE telefono LIKE ?"
-            params.append(f"%{termino_busqueda}%")
-        else:  # todos los campos
-            query += " WHERE nombre LIKE ? OR identificacion LIKE ? OR correo LIKE ? OR telefono LIKE ? OR direccion LIKE ?"
-            params.extend([f"%{termino_busqueda}%", f"%{termino_busqueda}%", f"%{termino_busqueda}%", f"%{termino_busqueda}%", f"%{termino_busqueda}%"])
-    
-    query += " ORDER BY nombre ASC"
-    
-    cursor.execute(query, params)
-    clientes = cursor.fetchall()
-    conn.close()
+    # Con término se ordena por relevancia, sin él por nombre
+    listado = consultas.listado_clientes(termino_busqueda, campo_filtro)
+    with database.conexion() as conn:
+        clientes = _pagina_listado(conn.cursor(), listado)
     
     return render_template("clientes.html", 
                          clientes=clientes, 
+                         pagina=clientes,
                          termino_busqueda=termino_busqueda,
                          campo_filtro=campo_filtro)
 
@@ -100,11 +155,10 @@ def lista_clientes():
 def gestion_usuarios():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM usuarios")
-    usuarios = cursor.fetchall()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM usuarios")
+        usuarios = cursor.fetchall()
     return render_template("usuarios.html", usuarios=usuarios)
 
 # Ruta para agregar un cliente (solo autenticado)
@@ -131,12 +185,13 @@ def agregar_cliente():
         return redirect("/agregar_cliente")
     
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono) VALUES (?, ?, ?, ?, ?)", 
-                      (nombre, identificacion, direccion, correo, telefono))
-        conn.commit()
-        conn.close()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono) VALUES (?, ?, ?, ?, ?)", 
+                          (nombre, identificacion, direccion, correo, telefono))
+            despues = eventos.fila(conn, 'clientes', cursor.lastrowid)
+            conn.commit()
+        _evento('crear', 'clientes', despues=despues)
         flash('Cliente agregado exitosamente.', 'success')
     except sqlite3.IntegrityError:
         flash('Ya existe un cliente con esa identificación.', 'danger')
@@ -157,11 +212,13 @@ def pagina_agregar_cliente():
 def eliminar_cliente(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM clientes WHERE id = ?", (id,))  # Elimina el cliente
-    conn.commit()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        antes = eventos.fila(conn, 'clientes', id)
+        cursor.execute("DELETE FROM clientes WHERE id = ?", (id,))  # Elimina el cliente
+        conn.commit()
+    if antes:
+        _evento('eliminar', 'clientes', antes)
     return redirect("/clientes")
 
 # Ruta para eliminar un usuario por id (solo autenticado)
@@ -173,11 +230,13 @@ def eliminar_usuario(id):
     if id == session['user_id']:
         flash('No puedes eliminar tu propia cuenta.', 'danger')
         return redirect("/usuarios")
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM usuarios WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        antes = eventos.fila(conn, 'usuarios', id)
+        cursor.execute("DELETE FROM usuarios WHERE id = ?", (id,))
+        conn.commit()
+    if antes:
+        _evento('eliminar', 'usuarios', antes)
     flash('Usuario eliminado exitosamente.', 'success')
     return redirect("/usuarios")
 
@@ -204,11 +263,12 @@ def register():
         
         hashed_password = generate_password_hash(password)
         try:
-            conn = database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO usuarios (username, password) VALUES (?, ?)', (username, hashed_password))
-            conn.commit()
-            conn.close()
+            with database.conexion() as conn:
+                cursor = conn.cursor()
+                cursor.execute('INSERT INTO usuarios (username, password) VALUES (?, ?)', (username, hashed_password))
+                despues = eventos.fila(conn, 'usuarios', cursor.lastrowid)
+                conn.commit()
+            _evento('crear', 'usuarios', despues=despues)
             flash('Usuario registrado exitosamente. Inicia sesión.', 'success')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
@@ -226,11 +286,10 @@ def login():
             flash('Usuario y contraseña son obligatorios.', 'danger')
             return render_template('login.html')
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM usuarios WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM usuarios WHERE username = ?', (username,))
+            user = cursor.fetchone()
         
         if user and check_password_hash(user['password'], password):
             session['user_id'] = user['id']
@@ -256,64 +315,30 @@ def buscar_cliente():
     resultados = []
     if request.method == 'POST':
         termino = request.form['termino']
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM clientes WHERE nombre LIKE ?", (f"%{termino}%",))
-        resultados = cursor.fetchall()
-        conn.close()
+        with database.conexion() as conn:
+            resultados = busqueda.buscar_clientes(conn.cursor(), termino, ['nombre'])
     return render_template('buscar.html', resultados=resultados)
 
 # Lista reservas
 @app.route('/reservas', methods=['GET', 'POST'])
+@depende_de('reservas', 'clientes', 'pagos')
 def lista_reservas():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
     # Filtros
     termino_busqueda = request.args.get('termino', '')
     estado_filtro = request.args.get('estado', '')
     fecha_desde = request.args.get('fecha_desde', '')
     fecha_hasta = request.args.get('fecha_hasta', '')
     
-    # Query base
-    query = """
-        SELECT r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono,
-               p.estado as estado_pago, p.monto as monto_pago, p.metodo as metodo_pago
-        FROM reservas r 
-        JOIN clientes c ON r.cliente_id = c.id 
-        LEFT JOIN pagos p ON r.id = p.reserva_id
-        WHERE 1=1
-    """
-    params = []
-    
-    # Aplicar filtros
-    if termino_busqueda:
-        query += " AND (c.nombre LIKE ? OR c.identificacion LIKE ? OR r.habitacion LIKE ?)"
-        params.extend([f"%{termino_busqueda}%", f"%{termino_busqueda}%", f"%{termino_busqueda}%"])
-    
-    if estado_filtro:
-        query += " AND r.estado = ?"
-        params.append(estado_filtro)
-    
-    if fecha_desde:
-        query += " AND r.fecha_entrada >= ?"
-        params.append(fecha_desde)
-    
-    if fecha_hasta:
-        query += " AND r.fecha_entrada <= ?"
-        params.append(fecha_hasta)
+    listado = consultas.listado_reservas(termino_busqueda, estado_filtro, fecha_desde, fecha_hasta)
+    with database.conexion() as conn:
+        reservas = _pagina_listado(conn.cursor(), listado)
     
-    query += " ORDER BY r.fecha_entrada ASC"
-    
-    cursor.execute(query, params)
-    reservas = cursor.fetchall()
-    conn.close()
-    
-    return render_template('reservas.html', 
+    return _plantilla_en_streaming('reservas.html', 
                          reservas=reservas, 
+                         pagina=reservas,
                          termino_busqueda=termino_busqueda,
                          estado_filtro=estado_filtro,
                          fecha_desde=fecha_desde,
@@ -327,11 +352,8 @@ def buscar_reserva():
     resultados = []
     if request.method == 'POST':
         termino = request.form['termino']
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM clientes WHERE nombre LIKE ? OR identificacion LIKE ?", (f"%{termino}%", f"%{termino}%"))
-        resultados = cursor.fetchall()
-        conn.close()
+        with database.conexion() as conn:
+            resultados = busqueda.buscar_clientes(conn.cursor(), termino, ['nombre', 'identificacion'])
     return render_template('buscar_reserva.html', resultados=resultados)
 
 # Crear reserva
@@ -349,50 +371,44 @@ def crear_reserva(cliente_id):
         estado = request.form['estado']
         notas = request.form['notas']
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # Crear reserva
-            cursor.execute('''
-                INSERT INTO reservas (cliente_id, habitacion, fecha_entrada, fecha_salida, 
-                                     num_personas, precio_total, estado, notas, timestamp) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas, precio_total, estado, notas))
-            
-            # Obtener ID de reserva
-            reserva_id = cursor.lastrowid
+        with database.conexion() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                habitacion_antes = eventos.fila(conn, 'habitaciones', habitacion, 'numero')
             
-            # Crear pago automático
-            from datetime import datetime
-            fecha_actual = datetime.now().strftime('%Y-%m-%d')
+                # Crear reserva, pago automático y marcar la habitación
+                # (falla si la habitación ya está ocupada en esas fechas)
+                reserva_id, pago_id = disponibilidad.reservar_con_pago(
+                    conn, cliente_id, habitacion, fecha_entrada, fecha_salida,
+                    num_personas, precio_total, estado, notas)
             
-            cursor.execute('''
-                INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (reserva_id, cliente_id, precio_total, fecha_actual, 'Pendiente', 'Pendiente', 
-                  f'RES-{reserva_id}', f'Pago automático por reserva #{reserva_id}'))
+                habitacion_despues = eventos.fila(conn, 'habitaciones', habitacion, 'numero')
+                cambios = [
+                    ('crear', 'reservas', None, eventos.fila(conn, 'reservas', reserva_id)),
+                    ('crear', 'pagos', None, eventos.fila(conn, 'pagos', pago_id)),
+                ]
+                if habitacion_despues != habitacion_antes:
+                    cambios.append(('actualizar', 'habitaciones', habitacion_antes, habitacion_despues))
             
-            # Actualizar habitación
-            cursor.execute("UPDATE habitaciones SET estado = 'Reservada' WHERE numero = ?", (habitacion,))
+                conn.commit()
+                for cambio in cambios:
+                    _evento(*cambio)
+                flash('Reserva creada exitosamente con pago asociado.', 'success')
             
-            conn.commit()
-            flash('Reserva creada exitosamente con pago asociado.', 'success')
-            
-        except Exception as e:
-            conn.rollback()
-            flash(f'Error al crear la reserva: {str(e)}', 'danger')
-        finally:
-            conn.close()
+            except (disponibilidad.HabitacionNoDisponible, ValueError) as e:
+                conn.rollback()
+                flash(str(e), 'danger')
+            except Exception as e:
+                conn.rollback()
+                flash(f'Error al crear la reserva: {str(e)}', 'danger')
         
         return redirect(url_for('lista_reservas'))
     
     # Obtener datos del cliente para mostrar en el formulario
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM clientes WHERE id = ?', (cliente_id,))
-    cliente = cursor.fetchone()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM clientes WHERE id = ?', (cliente_id,))
+        cliente = cursor.fetchone()
     
     return render_template('crear_reserva.html', cliente=cliente)
 
@@ -402,49 +418,73 @@ def eliminar_reserva(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Obtener info de reserva
-        cursor.execute("SELECT habitacion FROM reservas WHERE id = ?", (id,))
-        reserva = cursor.fetchone()
+        try:
+            # Obtener info de reserva
+            cursor.execute("SELECT habitacion FROM reservas WHERE id = ?", (id,))
+            reserva = cursor.fetchone()
         
-        if reserva:
-            # Eliminar pago
-            cursor.execute("DELETE FROM pagos WHERE reserva_id = ?", (id,))
+            if reserva:
+                cambios = [('eliminar', 'pagos', dict(pago), None) for pago in
+                           cursor.execute("SELECT * FROM pagos WHERE reserva_id = ?", (id,)).fetchall()]
+                cambios.append(('eliminar', 'reservas', eventos.fila(conn, 'reservas', id), None))
+                habitacion_antes = eventos.fila(conn, 'habitaciones', reserva['habitacion'], 'numero')
+
+                # Eliminar pago
+                cursor.execute("DELETE FROM pagos WHERE reserva_id = ?", (id,))
             
-            # Eliminar reserva
-            cursor.execute("DELETE FROM reservas WHERE id = ?", (id,))
+                # Eliminar reserva
+                cursor.execute("DELETE FROM reservas WHERE id = ?", (id,))
             
-            # Actualizar habitación
-            cursor.execute("UPDATE habitaciones SET estado = 'Disponible' WHERE numero = ?", (reserva['habitacion'],))
+                # Liberar la habitación si no tiene otra estancia activa
+                habitacion = estados.liberar_habitacion(conn, reserva['habitacion'])
+                if habitacion:
+                    cambios.append(('actualizar', 'habitaciones', habitacion_antes, dict(habitacion)))
             
-            conn.commit()
-            flash('Reserva y pago asociado eliminados exitosamente.', 'success')
-        else:
-            flash('Reserva no encontrada.', 'danger')
+                conn.commit()
+                for cambio in cambios:
+                    _evento(*cambio)
+                flash('Reserva y pago asociado eliminados exitosamente.', 'success')
+            else:
+                flash('Reserva no encontrada.', 'danger')
             
-    except Exception as e:
-        conn.rollback()
-        flash(f'Error al eliminar la reserva: {str(e)}', 'danger')
-    finally:
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            flash(f'Error al eliminar la reserva: {str(e)}', 'danger')
     
     return redirect(url_for('lista_reservas'))
 
+def _transicion_reserva(id, destino, accion):
+    """Aplica la transición con estados.py y registra los eventos; devuelve el error o None"""
+    with database.conexion() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Filas previas, solo para el registro de eventos
+            antes = eventos.fila(conn, 'reservas', id)
+            habitacion_antes = antes and eventos.fila(conn, 'habitaciones', antes['habitacion'], 'numero')
+            reserva, habitacion = estados.cambiar_reserva(conn, id, destino)
+            conn.commit()
+        except (estados.TransicionNoPermitida, disponibilidad.HabitacionNoDisponible) as e:
+            conn.rollback()
+            return str(e)
+    _evento(accion, 'reservas', antes, dict(reserva))
+    if habitacion:
+        _evento(accion, 'habitaciones', habitacion_antes, dict(habitacion))
+    return None
+
 # Cambiar estado reserva
 @app.route('/cambiar_estado_reserva/<int:id>', methods=['POST'])
 def cambiar_estado_reserva(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     nuevo_estado = request.form['estado']
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE reservas SET estado = ? WHERE id = ?", (nuevo_estado, id))
-    conn.commit()
-    conn.close()
-    flash(f'Estado de reserva cambiado a: {nuevo_estado}', 'success')
+    error = _transicion_reserva(id, nuevo_estado, 'cambiar_estado')
+    if error:
+        flash(error, 'danger')
+    else:
+        flash(f'Estado de reserva cambiado a: {nuevo_estado}', 'success')
     return redirect(url_for('lista_reservas'))
 
 # Check-in reserva
@@ -452,18 +492,11 @@ def cambiar_estado_reserva(id):
 def checkin_reserva(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    # Cambiar estado a 'Ocupada'
-    cursor.execute("UPDATE reservas SET estado = 'Ocupada' WHERE id = ?", (id,))
-    # Obtener habitación
-    cursor.execute("SELECT habitacion FROM reservas WHERE id = ?", (id,))
-    habitacion = cursor.fetchone()
-    if habitacion:
-        cursor.execute("UPDATE habitaciones SET estado = 'Ocupada' WHERE numero = ?", (habitacion['habitacion'],))
-    conn.commit()
-    conn.close()
-    flash('Check-in realizado correctamente.', 'success')
+    error = _transicion_reserva(id, 'Ocupada', 'checkin')
+    if error:
+        flash(error, 'danger')
+    else:
+        flash('Check-in realizado correctamente.', 'success')
     return redirect(url_for('lista_reservas'))
 
 # Check-out reserva
@@ -471,56 +504,31 @@ def checkin_reserva(id):
 def checkout_reserva(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    # Cambiar estado a 'Completada'
-    cursor.execute("UPDATE reservas SET estado = 'Completada' WHERE id = ?", (id,))
-    # Obtener habitación
-    cursor.execute("SELECT habitacion FROM reservas WHERE id = ?", (id,))
-    habitacion = cursor.fetchone()
-    if habitacion:
-        cursor.execute("UPDATE habitaciones SET estado = 'Limpieza' WHERE numero = ?", (habitacion['habitacion'],))
-    conn.commit()
-    conn.close()
-    flash('Check-out realizado correctamente.', 'success')
+    error = _transicion_reserva(id, 'Completada', 'checkout')
+    if error:
+        flash(error, 'danger')
+    else:
+        flash('Check-out realizado correctamente.', 'success')
     return redirect(url_for('lista_reservas'))
 
 # Habitaciones
 @app.route('/habitaciones')
+@depende_de('habitaciones')
 def lista_habitaciones():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
     # Filtros
     estado_filtro = request.args.get('estado', '')
     tipo_filtro = request.args.get('tipo', '')
     
-    # Query base
-    query = "SELECT * FROM habitaciones"
-    params = []
-    
-    # Aplicar filtros
-    if estado_filtro:
-        query += " WHERE estado = ?"
-        params.append(estado_filtro)
-        if tipo_filtro:
-            query += " AND tipo = ?"
-            params.append(tipo_filtro)
-    elif tipo_filtro:
-        query += " WHERE tipo = ?"
-        params.append(tipo_filtro)
-    
-    query += " ORDER BY numero ASC"
-    
-    cursor.execute(query, params)
-    habitaciones = cursor.fetchall()
-    conn.close()
+    listado = consultas.listado_habitaciones(estado_filtro, tipo_filtro)
+    with database.conexion() as conn:
+        habitaciones = _pagina_listado(conn.cursor(), listado)
     
     return render_template('habitaciones.html', 
                          habitaciones=habitaciones,
+                         pagina=habitaciones,
                          estado_filtro=estado_filtro,
                          tipo_filtro=tipo_filtro)
 
@@ -538,47 +546,29 @@ def agregar_habitacion():
         amenidades = request.form['amenidades']
         descripcion = request.form['descripcion']
         
-        # Manejo de imagen
-        imagen_path = None
-        if 'imagen' in request.files:
-            imagen = request.files['imagen']
-            if imagen and imagen.filename != '':
-                # Validar tipo de archivo
-                allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
-                if '.' in imagen.filename and \
-                   imagen.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
-                    
-                    # Crear nombre único para la imagen
-                    import os
-                    from werkzeug.utils import secure_filename
-                    
-                    # Crear directorio de uploads si no existe
-                    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
-                    if not os.path.exists(upload_folder):
-                        os.makedirs(upload_folder)
-                    
-                    # Generar nombre único
-                    filename = secure_filename(f"habitacion_{numero}_{imagen.filename}")
-                    imagen_path = os.path.join('uploads', filename)
-                    full_path = os.path.join(upload_folder, filename)
-                    
-                    # Guardar imagen
-                    imagen.save(full_path)
+        # Imagen: se guarda por su hash y las variantes se generan en segundo plano
+        try:
+            imagen_hash = imagenes.recibir(request.files.get('imagen'))
+        except imagenes.ImagenNoValida as e:
+            flash(str(e), 'danger')
+            return render_template('agregar_habitacion.html')
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("""
-                INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, amenidades, descripcion, imagen)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (numero, tipo, capacidad, precio_noche, amenidades, descripcion, imagen_path))
-            conn.commit()
+            with database.conexion() as conn:
+                cursor = conn.cursor()
+                # imagen queda en NULL hasta que la variante esté lista (la pone imagenes.py)
+                cursor.execute(f"""
+                    INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, amenidades, descripcion, imagen, imagen_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, {imagenes.SQL_IMAGEN}, ?)
+                """, (numero, tipo, capacidad, precio_noche, amenidades, descripcion, imagen_hash, imagen_hash))
+                despues = eventos.fila(conn, 'habitaciones', cursor.lastrowid)
+                conn.commit()
+            _evento('crear', 'habitaciones', despues=despues)
             flash('Habitación agregada exitosamente.', 'success')
             return redirect(url_for('lista_habitaciones'))
         except sqlite3.IntegrityError:
+            imagenes.liberar(imagen_hash)
             flash('El número de habitación ya existe.', 'danger')
-        finally:
-            conn.close()
     
     return render_template('agregar_habitacion.html')
 
@@ -588,11 +578,17 @@ def cambiar_estado_habitacion(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     nuevo_estado = request.form['estado']
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE habitaciones SET estado = ? WHERE id = ?", (nuevo_estado, id))
-    conn.commit()
-    conn.close()
+    with database.conexion() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            antes = eventos.fila(conn, 'habitaciones', id)
+            despues = estados.cambiar_habitacion(conn, id, nuevo_estado)
+            conn.commit()
+        except estados.TransicionNoPermitida as e:
+            conn.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('lista_habitaciones'))
+    _evento('cambiar_estado', 'habitaciones', antes, dict(despues))
     flash(f'Estado de habitación cambiado a: {nuevo_estado}', 'success')
     return redirect(url_for('lista_habitaciones'))
 
@@ -602,73 +598,67 @@ def editar_habitacion(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
     if request.method == 'POST':
         numero = request.form['numero']
         tipo = request.form['tipo']
         capacidad = request.form['capacidad']
         precio_noche = request.form['precio_noche']
-        estado = request.form['estado']
+        estado = request.form.get('estado', '')
         amenidades = request.form['amenidades']
         descripcion = request.form['descripcion']
         
-        # Manejo de imagen
-        imagen_path = None
-        if 'imagen' in request.files:
-            imagen = request.files['imagen']
-            if imagen and imagen.filename != '':
-                # Validar tipo de archivo
-                allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
-                if '.' in imagen.filename and \
-                   imagen.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
-                    
-                    # Crear nombre único para la imagen
-                    import os
-                    from werkzeug.utils import secure_filename
-                    
-                    # Crear directorio de uploads si no existe
-                    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
-                    if not os.path.exists(upload_folder):
-                        os.makedirs(upload_folder)
-                    
-                    # Generar nombre único
-                    filename = secure_filename(f"habitacion_{numero}_{imagen.filename}")
-                    imagen_path = os.path.join('uploads', filename)
-                    full_path = os.path.join(upload_folder, filename)
-                    
-                    # Guardar imagen
-                    imagen.save(full_path)
+        # Imagen: se guarda por su hash y las variantes se generan en segundo plano
+        try:
+            imagen_hash = imagenes.recibir(request.files.get('imagen'))
+        except imagenes.ImagenNoValida as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('editar_habitacion', id=id))
         
         try:
-            if imagen_path:
-                # Actualizar con nueva imagen
-                cursor.execute("""
-                    UPDATE habitaciones 
-                    SET numero=?, tipo=?, capacidad=?, precio_noche=?, estado=?, amenidades=?, descripcion=?, imagen=?
-                    WHERE id=?
-                """, (numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion, imagen_path, id))
-            else:
-                # Actualizar sin cambiar imagen
-                cursor.execute("""
-                    UPDATE habitaciones 
-                    SET numero=?, tipo=?, capacidad=?, precio_noche=?, estado=?, amenidades=?, descripcion=?
-                    WHERE id=?
-                """, (numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion, id))
-            
-            conn.commit()
+            with database.conexion() as conn:
+                cursor = conn.cursor()
+                antes = eventos.fila(conn, 'habitaciones', id)
+                if imagen_hash:
+                    # Actualizar con nueva imagen
+                    cursor.execute(f"""
+                        UPDATE habitaciones 
+                        SET numero=?, tipo=?, capacidad=?, precio_noche=?, amenidades=?, descripcion=?,
+                            imagen={imagenes.SQL_IMAGEN}, imagen_hash=?
+                        WHERE id=?
+                    """, (numero, tipo, capacidad, precio_noche, amenidades, descripcion,
+                          imagen_hash, imagen_hash, id))
+                else:
+                    # Actualizar sin cambiar imagen
+                    cursor.execute("""
+                        UPDATE habitaciones 
+                        SET numero=?, tipo=?, capacidad=?, precio_noche=?, amenidades=?, descripcion=?
+                        WHERE id=?
+                    """, (numero, tipo, capacidad, precio_noche, amenidades, descripcion, id))
+                # El estado solo cambia por las transiciones permitidas
+                if antes and estado and estado != antes['estado']:
+                    estados.cambiar_habitacion(conn, id, estado)
+                despues = eventos.fila(conn, 'habitaciones', id)
+                
+                conn.commit()
+            if antes:
+                _evento('actualizar', 'habitaciones', antes, despues)
+                # La foto anterior se borra si ya no la usa ninguna habitación
+                if imagen_hash and antes['imagen_hash'] != imagen_hash:
+                    imagenes.liberar_habitacion(antes)
             flash('Habitación actualizada exitosamente.', 'success')
             return redirect(url_for('lista_habitaciones'))
         except sqlite3.IntegrityError:
+            imagenes.liberar(imagen_hash)
             flash('El número de habitación ya existe.', 'danger')
-        finally:
-            conn.close()
+        except estados.TransicionNoPermitida as e:
+            imagenes.liberar(imagen_hash)
+            flash(str(e), 'danger')
     
     # GET: Mostrar formulario de edición
-    cursor.execute("SELECT * FROM habitaciones WHERE id = ?", (id,))
-    habitacion = cursor.fetchone()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM habitaciones WHERE id = ?", (id,))
+        habitacion = cursor.fetchone()
     
     if not habitacion:
         flash('Habitación no encontrada.', 'danger')
@@ -682,24 +672,22 @@ def eliminar_habitacion(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
-    # Obtener información de la habitación antes de eliminar
-    cursor.execute("SELECT imagen FROM habitaciones WHERE id = ?", (id,))
-    habitacion = cursor.fetchone()
-    
-    # Eliminar la habitación
-    cursor.execute("DELETE FROM habitaciones WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
+    with database.conexion() as conn:
+        cursor = conn.cursor()
+        
+        # Obtener información de la habitación antes de eliminar
+        cursor.execute("SELECT imagen, imagen_hash FROM habitaciones WHERE id = ?", (id,))
+        habitacion = cursor.fetchone()
+        antes = eventos.fila(conn, 'habitaciones', id)
+        
+        # Eliminar la habitación
+        cursor.execute("DELETE FROM habitaciones WHERE id = ?", (id,))
+        conn.commit()
+    if antes:
+        _evento('eliminar', 'habitaciones', antes)
     
-    # Eliminar la imagen si existe
-    if habitacion and habitacion['imagen']:
-        import os
-        imagen_path = os.path.join(app.root_path, 'static', habitacion['imagen'])
-        if os.path.exists(imagen_path):
-            os.remove(imagen_path)
+    # Eliminar la imagen si ninguna otra habitación usa la misma foto
+    imagenes.liberar_habitacion(habitacion)
     
     flash('Habitación eliminada exitosamente.', 'success')
     return redirect(url_for('lista_habitaciones'))
@@ -708,46 +696,23 @@ def eliminar_habitacion(id):
 
 # Lista pagos
 @app.route('/pagos')
+@depende_de('pagos', 'clientes', 'reservas')
 def lista_pagos():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         # Obtener parámetros de filtro
         estado_filtro = request.args.get('estado', '')
         metodo_filtro = request.args.get('metodo', '')
         
-        # Construir la consulta base
-        query = """
-            SELECT p.*, c.nombre as cliente_nombre, r.habitacion, r.fecha_entrada, r.fecha_salida
-            FROM pagos p 
-            JOIN clientes c ON p.cliente_id = c.id 
-            JOIN reservas r ON p.reserva_id = r.id
-        """
-        params = []
-        
-        # Aplicar filtros
-        if estado_filtro:
-            query += " WHERE p.estado = ?"
-            params.append(estado_filtro)
-            if metodo_filtro:
-                query += " AND p.metodo = ?"
-                params.append(metodo_filtro)
-        elif metodo_filtro:
-            query += " WHERE p.metodo = ?"
-            params.append(metodo_filtro)
-        
-        query += " ORDER BY p.fecha DESC"
+        listado = consultas.listado_pagos(estado_filtro, metodo_filtro)
+        with database.conexion() as conn:
+            pagos = _pagina_listado(conn.cursor(), listado)
         
-        cursor.execute(query, params)
-        pagos = cursor.fetchall()
-        conn.close()
-        
-        return render_template('pagos.html', 
+        return _plantilla_en_streaming('pagos.html', 
                              pagos=pagos,
+                             pagina=pagos,
                              estado_filtro=estado_filtro,
                              metodo_filtro=metodo_filtro)
     
@@ -759,6 +724,28 @@ def lista_pagos():
                              estado_filtro='',
                              metodo_filtro='')
 
+# Exportar reservas o pagos completos con los filtros de sus listados
+@app.route('/exportar/<tabla>.<formato>')
+@login_required
+def exportar(tabla, formato):
+    if formato not in exportacion.TIPOS:
+        return "Formato no soportado", 404
+    if tabla == 'reservas':
+        listado = consultas.listado_reservas(request.args.get('termino', ''),
+                                             request.args.get('estado', ''),
+                                             request.args.get('fecha_desde', ''),
+                                             request.args.get('fecha_hasta', ''))
+    elif tabla == 'pagos':
+        listado = consultas.listado_pagos(request.args.get('estado', ''),
+                                          request.args.get('metodo', ''))
+    else:
+        return "Tabla no soportada", 404
+
+    nombre = f"{tabla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(stream_with_context(exportacion.exportar(listado, formato, tabla.capitalize())),
+                    mimetype=exportacion.TIPOS[formato],
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"'})
+
 # Registrar pago
 @app.route('/registrar_pago/<int:reserva_id>', methods=['GET', 'POST'])
 def registrar_pago(reserva_id):
@@ -767,66 +754,69 @@ def registrar_pago(reserva_id):
     
     try:
         # Obtener datos de reserva
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono
-            FROM reservas r 
-            JOIN clientes c ON r.cliente_id = c.id 
-            WHERE r.id = ?
-        """, (reserva_id,))
-        reserva = cursor.fetchone()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono
+                FROM reservas r 
+                JOIN clientes c ON r.cliente_id = c.id 
+                WHERE r.id = ?
+            """, (reserva_id,))
+            reserva = cursor.fetchone()
         
-        if not reserva:
-            flash('Reserva no encontrada.', 'danger')
-            return redirect(url_for('lista_reservas'))
+            if not reserva:
+                flash('Reserva no encontrada.', 'danger')
+                return redirect(url_for('lista_reservas'))
         
-        if request.method == 'POST':
-            monto = request.form.get('monto', '')
-            metodo = request.form.get('metodo', '')
-            estado = request.form.get('estado', 'Pendiente')
-            referencia = request.form.get('referencia', '')
-            notas = request.form.get('notas', '')
+            if request.method == 'POST':
+                monto = request.form.get('monto', '')
+                metodo = request.form.get('metodo', '')
+                estado = request.form.get('estado', 'Pendiente')
+                referencia = request.form.get('referencia', '')
+                notas = request.form.get('notas', '')
             
-            # Validaciones
-            if not monto or not metodo:
-                flash('Monto y método de pago son obligatorios.', 'danger')
-                return render_template('registrar_pago.html', reserva=reserva)
+                # Validaciones
+                if not monto or not metodo:
+                    flash('Monto y método de pago son obligatorios.', 'danger')
+                    return render_template('registrar_pago.html', reserva=reserva)
             
-            try:
-                monto = float(monto)
-                if monto <= 0:
-                    flash('El monto debe ser mayor a 0.', 'danger')
+                try:
+                    monto = float(monto)
+                    if monto <= 0:
+                        flash('El monto debe ser mayor a 0.', 'danger')
+                        return render_template('registrar_pago.html', reserva=reserva)
+                except ValueError:
+                    flash('El monto debe ser un número válido.', 'danger')
                     return render_template('registrar_pago.html', reserva=reserva)
-            except ValueError:
-                flash('El monto debe ser un número válido.', 'danger')
-                return render_template('registrar_pago.html', reserva=reserva)
             
-            # Verificar pago existente
-            cursor.execute("SELECT id, estado FROM pagos WHERE reserva_id = ?", (reserva_id,))
-            pago_existente = cursor.fetchone()
+                # Verificar pago existente
+                cursor.execute("SELECT id, estado FROM pagos WHERE reserva_id = ?", (reserva_id,))
+                pago_existente = cursor.fetchone()
             
-            if pago_existente:
-                # Actualizar pago
-                cursor.execute("""
-                    UPDATE pagos 
-                    SET monto = ?, metodo = ?, estado = ?, referencia = ?, notas = ?, fecha = DATE('now')
-                    WHERE reserva_id = ?
-                """, (monto, metodo, estado, referencia, notas, reserva_id))
-                flash('Pago actualizado exitosamente.', 'success')
-            else:
-                # Crear pago
-                cursor.execute("""
-                    INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas)
-                    VALUES (?, ?, ?, DATE('now'), ?, ?, ?, ?)
-                """, (reserva_id, reserva['cliente_id'], monto, metodo, estado, referencia, notas))
+                if pago_existente:
+                    # Actualizar pago
+                    antes = eventos.fila(conn, 'pagos', pago_existente['id'])
+                    pago_id = pago_existente['id']
+                    cursor.execute("""
+                        UPDATE pagos 
+                        SET monto = ?, metodo = ?, estado = ?, referencia = ?, notas = ?, fecha = DATE('now')
+                        WHERE reserva_id = ?
+                    """, (monto, metodo, estado, referencia, notas, reserva_id))
+                    flash('Pago actualizado exitosamente.', 'success')
+                else:
+                    # Crear pago
+                    cursor.execute("""
+                        INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas)
+                        VALUES (?, ?, ?, DATE('now'), ?, ?, ?, ?)
+                    """, (reserva_id, reserva['cliente_id'], monto, metodo, estado, referencia, notas))
+                    antes, pago_id = None, cursor.lastrowid
+                    flash('Pago registrado exitosamente.', 'success')
+                despues = eventos.fila(conn, 'pagos', pago_id)
+                conn.commit()
+                _evento('actualizar' if antes else 'crear', 'pagos', antes, despues)
                 flash('Pago registrado exitosamente.', 'success')
-            conn.commit()
-            flash('Pago registrado exitosamente.', 'success')
-            conn.close()
-            return redirect(url_for('lista_pagos'))
+                return redirect(url_for('lista_pagos'))
         
-        conn.close()
         return render_template('registrar_pago.html', reserva=reserva)
     
     except Exception as e:
@@ -852,19 +842,19 @@ def cambiar_estado_pago(id):
             flash('Estado no válido.', 'danger')
             return redirect(url_for('lista_pagos'))
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
         
-        # Verificar pago
-        cursor.execute("SELECT id FROM pagos WHERE id = ?", (id,))
-        if not cursor.fetchone():
-            flash('Pago no encontrado.', 'danger')
-            conn.close()
-            return redirect(url_for('lista_pagos'))
+            # Verificar pago
+            antes = eventos.fila(conn, 'pagos', id)
+            if not antes:
+                flash('Pago no encontrado.', 'danger')
+                return redirect(url_for('lista_pagos'))
         
-        cursor.execute("UPDATE pagos SET estado = ? WHERE id = ?", (nuevo_estado, id))
-        conn.commit()
-        conn.close()
+            cursor.execute("UPDATE pagos SET estado = ? WHERE id = ?", (nuevo_estado, id))
+            despues = eventos.fila(conn, 'pagos', id)
+            conn.commit()
+        _evento('cambiar_estado', 'pagos', antes, despues)
         flash(f'Estado de pago cambiado a: {nuevo_estado}', 'success')
         return redirect(url_for('lista_pagos'))
     
@@ -880,26 +870,25 @@ def eliminar_pago(id):
         return redirect(url_for('login'))
     
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
         
-        # Verificar pago
-        cursor.execute("SELECT id, estado FROM pagos WHERE id = ?", (id,))
-        pago = cursor.fetchone()
-        if not pago:
-            flash('Pago no encontrado.', 'danger')
-            conn.close()
-            return redirect(url_for('lista_pagos'))
+            # Verificar pago
+            cursor.execute("SELECT id, estado FROM pagos WHERE id = ?", (id,))
+            pago = cursor.fetchone()
+            if not pago:
+                flash('Pago no encontrado.', 'danger')
+                return redirect(url_for('lista_pagos'))
         
-        # No eliminar pagos completados
-        if pago['estado'] == 'Completado':
-            flash('No se puede eliminar un pago completado.', 'danger')
-            conn.close()
-            return redirect(url_for('lista_pagos'))
+            # No eliminar pagos completados
+            if pago['estado'] == 'Completado':
+                flash('No se puede eliminar un pago completado.', 'danger')
+                return redirect(url_for('lista_pagos'))
         
-        cursor.execute("DELETE FROM pagos WHERE id = ?", (id,))
-        conn.commit()
-        conn.close()
+            antes = eventos.fila(conn, 'pagos', id)
+            cursor.execute("DELETE FROM pagos WHERE id = ?", (id,))
+            conn.commit()
+        _evento('eliminar', 'pagos', antes)
         flash('Pago eliminado exitosamente.', 'success')
         return redirect(url_for('lista_pagos'))
     
@@ -911,93 +900,11 @@ def eliminar_pago(id):
 # Reportes
 @app.route('/reportes')
 @login_required
+@depende_de('clientes', 'reservas', 'habitaciones', 'pagos', versiones=estadisticas.versiones)
 def reportes():
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Estadísticas
-        cursor.execute("SELECT COUNT(*) FROM clientes")
-        total_clientes = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM reservas")
-        total_reservas = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM habitaciones")
-        total_habitaciones = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM pagos WHERE estado = 'Completado'")
-        pagos_completados = cursor.fetchone()[0]
-        
-        # Ingresos
-        cursor.execute("SELECT SUM(monto) FROM pagos WHERE estado = 'Completado'")
-        ingresos_totales = cursor.fetchone()[0] or 0
-        
-        # Reservas por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) as cantidad 
-            FROM reservas 
-            GROUP BY estado
-        """)
-        reservas_por_estado = cursor.fetchall()
-        
-        # Habitaciones por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) as cantidad 
-            FROM habitaciones 
-            GROUP BY estado
-        """)
-        habitaciones_por_estado = cursor.fetchall()
-        
-        # Top clientes
-        cursor.execute("""
-            SELECT c.nombre, COUNT(r.id) as reservas 
-            FROM clientes c 
-            LEFT JOIN reservas r ON c.id = r.cliente_id 
-            GROUP BY c.id, c.nombre 
-            ORDER BY reservas DESC 
-            LIMIT 5
-        """)
-        top_clientes = cursor.fetchall()
-        
-        # Ingresos por método
-        cursor.execute("""
-            SELECT metodo, SUM(monto) as total 
-            FROM pagos 
-            WHERE estado = 'Completado' 
-            GROUP BY metodo
-        """)
-        ingresos_por_metodo = cursor.fetchall()
-        
-        # Reservas del mes
-        cursor.execute("""
-            SELECT COUNT(*) FROM reservas 
-            WHERE strftime('%Y-%m', fecha_entrada) = strftime('%Y-%m', 'now')
-        """)
-        reservas_mes_actual = cursor.fetchone()[0]
-        
-        # Ingresos del mes
-        cursor.execute("""
-            SELECT SUM(monto) FROM pagos 
-            WHERE estado = 'Completado' 
-            AND strftime('%Y-%m', fecha) = strftime('%Y-%m', 'now')
-        """)
-        ingresos_mes_actual = cursor.fetchone()[0] or 0
-        
-        conn.close()
-        
-        return render_template('reportes.html',
-                             total_clientes=total_clientes,
-                             total_reservas=total_reservas,
-                             total_habitaciones=total_habitaciones,
-                             pagos_completados=pagos_completados,
-                             ingresos_totales=ingresos_totales,
-                             reservas_por_estado=reservas_por_estado,
-                             habitaciones_por_estado=habitaciones_por_estado,
-                             top_clientes=top_clientes,
-                             ingresos_por_metodo=ingresos_por_metodo,
-                             reservas_mes_actual=reservas_mes_actual,
-                             ingresos_mes_actual=ingresos_mes_actual)
+        # Cacheado: sin consultas mientras no cambien clientes, reservas, habitaciones o pagos
+        return render_template('reportes.html', **estadisticas.resumen())
     
     except Exception as e:
         print(f"Error en reportes: {e}")
@@ -1007,43 +914,21 @@ def reportes():
 # Reporte ocupación
 @app.route('/reporte_ocupacion')
 @login_required
+@depende_de('reservas', 'habitaciones')
 def reporte_ocupacion():
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Ocupación diaria
-        cursor.execute("""
-            SELECT 
-                date(r.fecha_entrada) as fecha,
-                COUNT(DISTINCT r.habitacion) as habitaciones_ocupadas,
-                (SELECT COUNT(*) FROM habitaciones) as total_habitaciones
-            FROM reservas r 
-            WHERE r.fecha_entrada >= date('now', '-30 days')
-            AND r.estado IN ('Confirmada', 'Ocupada')
-            GROUP BY date(r.fecha_entrada)
-            ORDER BY fecha DESC
-        """)
-        ocupacion_diaria = cursor.fetchall()
-        
-        # Ocupación por tipo
-        cursor.execute("""
-            SELECT 
-                h.tipo,
-                COUNT(r.id) as reservas,
-                AVG(r.precio_total) as precio_promedio
-            FROM habitaciones h
-            LEFT JOIN reservas r ON h.numero = r.habitacion
-            WHERE r.estado IN ('Confirmada', 'Ocupada')
-            GROUP BY h.tipo
-        """)
-        ocupacion_por_tipo = cursor.fetchall()
-        
-        conn.close()
-        
+        dias = max(1, min(request.args.get('dias', 30, type=int), 366))
+        desde, hasta = ocupacion.ventana(dias)
+        with database.conexion() as conn:
+            # Noches ocupadas por día y por tipo, leídas del calendario de ocupación
+            ocupacion_diaria = ocupacion.ocupacion_diaria(conn, desde, hasta)
+            ocupacion_por_tipo = ocupacion.ocupacion_por_tipo(conn, desde, hasta)
+            tasa = ocupacion.tasa_ocupacion(conn, desde, hasta)
+
         return render_template('reporte_ocupacion.html',
                              ocupacion_diaria=ocupacion_diaria,
-                             ocupacion_por_tipo=ocupacion_por_tipo)
+                             ocupacion_por_tipo=ocupacion_por_tipo,
+                             tasa_ocupacion=tasa, dias=dias)
     
     except Exception as e:
         print(f"Error en reporte_ocupacion: {e}")
@@ -1053,53 +938,31 @@ def reporte_ocupacion():
 # Reporte financiero
 @app.route('/reporte_financiero')
 @login_required
+@depende_de('pagos', 'clientes', 'reservas')
 def reporte_financiero():
     try:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Ingresos mensuales
-        cursor.execute("""
-            SELECT 
-                strftime('%Y-%m', fecha) as mes,
-                SUM(monto) as ingresos
-            FROM pagos 
-            WHERE estado = 'Completado'
-            AND fecha >= date('now', '-12 months')
-            GROUP BY strftime('%Y-%m', fecha)
-            ORDER BY mes DESC
-        """)
-        ingresos_mensuales = cursor.fetchall()
+        with database.conexion() as conn:
+            cursor = conn.cursor()
         
-        # Métodos de pago
-        cursor.execute("""
-            SELECT 
-                metodo,
-                COUNT(*) as cantidad,
-                SUM(monto) as total
-            FROM pagos 
-            WHERE estado = 'Completado'
-            GROUP BY metodo
-            ORDER BY total DESC
-        """)
-        metodos_pago = cursor.fetchall()
+            # Ingresos mensuales y por método, del resumen que mantienen los triggers de pagos
+            ingresos_mensuales = ingresos.mensuales(conn, meses=12)
+            metodos_pago = ingresos.por_metodo(conn)
         
-        # Pagos pendientes
-        cursor.execute("""
-            SELECT 
-                p.monto,
-                c.nombre as cliente,
-                r.habitacion,
-                p.fecha
-            FROM pagos p
-            JOIN clientes c ON p.cliente_id = c.id
-            JOIN reservas r ON p.reserva_id = r.id
-            WHERE p.estado = 'Pendiente'
-            ORDER BY p.fecha DESC
-        """)
-        pagos_pendientes = cursor.fetchall()
+            # Pagos pendientes
+            cursor.execute("""
+                SELECT 
+                    p.monto,
+                    c.nombre as cliente,
+                    r.habitacion,
+                    p.fecha
+                FROM pagos p
+                JOIN clientes c ON p.cliente_id = c.id
+                JOIN reservas r ON p.reserva_id = r.id
+                WHERE p.estado = 'Pendiente'
+                ORDER BY p.fecha DESC
+            """)
+            pagos_pendientes = cursor.fetchall()
         
-        conn.close()
         
         return render_template('reporte_financiero.html',
                              ingresos_mensuales=ingresos_mensuales,
@@ -1112,6 +975,7 @@ def reporte_financiero():
         return redirect(url_for('reportes'))
 
 @app.route('/reserva_rapida', methods=['GET', 'POST'])
+@depende_de('habitaciones', versiones=fragmentos.marcadores)  # página pública: sin leer SQLite
 def reserva_rapida():
     if request.method == 'POST':
         nombre = sanitize_input(request.form.get('nombre', ''))
@@ -1128,55 +992,204 @@ def reserva_rapida():
             flash('Todos los campos son obligatorios.', 'danger')
             return render_template('reserva_rapida.html')
 
-        conn = database.get_connection()
-        cursor = conn.cursor()
         try:
-            # Insertar cliente visitante (identificación y dirección genéricas)
-            cursor.execute('''
-                INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (nombre, 'VISITANTE', 'N/A', correo, telefono))
-            cliente_id = cursor.lastrowid
-
-            # Insertar reserva
-            cursor.execute('''
-                INSERT INTO reservas (cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas, precio_total, estado, notas, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas, 0, 'Pendiente', notas))
-
-            # Actualizar habitación
-            cursor.execute("UPDATE habitaciones SET estado = 'Reservada' WHERE numero = ?", (habitacion,))
-
-            conn.commit()
+            # Idempotente: un reenvío con la misma clave (o los mismos datos) no crea otra reserva
+            resultado = reserva_publica.reservar_visitante(
+                nombre, correo, telefono, habitacion, fecha_entrada, fecha_salida, num_personas, notas,
+                clave=request.form.get('clave_idempotencia') or request.headers.get('Idempotency-Key'))
+            for cambio in resultado.cambios:
+                _evento(*cambio)
             flash('¡Reserva rápida realizada con éxito! Pronto nos pondremos en contacto.', 'success')
-            return render_template('reserva_rapida_confirmacion.html', nombre=nombre)
+            return render_template('reserva_rapida_confirmacion.html', nombre=nombre,
+                                   reserva_id=resultado.reserva_id, precio_total=resultado.precio_total,
+                                   noches=resultado.noches)
+        except (disponibilidad.HabitacionNoDisponible, ValueError) as e:
+            flash(str(e), 'danger')
         except Exception as e:
-            conn.rollback()
             flash(f'Error al realizar la reserva: {str(e)}', 'danger')
-        finally:
-            conn.close()
         return render_template('reserva_rapida.html')
     
-    # GET: Obtener habitaciones disponibles para mostrar
-    conn = database.get_connection()
-    cursor = conn.cursor()
+    # GET: los visitantes anónimos sin mensajes reciben la página de la caché compartida
+    if 'user_id' not in session and not session.get('_flashes'):
+        return fragmentos.fragmento('reserva_rapida', ('habitaciones',),
+                                    lambda: render_template('reserva_rapida.html',
+                                                            habitaciones=_habitaciones_portada()))
+    return render_template('reserva_rapida.html', habitaciones=_habitaciones_portada())
+
+def _habitaciones_portada():
+    """Primeras 3 habitaciones disponibles (las tarjetas de reserva_rapida), cacheadas"""
+    def consultar():
+        with database.conexion() as conn:
+            # Obtener solo las primeras 3 habitaciones disponibles
+            habitaciones = conn.execute("""
+                SELECT id, numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion, imagen
+                FROM habitaciones 
+                WHERE estado = 'Disponible'
+                ORDER BY numero
+                LIMIT 3
+            """).fetchall()
+        return json.dumps([dict(h) for h in habitaciones])
     try:
-        # Obtener solo las primeras 3 habitaciones disponibles
-        cursor.execute("""
-            SELECT id, numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion, imagen
-            FROM habitaciones 
-            WHERE estado = 'Disponible'
-            ORDER BY numero
-            LIMIT 3
-        """)
-        habitaciones = cursor.fetchall()
+        return json.loads(fragmentos.fragmento('habitaciones_portada', ('habitaciones',), consultar))
     except Exception as e:
+        # Un error no se guarda en la caché
         print(f"Error al obtener habitaciones: {e}")
-        habitaciones = []
-    finally:
-        conn.close()
-    
-    return render_template('reserva_rapida.html', habitaciones=habitaciones)
+        return []
+
+# Acciones por lote sobre reservas: acción -> estado destino (None: el del cuerpo)
+ACCIONES_LOTE = {'checkin': 'Ocupada', 'checkout': 'Completada', 'estado': None}
+MAX_LOTE = 1000
+
+@app.route('/reservas/lote/<accion>', methods=['POST'])
+@login_required
+def reservas_lote(accion):
+    """Check-in, check-out o cambio de estado de muchas reservas en una sola transacción.
+
+    Cuerpo JSON: {"ids": [...]} o {"filtro": {"estado": "Confirmada",
+    "fecha_entrada": "2025-07-01", "cliente_id": 3}}, más "estado" para la
+    acción estado y "todo_o_nada" para deshacer todo si alguna falla.
+    """
+    if accion not in ACCIONES_LOTE:
+        return jsonify(error=f'Acción no válida: {accion}'), 404
+    datos = request.get_json(silent=True) or {}
+    if not isinstance(datos, dict):
+        return jsonify(error='El cuerpo debe ser un objeto JSON.'), 400
+    destino = ACCIONES_LOTE[accion] or datos.get('estado')
+    if not destino:
+        return jsonify(error='Falta el estado destino.'), 400
+
+    with database.conexion() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if isinstance(datos.get('filtro'), dict):
+                ids = estados.reservas_filtradas(conn, **datos['filtro'])
+            elif all(isinstance(i, int) for i in datos.get('ids') or []):
+                ids = datos.get('ids') or []
+            else:
+                raise ValueError('ids debe ser una lista de números.')
+            ids = list(dict.fromkeys(ids))
+            if not ids or len(ids) > MAX_LOTE:
+                raise ValueError(f'Se necesitan entre 1 y {MAX_LOTE} reservas.')
+
+            # Filas previas, solo para el registro de eventos
+            lista = json.dumps(ids)
+            reservas_antes = {fila['id']: dict(fila) for fila in conn.execute(
+                "SELECT * FROM reservas WHERE id IN (SELECT value FROM json_each(?))", (lista,))}
+            habitaciones_antes = {fila['numero']: dict(fila) for fila in conn.execute("""
+                SELECT * FROM habitaciones WHERE numero IN (
+                    SELECT habitacion FROM reservas WHERE id IN (SELECT value FROM json_each(?)))
+            """, (lista,))}
+
+            resultados = estados.cambiar_reservas(conn, ids, destino, bool(datos.get('todo_o_nada')))
+            conn.commit()
+        except (estados.TransicionNoPermitida, disponibilidad.HabitacionNoDisponible) as e:
+            conn.rollback()
+            return jsonify(ok=False, error=str(e)), 409
+        except TypeError:
+            conn.rollback()
+            return jsonify(error='Filtro o ids no válidos.'), 400
+        except ValueError as e:
+            conn.rollback()
+            return jsonify(error=str(e)), 400
+
+    respuesta = []
+    for resultado in resultados:
+        if not resultado['ok']:
+            respuesta.append({'id': resultado['id'], 'ok': False, 'error': resultado['error']})
+            continue
+        reserva, habitacion = dict(resultado['reserva']), resultado['habitacion']
+        _evento(accion, 'reservas', reservas_antes.get(reserva['id']), reserva)
+        item = {'id': reserva['id'], 'ok': True, 'estado': reserva['estado']}
+        if habitacion:
+            habitacion = dict(habitacion)
+            _evento(accion, 'habitaciones', habitaciones_antes.get(habitacion['numero']), habitacion)
+            habitaciones_antes[habitacion['numero']] = habitacion
+            item['habitacion'] = {'numero': habitacion['numero'], 'estado': habitacion['estado']}
+        respuesta.append(item)
+    aplicadas = sum(1 for item in respuesta if item['ok'])
+    return jsonify(ok=aplicadas == len(respuesta), estado=destino, aplicadas=aplicadas,
+                   fallidas=len(respuesta) - aplicadas, resultados=respuesta)
+
+# Habitaciones libres para un rango de fechas (JSON)
+@app.route('/disponibilidad')
+@depende_de('reservas', 'habitaciones', mensajes=False)
+def consultar_disponibilidad():
+    fecha_entrada = request.args.get('fecha_entrada', '')
+    fecha_salida = request.args.get('fecha_salida', '')
+    tipo = request.args.get('tipo', '')
+    capacidad = request.args.get('capacidad', 0, type=int)
+    try:
+        with database.conexion() as conn:
+            libres = disponibilidad.habitaciones_libres(conn, fecha_entrada, fecha_salida, tipo, capacidad)
+    except ValueError:
+        return jsonify({'error': 'Fechas inválidas.'}), 400
+    return jsonify({'fecha_entrada': fecha_entrada, 'fecha_salida': fecha_salida, 'habitaciones': libres})
+
+# Estadísticas del pool de conexiones (para dimensionarlo)
+@app.route('/admin/pool')
+@login_required
+def estado_pool():
+    return jsonify(database.estadisticas_pool())
+
+# Auditoría de integridad en solo lectura (JSON)
+@app.route('/admin/auditoria')
+@login_required
+def auditoria_integridad():
+    informe = auditoria.auditar(muestra=request.args.get('muestra', auditoria.MUESTRA, type=int))
+    return jsonify(informe)
+
+# Aciertos/cálculos de la caché del panel de reportes
+@app.route('/admin/estadisticas')
+@login_required
+def estado_estadisticas():
+    return jsonify(estadisticas.estado())
+
+@app.route('/admin/condicional')
+@login_required
+def estado_condicional():
+    """Respuestas 304 frente a 200 de las vistas con ETag"""
+    return jsonify(condicional.estadisticas())
+
+@app.route('/admin/fragmentos')
+@login_required
+def estado_fragmentos():
+    return jsonify(fragmentos.estadisticas())
+
+@app.route('/admin/eventos')
+@login_required
+def registro_eventos():
+    """Historial de un registro (?tabla=reservas&id=5) y estado de la cola de eventos"""
+    historial = []
+    if request.args.get('tabla') and request.args.get('id', type=int):
+        eventos.vaciar()
+        with database.conexion() as conn:
+            historial = [dict(e) for e in eventos.historial(conn, request.args['tabla'], request.args.get('id', type=int))]
+    return jsonify(cola=eventos.estadisticas(), eventos=historial)
+
+# Métricas por ruta en JSON, con las últimas consultas lentas
+@app.route('/admin/metricas')
+@login_required
+def estado_metricas():
+    return jsonify(metricas.estadisticas())
+
+# Token para que Prometheus lea /metrics sin sesión (Authorization: Bearer ...)
+METRICAS_TOKEN = os.environ.get('HOTEL_METRICS_TOKEN', '')
+
+@app.route('/metrics')
+def metricas_prometheus():
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if 'user_id' not in session and not (METRICAS_TOKEN and hmac.compare_digest(token, METRICAS_TOKEN)):
+        return Response('No autorizado\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    pool = database.estadisticas_pool()
+    cola = eventos.estadisticas()
+    extra = {
+        'hotel_pool_conexiones_en_uso': ('gauge', 'Conexiones del pool en uso', pool.get('en_uso', 0)),
+        'hotel_pool_esperas_total': ('counter', 'Veces que se esperó por una conexión libre', pool.get('esperas', 0)),
+        'hotel_pool_timeouts_total': ('counter', 'Esperas por conexión que agotaron el tiempo', pool.get('timeouts', 0)),
+        'hotel_eventos_pendientes': ('gauge', 'Eventos en cola sin escribir', cola['pendientes']),
+    }
+    return Response(metricas.prometheus(extra), mimetype='text/plain; version=0.0.4')
 
 
 # Ejecutar app
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Auditoría de integridad de reservas, pagos, habitaciones y clientes.
+
+Cada verificación es una consulta que devuelve las filas que incumplen un
+invariante. Se ejecutan en paralelo, cada una en su propia conexión de solo
+lectura (una instantánea WAL que no bloquea a los escritores), y el informe
+incluye el número de violaciones, una muestra y el tiempo de cada una.
+
+    python auditoria.py                  # informe legible
+    python auditoria.py --json           # informe JSON (sale con 1 si hay violaciones)
+    python auditoria.py --base copia.db --hilos 2
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import database
+from disponibilidad import ESTADOS_ACTIVOS
+
+MUESTRA = 5
+HILOS = 4
+
+_ACTIVOS_SQL = ", ".join(f"'{estado}'" for estado in ESTADOS_ACTIVOS)
+
+# consulta: SELECT de las filas que incumplen el invariante
+Verificacion = namedtuple('Verificacion', 'nombre descripcion consulta')
+
+VERIFICACIONES = [
+    Verificacion('reserva_sin_pago', 'Toda reserva tiene un pago', """
+        SELECT r.id AS reserva_id, r.habitacion, r.precio_total
+        FROM reservas r
+        WHERE NOT EXISTS (SELECT 1 FROM pagos p WHERE p.reserva_id = r.id)
+    """),
+    Verificacion('reserva_varios_pagos', 'Ninguna reserva tiene más de un pago', """
+        SELECT reserva_id, COUNT(*) AS pagos, SUM(monto) AS total
+        FROM pagos
+        WHERE reserva_id IS NOT NULL
+        GROUP BY reserva_id
+        HAVING COUNT(*) > 1
+    """),
+    Verificacion('pago_sin_reserva', 'Todo pago pertenece a una reserva existente', """
+        SELECT p.id AS pago_id, p.reserva_id, p.monto
+        FROM pagos p
+        WHERE p.reserva_id IS NULL
+        OR NOT EXISTS (SELECT 1 FROM reservas r WHERE r.id = p.reserva_id)
+    """),
+    Verificacion('monto_distinto', 'El monto del pago coincide con el precio de la reserva', """
+        SELECT p.id AS pago_id, r.id AS reserva_id, p.monto, r.precio_total
+        FROM pagos p
+        JOIN reservas r ON r.id = p.reserva_id
+        WHERE p.monto != r.precio_total
+    """),
+    # Ordenadas por entrada, una estancia se solapa si empieza antes de que
+    # termine alguna anterior de la misma habitación
+    Verificacion('estancias_solapadas', 'Ninguna habitación tiene estancias activas solapadas', f"""
+        SELECT reserva_id, habitacion, fecha_entrada, fecha_salida, salida_anterior
+        FROM (
+            SELECT id AS reserva_id, habitacion, fecha_entrada, fecha_salida,
+                   MAX(fecha_salida) OVER (
+                       PARTITION BY habitacion ORDER BY fecha_entrada, id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS salida_anterior
+            FROM reservas
+            WHERE estado IN ({_ACTIVOS_SQL})
+        )
+        WHERE salida_anterior > fecha_entrada
+    """),
+    Verificacion('estado_habitacion', 'El estado de la habitación concuerda con sus reservas', f"""
+        SELECT h.numero, h.estado, 'Ocupada sin reserva en curso' AS problema
+        FROM habitaciones h
+        WHERE h.estado = 'Ocupada'
+        AND NOT EXISTS (SELECT 1 FROM reservas r WHERE r.habitacion = h.numero AND r.estado = 'Ocupada')
+        UNION ALL
+        SELECT h.numero, h.estado, 'Reserva en curso en habitación no ocupada'
+        FROM habitaciones h
+        WHERE h.estado != 'Ocupada'
+        AND EXISTS (SELECT 1 FROM reservas r WHERE r.habitacion = h.numero AND r.estado = 'Ocupada')
+        UNION ALL
+        SELECT h.numero, h.estado, 'Reservada sin reservas activas'
+        FROM habitaciones h
+        WHERE h.estado = 'Reservada'
+        AND NOT EXISTS (SELECT 1 FROM reservas r WHERE r.habitacion = h.numero AND r.estado IN ({_ACTIVOS_SQL}))
+        UNION ALL
+        SELECT r.habitacion, NULL, 'Reserva de una habitación inexistente'
+        FROM reservas r
+        WHERE NOT EXISTS (SELECT 1 FROM habitaciones h WHERE h.numero = r.habitacion)
+        GROUP BY r.habitacion
+    """),
+    Verificacion('cliente_inexistente', 'Reservas y pagos apuntan a clientes existentes', """
+        SELECT 'reservas' AS tabla, r.id, r.cliente_id
+        FROM reservas r
+        WHERE NOT EXISTS (SELECT 1 FROM clientes c WHERE c.id = r.cliente_id)
+        UNION ALL
+        SELECT 'pagos', p.id, p.cliente_id
+        FROM pagos p
+        WHERE NOT EXISTS (SELECT 1 FROM clientes c WHERE c.id = p.cliente_id)
+    """),
+]
+
+
+def ejecutar(verificacion, ruta=None, muestra=MUESTRA):
+    """Ejecuta una verificación en su propia conexión de solo lectura"""
+    inicio = time.perf_counter()
+    conn = database.conexion_solo_lectura(ruta)
+    try:
+        # El total sale de la misma pasada que la muestra
+        filas = conn.execute(f"""
+            SELECT *, COUNT(*) OVER () AS _violaciones
+            FROM ({verificacion.consulta})
+            LIMIT ?
+        """, (muestra,)).fetchall()
+        resultado = {
+            'nombre': verificacion.nombre,
+            'descripcion': verificacion.descripcion,
+            'violaciones': filas[0]['_violaciones'] if filas else 0,
+            'muestra': [{k: fila[k] for k in fila.keys() if k != '_violaciones'} for fila in filas],
+        }
+    except Exception as e:
+        resultado = {
+            'nombre': verificacion.nombre,
+            'descripcion': verificacion.descripcion,
+            'violaciones': None,
+            'error': str(e),
+            'muestra': [],
+        }
+    finally:
+        conn.close()
+    resultado['ok'] = resultado['violaciones'] == 0
+    resultado['segundos'] = round(time.perf_counter() - inicio, 4)
+    return resultado
+
+
+def auditar(ruta=None, hilos=HILOS, muestra=MUESTRA, verificaciones=None):
+    """Ejecuta el catálogo en paralelo; devuelve el informe como dict serializable"""
+    ruta = ruta or database.DATABASE_NAME
+    verificaciones = verificaciones or VERIFICACIONES
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        resultados = list(ejecutor.map(lambda v: ejecutar(v, ruta, muestra), verificaciones))
+    return {
+        'base': ruta,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'ok': all(r['ok'] for r in resultados),
+        'segundos': round(time.perf_counter() - inicio, 4),
+        'verificaciones': resultados,
+    }
+
+
+def imprimir(informe):
+    print(f"🔍 Auditoría de {informe['base']} ({informe['fecha']})")
+    print("=" * 50)
+    for r in informe['verificaciones']:
+        if 'error' in r:
+            print(f"   ❌ {r['descripcion']}: error {r['error']} ({r['segundos']:.3f} s)")
+            continue
+        icono = "✅" if r['ok'] else "⚠️ "
+        print(f"   {icono} {r['descripcion']}: {r['violaciones']} violaciones ({r['segundos']:.3f} s)")
+        for fila in r['muestra']:
+            print(f"         {fila}")
+    print("=" * 50)
+    print(f"{'✅ Sin violaciones' if informe['ok'] else '⚠️  Hay violaciones'} ({informe['segundos']:.3f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auditoría de integridad (solo lectura)")
+    parser.add_argument("--base", default=database.DATABASE_NAME, help="archivo de la base de datos")
+    parser.add_argument("--json", action="store_true", help="imprime el informe en JSON")
+    parser.add_argument("--hilos", type=int, default=HILOS)
+    parser.add_argument("--muestra", type=int, default=MUESTRA, help="filas de ejemplo por verificación")
+    args = parser.parse_args()
+
+    informe = auditar(args.base, args.hilos, args.muestra)
+    if args.json:
+        print(json.dumps(informe, ensure_ascii=False, indent=2, default=str))
+    else:
+        imprimir(informe)
+    sys.exit(0 if informe['ok'] else 1)
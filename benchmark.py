@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Pruebas de carga de las rutas principales contra una base sintética.
+
+Genera la base con generar_datos.py y lanza la aplicación real (app.py) a
+través del cliente de pruebas de Flask, con varios hilos y, si se pide,
+varios procesos que escriben en la misma base, como los workers de
+gunicorn. Por escenario informa de la latencia p50/p95/p99, las peticiones
+por segundo y las sentencias SQL por petición (metricas.py), y lo compara
+con la línea base guardada: sale con código 1 si algo empeora más de la
+tolerancia.
+
+    python benchmark.py                          # compara con benchmark_base.json
+    python benchmark.py --hilos 8 --procesos 2
+    python benchmark.py --guardar-base           # fija la línea base actual
+
+Si la instalación no tiene la carpeta templates/ se usan plantillas mínimas
+que recorren todo lo que recibe la plantilla (las consultas diferidas se
+ejecutan igual), pero el coste de renderizar el HTML real no se mide.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import database
+import generar_datos
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+BASE = os.path.join(RAIZ, 'benchmark_base.json')
+TOLERANCIA = 0.25
+
+ESTADOS_FILTRO = ('', '', 'Confirmada', 'Completada', 'Pendiente', 'Cancelada')
+
+
+# ========== ESCENARIOS ==========
+# Cada uno recibe el cliente de pruebas (con sesión), un Random y el contexto
+# de la base y hace una petición; el nombre es el endpoint que mide.
+
+def lista_reservas(cliente, rnd, ctx):
+    parametros = {'estado': rnd.choice(ESTADOS_FILTRO), 'por_pagina': 50}
+    if rnd.random() < 0.4:
+        desde = ctx['hoy'] - timedelta(days=rnd.randint(0, 365 * ctx['anos']))
+        parametros['fecha_desde'] = desde.isoformat()
+        parametros['fecha_hasta'] = (desde + timedelta(days=rnd.choice((7, 30, 90)))).isoformat()
+    if rnd.random() < 0.2:
+        parametros['termino'] = rnd.choice(generar_datos.APELLIDOS)
+    return cliente.get('/reservas', query_string=parametros)
+
+
+def reportes(cliente, rnd, ctx):
+    return cliente.get('/reportes')
+
+
+def _fechas_futuras(rnd, ctx):
+    # Más allá de las reservas generadas, para que la mayoría encuentre hueco
+    entrada = ctx['hoy'] + timedelta(days=rnd.randint(200, 3000))
+    return entrada.isoformat(), (entrada + timedelta(days=rnd.randint(1, 5))).isoformat()
+
+
+def reserva_rapida(cliente, rnd, ctx):
+    entrada, salida = _fechas_futuras(rnd, ctx)
+    n = rnd.randint(0, 10 ** 9)
+    return cliente.post('/reserva_rapida', data={
+        'nombre': f"Visitante {n}",
+        'correo': f"visitante{n}@ejemplo.com",
+        'telefono': f"3{rnd.randint(100000000, 199999999)}",
+        'habitacion': rnd.choice(ctx['habitaciones']),
+        'fecha_entrada': entrada,
+        'fecha_salida': salida,
+        'num_personas': '1',
+    })
+
+
+def crear_reserva(cliente, rnd, ctx):
+    entrada, salida = _fechas_futuras(rnd, ctx)
+    habitacion = rnd.choice(ctx['habitaciones'])
+    noches = (date.fromisoformat(salida) - date.fromisoformat(entrada)).days
+    return cliente.post(f"/crear_reserva/{rnd.randint(1, ctx['clientes'])}", data={
+        'habitacion': habitacion,
+        'fecha_entrada': entrada,
+        'fecha_salida': salida,
+        'num_personas': '1',
+        'precio_total': str(ctx['precios'][habitacion] * noches),
+        'estado': 'Confirmada',
+        'notas': '',
+    })
+
+
+def registrar_pago(cliente, rnd, ctx):
+    reserva_id, precio_total = rnd.choice(ctx['pendientes'])
+    return cliente.post(f"/registrar_pago/{reserva_id}", data={
+        'monto': str(precio_total),
+        'metodo': rnd.choice(('Efectivo', 'Tarjeta', 'Transferencia')),
+        'estado': 'Completado',
+        'referencia': f"BENCH-{rnd.randint(0, 10 ** 6)}",
+        'notas': '',
+    })
+
+
+# Primero las lecturas: las escrituras cambian la base para los siguientes
+ESCENARIOS = {
+    'lista_reservas': lista_reservas,
+    'reportes': reportes,
+    'reserva_rapida': reserva_rapida,
+    'crear_reserva': crear_reserva,
+    'registrar_pago': registrar_pago,
+}
+
+
+# ========== EJECUCIÓN ==========
+
+def _cargar_app():
+    """Importa app.py sobre la base ya elegida (database.DATABASE_NAME)"""
+    from jinja2 import FunctionLoader, pass_context
+    import app as aplicacion
+
+    if not os.path.isdir(os.path.join(aplicacion.app.root_path, aplicacion.app.template_folder)):
+        @pass_context
+        def recorrer(contexto):
+            return sum(len(list(valor)) for valor in contexto.values()
+                       if hasattr(type(valor), '__iter__') and not isinstance(valor, (str, bytes, dict)))
+
+        aplicacion.app.jinja_env.globals['recorrer'] = recorrer
+        aplicacion.app.jinja_env.loader = FunctionLoader(
+            lambda nombre: nombre + ":{{ recorrer() }}:{{ get_flashed_messages()|length }}")
+    aplicacion.app.config['TESTING'] = True
+    return aplicacion.app
+
+
+def _cliente(app):
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'username': generar_datos.USUARIO, 'password': generar_datos.CLAVE})
+    if respuesta.status_code != 302:
+        raise RuntimeError('No se pudo iniciar sesión con el usuario del benchmark')
+    return cliente
+
+
+def _contexto(anos):
+    with database.conexion() as conn:
+        precios = {fila[0]: fila[1] for fila in conn.execute("SELECT numero, precio_noche FROM habitaciones")}
+        return {
+            'hoy': date.today(),
+            'anos': anos,
+            'habitaciones': sorted(precios),
+            'precios': precios,
+            'clientes': conn.execute("SELECT MAX(id) FROM clientes").fetchone()[0],
+            'pendientes': [tuple(fila) for fila in conn.execute("""
+                SELECT p.reserva_id, r.precio_total FROM pagos p JOIN reservas r ON r.id = p.reserva_id
+                WHERE p.estado = 'Pendiente'
+            """)],
+        }
+
+
+def _ejecutar(nombre, peticiones, hilos, semilla, calentamiento, anos, barrera=None):
+    """Lanza `peticiones` del escenario repartidas entre `hilos`; devuelve las mediciones.
+
+    Con `barrera`, espera a que todos los procesos terminen de arrancar y
+    calentar antes de empezar a medir.
+    """
+    import metricas
+    app = _cargar_app()
+    escenario = ESCENARIOS[nombre]
+    ctx = _contexto(anos)
+    clientes = [_cliente(app) for _ in range(hilos)]
+
+    rnd = random.Random(semilla)
+    for _ in range(calentamiento):
+        escenario(clientes[0], rnd, ctx).close()
+    if barrera is not None:
+        barrera.wait()
+
+    antes = metricas.estadisticas()['rutas'].get(nombre, {})
+    turnos = itertools.count()
+    latencias, errores = [], [0]
+    lock = threading.Lock()
+
+    def trabajar(indice):
+        rnd_hilo = random.Random(f"{semilla}-{indice}")
+        propias, fallos = [], 0
+        while next(turnos) < peticiones:
+            inicio = time.perf_counter()
+            try:
+                respuesta = escenario(clientes[indice], rnd_hilo, ctx)
+                respuesta.get_data()
+                respuesta.close()
+                if respuesta.status_code >= 500:
+                    fallos += 1
+            except Exception:
+                fallos += 1
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallos
+
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    duracion = time.perf_counter() - inicio
+
+    despues = metricas.estadisticas()['rutas'].get(nombre, {})
+    return {
+        'latencias': latencias,
+        'errores': errores[0],
+        'duracion': duracion,
+        'sentencias': despues.get('sentencias', 0) - antes.get('sentencias', 0),
+        'peticiones_medidas': despues.get('peticiones', 0) - antes.get('peticiones', 0),
+    }
+
+
+def _ejecutar_proceso(cola, *argumentos):
+    cola.put(_ejecutar(*argumentos))
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def medir(nombre, peticiones, hilos, procesos, semilla, calentamiento, anos):
+    if procesos == 1:
+        partes = [_ejecutar(nombre, peticiones, hilos, semilla, calentamiento, anos)]
+        duracion = partes[0]['duracion']
+    else:
+        # fork: los procesos heredan la configuración y recrean su pool al arrancar
+        contexto = multiprocessing.get_context('fork')
+        por_proceso = -(-peticiones // procesos)
+        barrera, cola = contexto.Barrier(procesos), contexto.Queue()
+        trabajadores = [contexto.Process(target=_ejecutar_proceso,
+                                         args=(cola, nombre, por_proceso, hilos, f"{semilla}-{i}",
+                                               calentamiento, anos, barrera))
+                        for i in range(procesos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        partes = [cola.get() for _ in trabajadores]
+        for trabajador in trabajadores:
+            trabajador.join()
+        # Empiezan a la vez (barrera): el más lento marca la duración
+        duracion = max(parte['duracion'] for parte in partes)
+
+    latencias = sorted(itertools.chain.from_iterable(parte['latencias'] for parte in partes))
+    medidas = sum(parte['peticiones_medidas'] for parte in partes)
+    return {
+        'peticiones': len(latencias),
+        'errores': sum(parte['errores'] for parte in partes),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1),
+        'sql_por_peticion': round(sum(parte['sentencias'] for parte in partes) / medidas, 1) if medidas else None,
+    }
+
+
+# ========== LÍNEA BASE ==========
+
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    """Regresiones frente a la línea base: p95 más alto o menos peticiones por segundo"""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get('resultados', {}).get(nombre)
+        if not anterior:
+            continue
+        if actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p95 {anterior['p95_ms']} → {actual['p95_ms']} ms")
+        if actual['peticiones_por_segundo'] < anterior['peticiones_por_segundo'] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: {anterior['peticiones_por_segundo']} → "
+                               f"{actual['peticiones_por_segundo']} peticiones/s")
+        if actual['errores'] > anterior['errores']:
+            regresiones.append(f"{nombre}: errores {anterior['errores']} → {actual['errores']}")
+    return regresiones
+
+
+def imprimir(resultados, base=None):
+    anteriores = (base or {}).get('resultados', {})
+    print(f"{'escenario':<16}{'n':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'pet/s':>9}{'sql/pet':>9}"
+          f"{'  p95 base':>11}")
+    for nombre, r in resultados.items():
+        anterior = anteriores.get(nombre, {}).get('p95_ms', '-')
+        print(f"{nombre:<16}{r['peticiones']:>6}{r['errores']:>5}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+              f"{r['peticiones_por_segundo']:>9}{str(r['sql_por_peticion']):>9}{str(anterior):>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pruebas de carga de las rutas principales")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS),
+                        help=f"separados por comas (por defecto todos: {', '.join(ESCENARIOS)})")
+    parser.add_argument("--peticiones", type=int, default=200, help="por escenario")
+    parser.add_argument("--hilos", type=int, default=4, help="por proceso")
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--calentamiento", type=int, default=10, help="peticiones sin medir por proceso")
+    parser.add_argument("--habitaciones", type=int, default=60)
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--anos", type=int, default=2)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--base-datos", help="base sintética (por defecto una temporal nueva)")
+    parser.add_argument("--linea-base", default=BASE, help="archivo JSON de la línea base")
+    parser.add_argument("--guardar-base", action="store_true", help="guarda los resultados como línea base")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args()
+
+    nombres = [nombre.strip() for nombre in args.escenarios.split(',') if nombre.strip()]
+    desconocidos = [nombre for nombre in nombres if nombre not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"escenarios desconocidos: {', '.join(desconocidos)}")
+
+    ruta = args.base_datos or os.path.join(tempfile.mkdtemp(prefix='hotel-bench-'), 'hotel.db')
+    if os.path.abspath(ruta) == os.path.abspath(os.path.join(RAIZ, 'hotel.db')):
+        parser.error("el benchmark escribe en la base: usa una distinta de hotel.db")
+    print(f"🏗️  Generando {ruta}...")
+    print(f"   {generar_datos.generar(ruta, args.habitaciones, args.clientes, args.anos, args.semilla)}")
+    database.DATABASE_NAME = ruta
+
+    configuracion = {clave: getattr(args, clave) for clave in
+                     ('peticiones', 'hilos', 'procesos', 'calentamiento', 'habitaciones', 'clientes', 'anos', 'semilla')}
+    resultados = {}
+    for nombre in nombres:
+        print(f"⏱️  {nombre}...")
+        resultados[nombre] = medir(nombre, args.peticiones, args.hilos, args.procesos, args.semilla,
+                                   args.calentamiento, args.anos)
+
+    base = None
+    if os.path.exists(args.linea_base) and not args.guardar_base:
+        with open(args.linea_base, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        if base.get('configuracion') != configuracion:
+            print("⚠️  La línea base se midió con otra configuración: la comparación es orientativa")
+    print()
+    imprimir(resultados, base)
+
+    if args.guardar_base:
+        with open(args.linea_base, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'fecha': date.today().isoformat(),
+                'python': platform.python_version(),
+                'plataforma': platform.platform(),
+                'configuracion': configuracion,
+                'resultados': resultados,
+            }, archivo, ensure_ascii=False, indent=2)
+            archivo.write("\n")
+        print(f"\n💾 Línea base guardada en {args.linea_base}")
+    elif base:
+        regresiones = comparar(resultados, base, args.tolerancia)
+        print()
+        for regresion in regresiones:
+            print(f"   ❌ {regresion}")
+        print("❌ Hay regresiones" if regresiones else f"✅ Sin regresiones (tolerancia {args.tolerancia:.0%})")
+        sys.exit(1 if regresiones else 0)
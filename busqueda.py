@@ -0,0 +1,42 @@
+"""
+Búsqueda de clientes sobre el índice de texto completo clientes_fts (FTS5)
+"""
+
+import re
+
+CAMPOS = ('nombre', 'identificacion', 'correo', 'telefono', 'direccion')
+
+
+def expresion_fts(termino, campos=None):
+    """Convierte lo que escribe el usuario en una consulta FTS5 de prefijos.
+
+    "garcia mar" -> {nombre} : ("garcia"* AND "mar"*). Devuelve None si el
+    término no contiene ninguna palabra.
+    """
+    palabras = re.findall(r"\w+", termino or "")
+    if not palabras:
+        return None
+    expresion = " AND ".join(f'"{palabra}"*' for palabra in palabras)
+    if campos:
+        return "{" + " ".join(campos) + "} : (" + expresion + ")"
+    return expresion
+
+
+def buscar_clientes(cursor, termino, campos=None, limite=None):
+    """Clientes que coinciden con el término, ordenados por relevancia (bm25)"""
+    expresion = expresion_fts(termino, campos)
+    if expresion is None:
+        return []
+    query = """
+        SELECT c.*
+        FROM clientes_fts f
+        JOIN clientes c ON c.id = f.rowid
+        WHERE clientes_fts MATCH ?
+        ORDER BY f.rank
+    """
+    params = [expresion]
+    if limite:
+        query += " LIMIT ?"
+        params.append(limite)
+    cursor.execute(query, params)
+    return cursor.fetchall()
@@ -0,0 +1,74 @@
+"""
+Compresión gzip de las respuestas (opcional: HOTEL_COMPRIMIR=1).
+
+Cada tipo de contenido tiene su nivel (NIVELES); los que no aparecen, como
+las imágenes o los XLSX (ya comprimidos), se envían tal cual, igual que las
+respuestas de menos de UMBRAL bytes. Los archivos de static/ también: los
+sirve send_file con Range y caché de un año (estaticos.py).
+
+Las respuestas en streaming (plantillas de listados, exportación CSV) se
+comprimen por trozos: cada trozo sale comprimido en cuanto llega, sin
+esperar al final de la respuesta. Por eso no se usa Flask-Compress, que
+lee la respuesta entera antes de comprimirla.
+"""
+
+import gzip
+import os
+import zlib
+
+from flask import request
+
+UMBRAL = int(os.environ.get('HOTEL_COMPRIMIR_MINIMO', 1024))
+
+# Los listados HTML se generan en cada petición: nivel moderado. El CSV de
+# exportación es muy repetitivo y compensa comprimir más.
+NIVELES = {
+    'text/html': 6,
+    'application/json': 5,
+    'text/csv': 9,
+    'text/plain': 6,
+}
+
+
+def _comprimir_trozos(trozos, nivel):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # formato gzip
+    for trozo in trozos:
+        # Z_SYNC_FLUSH: el trozo sale ya, sin cerrar el flujo gzip
+        datos = compresor.compress(trozo) + compresor.flush(zlib.Z_SYNC_FLUSH)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def comprimir(respuesta):
+    """after_request: comprime con gzip si el cliente lo acepta y merece la pena"""
+    nivel = NIVELES.get(respuesta.mimetype)
+    if nivel is None or respuesta.status_code != 200 or request.method == 'HEAD':
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    if ('Content-Encoding' in respuesta.headers or respuesta.direct_passthrough
+            or not request.accept_encodings['gzip'] or respuesta.cache_control.no_transform):
+        return respuesta
+
+    if respuesta.is_streamed:
+        respuesta.response = _comprimir_trozos(respuesta.iter_encoded(), nivel)
+        respuesta.headers.pop('Content-Length', None)
+    else:
+        datos = respuesta.get_data()
+        if len(datos) < UMBRAL:
+            return respuesta
+        respuesta.set_data(gzip.compress(datos, nivel, mtime=0))
+    respuesta.headers['Content-Encoding'] = 'gzip'
+
+    # Otra codificación, otros bytes: el ETag fuerte pasa a débil
+    etiqueta, debil = respuesta.get_etag()
+    if etiqueta and not debil:
+        respuesta.set_etag(etiqueta, weak=True)
+    return respuesta
+
+
+def registrar(app):
+    """Activa la compresión en `app` si HOTEL_COMPRIMIR=1"""
+    if os.environ.get('HOTEL_COMPRIMIR') == '1':
+        app.after_request(comprimir)
+    return app
@@ -0,0 +1,113 @@
+"""
+Respuestas condicionales (ETag / If-None-Match) para las vistas GET.
+
+Cada vista declara las tablas de las que depende. El ETag se calcula con sus
+contadores de versiones_tabla (los incrementan los triggers en cada
+escritura), la URL, el usuario de la sesión, el día y la versión del código
+y las plantillas. Si el navegador ya tiene esa versión se responde 304 sin
+ejecutar la vista: ni consultas ni plantilla.
+
+    @app.route('/habitaciones')
+    @depende_de('habitaciones')
+    def lista_habitaciones(): ...
+"""
+
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from datetime import date
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+import database
+
+_RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+_metricas = defaultdict(lambda: {'304': 0, '200': 0, 'omitidas': 0})
+_metricas_lock = threading.Lock()
+
+
+def _version_codigo():
+    """Última modificación de los .py y las plantillas: cambia con cada despliegue"""
+    rutas = [os.path.join(_RAIZ, nombre) for nombre in os.listdir(_RAIZ) if nombre.endswith('.py')]
+    for carpeta, _, archivos in os.walk(os.path.join(_RAIZ, 'templates')):
+        rutas.extend(os.path.join(carpeta, nombre) for nombre in archivos)
+    return str(max((os.path.getmtime(ruta) for ruta in rutas), default=0))
+
+
+VERSION_CODIGO = _version_codigo()
+
+
+def etag(conn, tablas, *extra, versiones=None):
+    """ETag fuerte para la petición actual dadas las tablas de las que depende"""
+    if versiones is None:
+        versiones = database.version_tablas(conn, *tablas)
+    clave = "|".join(map(str, (VERSION_CODIGO, request.full_path, session.get('user_id'),
+                                date.today().isoformat(), versiones) + extra))
+    return hashlib.sha1(clave.encode()).hexdigest()
+
+
+def con_etag(respuesta, valor):
+    respuesta.set_etag(valor)
+    # El navegador puede guardarla, pero debe revalidar con If-None-Match
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def _contar(vista, resultado):
+    with _metricas_lock:
+        _metricas[vista][resultado] += 1
+
+
+def depende_de(*tablas, mensajes=True, versiones=None):
+    """Decorador: responde 304 si no cambió ninguna de `tablas` desde la copia del cliente.
+
+    `tablas` también puede ser una función que recibe los argumentos de la
+    vista y devuelve las tablas (p. ej. según el recurso de la URL).
+    mensajes=False para vistas que no muestran los mensajes flash (JSON).
+    versiones: función tablas -> versiones que sustituye a la lectura de
+    versiones_tabla (p. ej. fragmentos.marcadores, sin tocar SQLite).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            # Los mensajes flash pendientes forman parte de la página: no se cachea
+            if request.method not in ('GET', 'HEAD') or (mensajes and session.get('_flashes')):
+                _contar(request.endpoint or vista.__name__, 'omitidas')
+                return vista(*args, **kwargs)
+
+            dependencias = tablas[0](**kwargs) if len(tablas) == 1 and callable(tablas[0]) else tablas
+            if versiones is not None:
+                valor = etag(None, dependencias, versiones=versiones(dependencias))
+            else:
+                with database.conexion() as conn:
+                    valor = etag(conn, dependencias)
+            if request.if_none_match.contains_weak(valor):
+                _contar(request.endpoint or vista.__name__, '304')
+                return con_etag(Response(status=304), valor)
+
+            respuesta = make_response(vista(*args, **kwargs))
+            # También en streaming: el ETag se calculó antes de consultar nada, así
+            # que como mucho describe una versión anterior y provoca un 200 de más
+            if respuesta.status_code == 200:
+                con_etag(respuesta, valor)
+                _contar(request.endpoint or vista.__name__, '200')
+            else:
+                _contar(request.endpoint or vista.__name__, 'omitidas')
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def estadisticas():
+    """Respuestas por vista: 304 (sin ejecutarla), 200 con ETag y omitidas"""
+    with _metricas_lock:
+        vistas = {vista: dict(contadores) for vista, contadores in _metricas.items()}
+    respondidas = sum(c['304'] + c['200'] for c in vistas.values())
+    no_modificadas = sum(c['304'] for c in vistas.values())
+    return {
+        'vistas': vistas,
+        'tasa_304': round(no_modificadas / respondidas, 3) if respondidas else None,
+    }
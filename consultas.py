@@ -0,0 +1,106 @@
+"""
+Consultas de los listados (reservas, pagos, clientes, habitaciones).
+
+Cada función recibe los filtros de la petición y devuelve un Listado con las
+columnas, el FROM/WHERE, sus parámetros y la clave de orden, para que las
+rutas puedan paginarlo o recorrerlo completo con la misma lógica de filtros.
+"""
+
+from collections import namedtuple
+
+import busqueda
+
+# claves: expresiones SQL que forman la clave de orden (única en conjunto)
+# descendente: orden de todas las claves
+Listado = namedtuple('Listado', 'columnas desde params claves descendente')
+
+
+def sql_listado(listado):
+    """SELECT completo y ordenado de un listado"""
+    direccion = "DESC" if listado.descendente else "ASC"
+    orden = ", ".join(f"{clave} {direccion}" for clave in listado.claves)
+    return f"SELECT {listado.columnas} {listado.desde} ORDER BY {orden}"
+
+
+def listado_reservas(termino='', estado='', fecha_desde='', fecha_hasta=''):
+    desde = """
+        FROM reservas r
+        JOIN clientes c ON r.cliente_id = c.id
+        LEFT JOIN pagos p ON r.id = p.reserva_id
+        WHERE 1=1
+    """
+    params = []
+
+    if termino:
+        desde += " AND (c.nombre LIKE ? OR c.identificacion LIKE ? OR r.habitacion LIKE ?)"
+        params.extend([f"%{termino}%", f"%{termino}%", f"%{termino}%"])
+
+    if estado:
+        desde += " AND r.estado = ?"
+        params.append(estado)
+
+    if fecha_desde:
+        desde += " AND r.fecha_entrada >= ?"
+        params.append(fecha_desde)
+
+    if fecha_hasta:
+        desde += " AND r.fecha_entrada <= ?"
+        params.append(fecha_hasta)
+
+    columnas = """r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono,
+               p.estado as estado_pago, p.monto as monto_pago, p.metodo as metodo_pago"""
+    # p.id desempata si una reserva tuviera más de un pago
+    return Listado(columnas, desde, params, ["r.fecha_entrada", "r.id", "COALESCE(p.id, 0)"], False)
+
+
+def listado_pagos(estado='', metodo=''):
+    desde = """
+        FROM pagos p
+        JOIN clientes c ON p.cliente_id = c.id
+        JOIN reservas r ON p.reserva_id = r.id
+        WHERE 1=1
+    """
+    params = []
+
+    if estado:
+        desde += " AND p.estado = ?"
+        params.append(estado)
+
+    if metodo:
+        desde += " AND p.metodo = ?"
+        params.append(metodo)
+
+    columnas = "p.*, c.nombre as cliente_nombre, r.habitacion, r.fecha_entrada, r.fecha_salida"
+    return Listado(columnas, desde, params, ["p.fecha", "p.id"], True)
+
+
+def listado_clientes(termino='', campo='todos'):
+    if termino:
+        # Búsqueda de texto completo, ordenada por relevancia
+        campos = [campo] if campo in busqueda.CAMPOS else None
+        expresion = busqueda.expresion_fts(termino, campos)
+        if expresion is None:
+            return Listado("*", "FROM clientes WHERE 0", [], ["id"], False)
+        desde = """
+            FROM clientes_fts f
+            JOIN clientes c ON c.id = f.rowid
+            WHERE clientes_fts MATCH ?
+        """
+        return Listado("c.*", desde, [expresion], ["f.rank", "c.id"], False)
+
+    return Listado("*", "FROM clientes WHERE 1=1", [], ["nombre", "id"], False)
+
+
+def listado_habitaciones(estado='', tipo=''):
+    desde = "FROM habitaciones WHERE 1=1"
+    params = []
+
+    if estado:
+        desde += " AND estado = ?"
+        params.append(estado)
+
+    if tipo:
+        desde += " AND tipo = ?"
+        params.append(tipo)
+
+    return Listado("*", desde, params, ["numero"], False)
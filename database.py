@@ -1,140 +1,256 @@
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from urllib.request import pathname2url
+
+import metricas
+import migraciones
 
 DATABASE_NAME = "hotel.db"
 
+# Tamaño máximo del pool por proceso (worker) y espera máxima por una conexión libre
+POOL_SIZE = int(os.environ.get("HOTEL_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("HOTEL_DB_POOL_TIMEOUT", "10"))
+
+# PRAGMAs aplicados a cada conexión nueva del pool
+PRAGMAS = (
+    ("journal_mode", "WAL"),       # lectores no bloquean al escritor
+    ("synchronous", "NORMAL"),     # seguro con WAL y mucho más rápido que FULL
+    ("cache_size", "-16000"),      # ~16 MB de caché de páginas por conexión
+    ("mmap_size", "268435456"),    # 256 MB mapeados en memoria
+    ("busy_timeout", "5000"),      # esperar 5 s antes de "database is locked"
+    ("temp_store", "MEMORY"),
+)
+
+
+class ConexionPool(sqlite3.Connection):
+    """Conexión SQLite que vuelve al pool al cerrarse.
+
+    Sus sentencias pasan por metricas.CursorMedido (tiempo y filas por ruta).
+    """
+
+    pool = None
+
+    def cursor(self, factory=metricas.CursorMedido):
+        return super().cursor(factory)
+
+    # Los atajos de Connection no llaman a cursor(): se redirigen para medirlos
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.liberar(self)
+        else:
+            super().close()
+
+    def cerrar_definitivamente(self):
+        self.pool = None
+        super().close()
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones SQLite de larga duración.
+
+    Las llamadas anidadas dentro de un mismo hilo reciben la misma conexión,
+    que solo vuelve al pool cuando se libera la más externa.
+    """
+
+    def __init__(self, ruta, tamano=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._libres = LifoQueue()
+        self._en_uso = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.creadas = 0
+        self.checkouts = 0
+        self.esperas = 0
+        self.tiempo_espera = 0.0
+        self.timeouts = 0
+
+    def _crear(self):
+        conn = sqlite3.connect(self.ruta, timeout=self.timeout, factory=ConexionPool,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for nombre, valor in PRAGMAS:
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        conn.pool = self
+        return conn
+
+    def obtener(self):
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            local.profundidad += 1
+            return conn
+
+        try:
+            conn = self._libres.get_nowait()
+        except Empty:
+            with self._lock:
+                crear = self.creadas < self.tamano
+                if crear:
+                    self.creadas += 1
+            if crear:
+                try:
+                    conn = self._crear()
+                except Exception:
+                    with self._lock:
+                        self.creadas -= 1
+                    raise
+            else:
+                inicio = time.perf_counter()
+                try:
+                    conn = self._libres.get(timeout=self.timeout)
+                except Empty:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise sqlite3.OperationalError("No hay conexiones libres en el pool")
+                finally:
+                    with self._lock:
+                        self.esperas += 1
+                        self.tiempo_espera += time.perf_counter() - inicio
+
+        with self._lock:
+            self.checkouts += 1
+            self._en_uso.add(id(conn))
+        local.conn = conn
+        local.profundidad = 1
+        return conn
+
+    def liberar(self, conn):
+        local = self._local
+        if getattr(local, 'conn', None) is conn:
+            local.profundidad -= 1
+            if local.profundidad > 0:
+                return
+            local.conn = None
+
+        with self._lock:
+            if id(conn) not in self._en_uso:
+                return  # ya devuelta (doble close)
+            self._en_uso.discard(id(conn))
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexión inservible: se descarta y se podrá crear otra
+            with self._lock:
+                self.creadas -= 1
+            conn.cerrar_definitivamente()
+            return
+        self._libres.put(conn)
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().cerrar_definitivamente()
+            except Empty:
+                break
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'ruta': self.ruta,
+                'tamano_maximo': self.tamano,
+                'creadas': self.creadas,
+                'libres': self._libres.qsize(),
+                'en_uso': len(self._en_uso),
+                'checkouts': self.checkouts,
+                'esperas': self.esperas,
+                'tiempo_espera_total': round(self.tiempo_espera, 6),
+                'timeouts': self.timeouts,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    """Devuelve el pool del proceso actual (se recrea tras un fork o si cambia la ruta)"""
+    global _pool
+    pool = _pool
+    if pool is None or pool.pid != os.getpid() or pool.ruta != DATABASE_NAME:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.pid != os.getpid() or pool.ruta != DATABASE_NAME:
+                if pool is not None and pool.pid == os.getpid():
+                    pool.cerrar()
+                pool = _pool = PoolConexiones(DATABASE_NAME)
+    return pool
+
+
 def get_connection():
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Obtiene una conexión del pool; conn.close() la devuelve al pool"""
+    return _obtener_pool().obtener()
+
+
+@contextmanager
+def conexion():
+    """Context manager que presta una conexión del pool y la devuelve al salir.
+
+    Lo que no se haya confirmado con commit() se descarta al devolverla.
+    """
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def conexion_solo_lectura(ruta=None):
+    """Conexión aparte del pool que no puede escribir (mode=ro).
+
+    Con WAL lee una instantánea sin bloquear a los escritores; sirve para
+    auditorías y scripts que no deben modificar la base.
+    """
+    ruta = pathname2url(os.path.abspath(ruta or DATABASE_NAME))
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, timeout=POOL_TIMEOUT,
+                           check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
+
+def estadisticas_pool():
+    """Estadísticas del pool del proceso actual (para dimensionarlo)"""
+    return _obtener_pool().estadisticas()
+
+
+def cerrar_pool():
+    """Cierra las conexiones libres del pool (apagado del worker, tests)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+        _pool = None
+
+
+def version_tablas(conn, *tablas):
+    """Versión actual de cada tabla (la incrementan los triggers en cada escritura)"""
+    marcadores = ", ".join("?" for _ in tablas)
+    filas = conn.execute(f"SELECT tabla, version FROM versiones_tabla WHERE tabla IN ({marcadores})",
+                         tablas).fetchall()
+    versiones = dict((fila[0], fila[1]) for fila in filas)
+    return tuple(versiones.get(tabla, 0) for tabla in tablas)
+
+
 def init_db():
-    with get_connection () as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS clientes(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            identificacion TEXT NOT NULL,
-            direccion TEXT NOT NULL,
-            correo TEXT NOT NULL,
-            telefono TEXT NOT NULL
-        )
-        """)
-        # Agregar columnas si no existen
-        try:
-            cursor.execute("ALTER TABLE clientes ADD COLUMN direccion TEXT NOT NULL DEFAULT ''")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE clientes ADD COLUMN correo TEXT NOT NULL DEFAULT ''")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE clientes ADD COLUMN telefono TEXT NOT NULL DEFAULT ''")
-        except Exception:
-            pass
-        # Tabla pagos
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS pagos(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            reserva_id INTEGER NOT NULL,
-            cliente_id INTEGER NOT NULL,
-            monto REAL NOT NULL,
-            fecha TEXT NOT NULL,
-            metodo TEXT NOT NULL,
-            estado TEXT DEFAULT 'Pendiente',
-            referencia TEXT,
-            notas TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(reserva_id) REFERENCES reservas(id),
-            FOREIGN KEY(cliente_id) REFERENCES clientes(id)
-        )
-        """)
-        
-        # Agregar columnas si no existen
-        try:
-            cursor.execute("ALTER TABLE pagos ADD COLUMN reserva_id INTEGER")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE pagos ADD COLUMN estado TEXT DEFAULT 'Pendiente'")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE pagos ADD COLUMN referencia TEXT")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE pagos ADD COLUMN notas TEXT")
-        except Exception:
-            pass
-        try:
-            cursor.execute("ALTER TABLE pagos ADD COLUMN timestamp DATETIME DEFAULT CURRENT_TIMESTAMP")
-        except Exception:
-            pass
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS usuarios(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL
-        )
-        """)
-        
-        # Tabla reservas
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reservas(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cliente_id INTEGER NOT NULL,
-            habitacion TEXT NOT NULL,
-            fecha_entrada TEXT NOT NULL,
-            fecha_salida TEXT NOT NULL,
-            num_personas INTEGER NOT NULL,
-            precio_total REAL NOT NULL,
-            estado TEXT DEFAULT 'Confirmada',
-            notas TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(cliente_id) REFERENCES clientes(id)
-        )
-        """)
-        
-        # Tabla habitaciones
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS habitaciones(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero TEXT NOT NULL UNIQUE,
-            tipo TEXT NOT NULL,
-            capacidad INTEGER NOT NULL,
-            precio_noche REAL NOT NULL,
-            estado TEXT DEFAULT 'Disponible',
-            amenidades TEXT,
-            descripcion TEXT,
-            imagen TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # Agregar columna imagen si no existe
-        try:
-            cursor.execute("ALTER TABLE habitaciones ADD COLUMN imagen TEXT")
-        except Exception:
-            pass
-        
-
-        
-        # Habitaciones de ejemplo
-        cursor.execute("SELECT COUNT(*) FROM habitaciones")
-        if cursor.fetchone()[0] == 0:
-            habitaciones_ejemplo = [
-                ('101', 'Individual', 1, 120000.00, 'Disponible', 'WiFi, TV, A/C', 'Habitación individual con vista al jardín'),
-                ('102', 'Individual', 1, 120000.00, 'Disponible', 'WiFi, TV, A/C', 'Habitación individual con vista al jardín'),
-                ('201', 'Doble', 2, 250000.00, 'Disponible', 'WiFi, TV, A/C, Balcón', 'Habitación doble con balcón'),
-                ('202', 'Doble', 2, 250000.00, 'Disponible', 'WiFi, TV, A/C, Balcón', 'Habitación doble con balcón'),
-                ('301', 'Suite', 4, 380000.00, 'Disponible', 'WiFi, TV, A/C, Jacuzzi, Balcón', 'Suite de lujo con jacuzzi'),
-                ('302', 'Suite', 4, 380000.00, 'Disponible', 'WiFi, TV, A/C, Jacuzzi, Balcón', 'Suite de lujo con jacuzzi')
-            ]
-            cursor.executemany("""
-                INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, habitaciones_ejemplo)
-        
-        conn.commit()
\ No newline at end of file
+    """Aplica las migraciones pendientes (solo lee la versión si el esquema está al día)"""
+    with conexion() as conn:
+        migraciones.migrar(conn)
@@ -0,0 +1,279 @@
+"""
+Motor de disponibilidad de habitaciones.
+
+Cada worker mantiene en memoria, por habitación, las estancias activas
+ordenadas por fecha de entrada. "¿Qué habitaciones están libres del D1 al D2?"
+se responde con una búsqueda binaria por habitación, sin consultar reservas.
+
+El índice se pone al día de forma incremental leyendo solo las reservas que
+aparecen en cambios_reservas desde la última sincronización (las escriben los
+triggers, así que también llegan los cambios hechos por otros workers).
+
+La comprobación definitiva contra dobles reservas no depende de la memoria:
+reservar() inserta con INSERT ... SELECT ... WHERE NOT EXISTS dentro de una
+transacción BEGIN IMMEDIATE.
+"""
+
+import threading
+from bisect import bisect_left
+from datetime import date
+
+import database
+
+# Estados en los que una reserva ocupa la habitación
+ESTADOS_ACTIVOS = ('Pendiente', 'Confirmada', 'Reservada', 'Ocupada')
+
+# Estados de habitación que no se ofrecen como libres ni se pueden reservar
+ESTADOS_NO_RESERVABLES = ('Mantenimiento', 'Limpieza')
+
+# Entradas de cambios_reservas que se conservan; un worker más atrasado
+# reconstruye el índice completo
+RETENCION_CAMBIOS = 10000
+
+_ACTIVOS_SQL = ", ".join(f"'{estado}'" for estado in ESTADOS_ACTIVOS)
+
+
+class HabitacionNoDisponible(Exception):
+    """La habitación ya tiene una reserva activa que se solapa con las fechas"""
+
+
+def validar_fechas(fecha_entrada, fecha_salida):
+    """Normaliza las fechas a YYYY-MM-DD y exige salida posterior a entrada"""
+    entrada = date.fromisoformat(str(fecha_entrada)[:10])
+    salida = date.fromisoformat(str(fecha_salida)[:10])
+    if salida <= entrada:
+        raise ValueError("La fecha de salida debe ser posterior a la de entrada.")
+    return entrada.isoformat(), salida.isoformat()
+
+
+class _Estancias:
+    """Estancias activas de una habitación ordenadas por entrada"""
+
+    def __init__(self):
+        self.entradas = []
+        self.salidas = []
+        self.ids = []
+        self.max_salida = []  # máximo acumulado de salidas
+
+    def agregar(self, entrada, salida, reserva_id):
+        posicion = bisect_left(self.entradas, entrada)
+        self.entradas.insert(posicion, entrada)
+        self.salidas.insert(posicion, salida)
+        self.ids.insert(posicion, reserva_id)
+        self._recalcular(posicion)
+
+    def quitar(self, reserva_id):
+        posicion = self.ids.index(reserva_id)
+        del self.entradas[posicion], self.salidas[posicion], self.ids[posicion]
+        self._recalcular(posicion)
+
+    def _recalcular(self, desde):
+        del self.max_salida[desde:]
+        maximo = self.max_salida[-1] if self.max_salida else ""
+        for salida in self.salidas[desde:]:
+            maximo = max(maximo, salida)
+            self.max_salida.append(maximo)
+
+    def libre(self, entrada, salida):
+        # Las estancias que empiezan antes de `salida` son las únicas candidatas;
+        # se solapan si alguna termina después de `entrada`
+        k = bisect_left(self.entradas, salida)
+        return k == 0 or self.max_salida[k - 1] <= entrada
+
+
+class IndiceDisponibilidad:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ruta = None
+        self._seq = None
+        self._version_habitaciones = None
+        self.habitaciones = {}   # numero -> (tipo, capacidad, precio_noche, estado)
+        self.orden = []          # números de habitación ordenados
+        self.estancias = {}      # numero -> _Estancias
+        self.ubicacion = {}      # reserva_id -> numero
+        self.reconstrucciones = 0
+        self.actualizaciones = 0
+
+    def _cargar_habitaciones(self, conn):
+        filas = conn.execute("SELECT numero, tipo, capacidad, precio_noche, estado FROM habitaciones").fetchall()
+        self.habitaciones = {fila['numero']: (fila['tipo'], fila['capacidad'], fila['precio_noche'], fila['estado'])
+                             for fila in filas}
+        self.orden = sorted(self.habitaciones)
+
+    def _reconstruir(self, conn, seq):
+        self.estancias = {}
+        self.ubicacion = {}
+        filas = conn.execute(f"""
+            SELECT id, habitacion, fecha_entrada, fecha_salida FROM reservas
+            WHERE estado IN ({_ACTIVOS_SQL})
+        """)
+        for fila in filas:
+            self._agregar(fila['id'], fila['habitacion'], fila['fecha_entrada'], fila['fecha_salida'])
+        self._seq = seq
+        self.reconstrucciones += 1
+
+    def _agregar(self, reserva_id, numero, entrada, salida):
+        entrada, salida = str(entrada)[:10], str(salida)[:10]
+        self.estancias.setdefault(numero, _Estancias()).agregar(entrada, salida, reserva_id)
+        self.ubicacion[reserva_id] = numero
+
+    def _quitar(self, reserva_id):
+        numero = self.ubicacion.pop(reserva_id, None)
+        if numero is not None:
+            self.estancias[numero].quitar(reserva_id)
+
+    def _aplicar_cambios(self, conn, desde_seq, hasta_seq):
+        ids = [fila[0] for fila in conn.execute(
+            "SELECT DISTINCT reserva_id FROM cambios_reservas WHERE seq > ? AND seq <= ?",
+            (desde_seq, hasta_seq))]
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            marcadores = ", ".join("?" for _ in lote)
+            actuales = {fila['id']: fila for fila in conn.execute(f"""
+                SELECT id, habitacion, fecha_entrada, fecha_salida, estado
+                FROM reservas WHERE id IN ({marcadores})
+            """, lote)}
+            for reserva_id in lote:
+                self._quitar(reserva_id)
+                fila = actuales.get(reserva_id)
+                if fila is not None and fila['estado'] in ESTADOS_ACTIVOS:
+                    self._agregar(reserva_id, fila['habitacion'], fila['fecha_entrada'], fila['fecha_salida'])
+        self._seq = hasta_seq
+        self.actualizaciones += 1
+
+    def sincronizar(self, conn):
+        """Pone el índice al día con una lectura barata si nada cambió"""
+        fila = conn.execute("""
+            SELECT COALESCE((SELECT MAX(seq) FROM cambios_reservas), 0),
+                   COALESCE((SELECT MIN(seq) FROM cambios_reservas), 0),
+                   (SELECT version FROM versiones_tabla WHERE tabla = 'habitaciones')
+        """).fetchone()
+        seq, seq_minimo, version_habitaciones = fila[0], fila[1], fila[2]
+
+        with self._lock:
+            if self._ruta != database.DATABASE_NAME:
+                self._ruta = database.DATABASE_NAME
+                self._seq = None
+                self._version_habitaciones = None
+            if version_habitaciones != self._version_habitaciones:
+                self._cargar_habitaciones(conn)
+                self._version_habitaciones = version_habitaciones
+            if self._seq is None or (seq_minimo and self._seq < seq_minimo - 1):
+                self._reconstruir(conn, seq)
+            elif seq != self._seq:
+                self._aplicar_cambios(conn, self._seq, seq)
+
+    def libre(self, numero, entrada, salida):
+        estancias = self.estancias.get(numero)
+        return estancias is None or estancias.libre(entrada, salida)
+
+    def habitaciones_libres(self, entrada, salida, tipo=None, capacidad=None):
+        with self._lock:
+            libres = []
+            for numero in self.orden:
+                tipo_habitacion, capacidad_habitacion, precio_noche, estado = self.habitaciones[numero]
+                if estado in ESTADOS_NO_RESERVABLES:
+                    continue
+                if tipo and tipo_habitacion != tipo:
+                    continue
+                if capacidad and capacidad_habitacion < capacidad:
+                    continue
+                if self.libre(numero, entrada, salida):
+                    libres.append({'numero': numero, 'tipo': tipo_habitacion,
+                                   'capacidad': capacidad_habitacion, 'precio_noche': precio_noche})
+            return libres
+
+
+_indice = IndiceDisponibilidad()
+
+
+def habitaciones_libres(conn, fecha_entrada, fecha_salida, tipo=None, capacidad=None):
+    """Habitaciones reservables sin reservas activas que se solapen con [entrada, salida)"""
+    entrada, salida = validar_fechas(fecha_entrada, fecha_salida)
+    _indice.sincronizar(conn)
+    return _indice.habitaciones_libres(entrada, salida, tipo, capacidad)
+
+
+def esta_libre(conn, habitacion, fecha_entrada, fecha_salida):
+    entrada, salida = validar_fechas(fecha_entrada, fecha_salida)
+    _indice.sincronizar(conn)
+    with _indice._lock:
+        return _indice.libre(habitacion, entrada, salida)
+
+
+def reservar(conn, cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas,
+             precio_total, estado='Confirmada', notas=''):
+    """Inserta la reserva solo si la habitación está libre en esas fechas.
+
+    Abre (si no la hay) una transacción BEGIN IMMEDIATE que queda abierta para
+    que el llamador agregue el pago y haga commit. Lanza HabitacionNoDisponible
+    si otra reserva activa se solapa; devuelve el id de la reserva.
+    """
+    entrada, salida = validar_fechas(fecha_entrada, fecha_salida)
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO reservas (cliente_id, habitacion, fecha_entrada, fecha_salida,
+                              num_personas, precio_total, estado, notas, timestamp)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP
+        WHERE NOT EXISTS (
+            SELECT 1 FROM reservas
+            WHERE habitacion = ? AND estado IN ({_ACTIVOS_SQL})
+            AND fecha_entrada < ? AND fecha_salida > ?
+        )
+    """, (cliente_id, habitacion, entrada, salida, num_personas, precio_total, estado, notas,
+          habitacion, salida, entrada))
+    if cursor.rowcount == 0:
+        raise HabitacionNoDisponible(
+            f"La habitación {habitacion} ya está reservada entre {entrada} y {salida}.")
+    reserva_id = cursor.lastrowid
+
+    # Mantener acotado el registro de cambios
+    cursor.execute("DELETE FROM cambios_reservas WHERE seq <= (SELECT MAX(seq) FROM cambios_reservas) - ?",
+                   (RETENCION_CAMBIOS,))
+    return reserva_id
+
+
+def reservar_con_pago(conn, cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas,
+                      precio_total, estado='Confirmada', notas=''):
+    """reservar() más el pago automático pendiente y la habitación marcada como Reservada.
+
+    Devuelve (reserva_id, pago_id); la transacción queda abierta como en reservar().
+    """
+    reserva_id = reservar(conn, cliente_id, habitacion, fecha_entrada, fecha_salida,
+                          num_personas, precio_total, estado, notas)
+    cursor = conn.execute("""
+        INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas, timestamp)
+        VALUES (?, ?, ?, date('now', 'localtime'), 'Pendiente', 'Pendiente', ?, ?, CURRENT_TIMESTAMP)
+    """, (reserva_id, cliente_id, precio_total, f'RES-{reserva_id}', f'Pago automático por reserva #{reserva_id}'))
+    pago_id = cursor.lastrowid
+    # Una habitación ocupada o en limpieza no pasa a Reservada por una reserva futura
+    conn.execute("UPDATE habitaciones SET estado = 'Reservada' WHERE numero = ? AND estado = 'Disponible'",
+                 (habitacion,))
+    return reserva_id, pago_id
+
+
+def forzar_reconstruccion(conn):
+    """Hace que todos los workers reconstruyan el índice (tras cargas masivas).
+
+    Vacía cambios_reservas dejando una única entrada con un hueco en la
+    secuencia: cualquier índice sincronizado antes queda por detrás del mínimo.
+    """
+    conn.execute("""
+        INSERT INTO cambios_reservas (seq, reserva_id)
+        VALUES ((SELECT COALESCE(MAX(seq), 0) + 2 FROM cambios_reservas), 0)
+    """)
+    conn.execute("DELETE FROM cambios_reservas WHERE seq < (SELECT MAX(seq) FROM cambios_reservas)")
+
+
+def estadisticas():
+    return {
+        'habitaciones': len(_indice.habitaciones),
+        'reservas_activas': len(_indice.ubicacion),
+        'seq': _indice._seq,
+        'reconstrucciones': _indice.reconstrucciones,
+        'actualizaciones': _indice.actualizaciones,
+    }
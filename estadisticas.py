@@ -0,0 +1,146 @@
+"""
+Estadísticas del panel de reportes, calculadas en pocas pasadas y cacheadas.
+
+Cada tabla se recorre una sola vez (por índice cuando lo hay) y de esa pasada
+salen los totales, los desgloses por estado/método y las cifras del mes. El
+resultado se guarda en memoria:
+
+- durante TTL segundos se sirve sin ninguna consulta;
+- pasado el TTL (o tras una escritura en este worker) se lee versiones_tabla
+  y, si ninguna de las tablas cambió, se sigue sirviendo el mismo resultado;
+- solo si cambió alguna se vuelve a calcular.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+import database
+
+TABLAS = ("clientes", "reservas", "habitaciones", "pagos")
+
+# Segundos durante los que el resultado se sirve sin consultar la base
+TTL = 30
+
+_cache = {}   # ruta de la base -> {'versiones', 'mes', 'verificado', 'datos'}
+_lock = threading.Lock()
+_contadores = {'aciertos': 0, 'verificaciones': 0, 'calculos': 0}
+
+
+def _mes_actual():
+    """(YYYY-MM, inicio del mes, inicio del siguiente) en UTC, como date('now')"""
+    hoy = datetime.now(timezone.utc).date()
+    siguiente = hoy.replace(year=hoy.year + 1, month=1) if hoy.month == 12 else hoy.replace(month=hoy.month + 1)
+    return hoy.strftime('%Y-%m'), hoy.replace(day=1).isoformat(), siguiente.replace(day=1).isoformat()
+
+
+def calcular(conn, inicio_mes, fin_mes):
+    """Todas las cifras del panel con una consulta por tabla"""
+    cursor = conn.cursor()
+
+    # Reservas: total, por estado y del mes en una pasada por idx_reservas_estado_fecha
+    cursor.execute("""
+        SELECT estado, COUNT(*) AS cantidad,
+               SUM(fecha_entrada >= ? AND fecha_entrada < ?) AS del_mes
+        FROM reservas
+        GROUP BY estado
+    """, (inicio_mes, fin_mes))
+    reservas_por_estado = cursor.fetchall()
+
+    cursor.execute("SELECT estado, COUNT(*) AS cantidad FROM habitaciones GROUP BY estado")
+    habitaciones_por_estado = cursor.fetchall()
+
+    # Pagos completados: cantidad, ingresos y los del mes, por método (índice parcial)
+    cursor.execute("""
+        SELECT metodo, COUNT(*) AS pagos, SUM(monto) AS total,
+               SUM(CASE WHEN fecha >= ? AND fecha < ? THEN monto ELSE 0 END) AS del_mes
+        FROM pagos
+        WHERE estado = 'Completado'
+        GROUP BY metodo
+    """, (inicio_mes, fin_mes))
+    ingresos_por_metodo = cursor.fetchall()
+
+    # Clientes: total y los cinco con más reservas
+    cursor.execute("""
+        SELECT c.nombre, COALESCE(r.reservas, 0) AS reservas,
+               COUNT(*) OVER () AS total_clientes
+        FROM clientes c
+        LEFT JOIN (SELECT cliente_id, COUNT(*) AS reservas FROM reservas GROUP BY cliente_id) r
+            ON r.cliente_id = c.id
+        ORDER BY reservas DESC
+        LIMIT 5
+    """)
+    top_clientes = cursor.fetchall()
+
+    return {
+        'total_clientes': top_clientes[0]['total_clientes'] if top_clientes else 0,
+        'total_reservas': sum(fila['cantidad'] for fila in reservas_por_estado),
+        'total_habitaciones': sum(fila['cantidad'] for fila in habitaciones_por_estado),
+        'pagos_completados': sum(fila['pagos'] for fila in ingresos_por_metodo),
+        'ingresos_totales': sum(fila['total'] or 0 for fila in ingresos_por_metodo),
+        'reservas_por_estado': reservas_por_estado,
+        'habitaciones_por_estado': habitaciones_por_estado,
+        'top_clientes': top_clientes,
+        'ingresos_por_metodo': ingresos_por_metodo,
+        'reservas_mes_actual': sum(fila['del_mes'] or 0 for fila in reservas_por_estado),
+        'ingresos_mes_actual': sum(fila['del_mes'] or 0 for fila in ingresos_por_metodo),
+    }
+
+
+def resumen():
+    """Estadísticas del panel; solo abre una conexión si el TTL venció"""
+    ruta = database.DATABASE_NAME
+    mes, inicio_mes, fin_mes = _mes_actual()
+    ahora = time.monotonic()
+
+    with _lock:
+        entrada = _cache.get(ruta)
+        if entrada and entrada['mes'] == mes and ahora - entrada['verificado'] < TTL:
+            _contadores['aciertos'] += 1
+            return entrada['datos']
+
+    with database.conexion() as conn:
+        versiones = database.version_tablas(conn, *TABLAS)
+        if entrada and entrada['mes'] == mes and entrada['versiones'] == versiones:
+            with _lock:
+                entrada['verificado'] = ahora
+                _contadores['verificaciones'] += 1
+            return entrada['datos']
+
+        # Lectura consistente: las versiones y las cifras salen de la misma instantánea
+        conn.execute("BEGIN")
+        try:
+            versiones = database.version_tablas(conn, *TABLAS)
+            datos = calcular(conn, inicio_mes, fin_mes)
+        finally:
+            conn.rollback()
+
+    with _lock:
+        _cache[ruta] = {'versiones': versiones, 'mes': mes, 'verificado': ahora, 'datos': datos}
+        _contadores['calculos'] += 1
+    return datos
+
+
+def versiones(tablas=TABLAS):
+    """Versiones de `tablas` con las que se calcularon los datos que sirve resumen().
+
+    Para el ETag de la página: durante el TTL resumen() no ve las escrituras
+    de otros workers, así que el ETag debe describir los datos servidos y no
+    las versiones actuales de la base.
+    """
+    resumen()
+    with _lock:
+        calculadas = dict(zip(TABLAS, _cache[database.DATABASE_NAME]['versiones']))
+    return tuple(calculadas[tabla] for tabla in tablas)
+
+
+def invalidar():
+    """Fuerza a comprobar las versiones en la próxima petición (tras escribir)"""
+    with _lock:
+        for entrada in _cache.values():
+            entrada['verificado'] = float('-inf')
+
+
+def estado():
+    with _lock:
+        return dict(_contadores, ttl=TTL)
@@ -0,0 +1,204 @@
+"""
+Máquina de estados de reservas y habitaciones.
+
+Cada transición es un solo UPDATE con guarda: solo cambia la fila si su
+estado actual es uno desde el que se puede llegar al nuevo, y devuelve la
+fila resultante con RETURNING. Dos recepcionistas que hacen check-in de la
+misma reserva a la vez no pisan el cambio del otro: el segundo UPDATE no
+encuentra la fila en un estado de origen válido y falla.
+
+Como disponibilidad.reservar(), las funciones abren BEGIN IMMEDIATE si no hay
+una transacción en curso y la dejan abierta: quien llama hace commit o
+rollback.
+
+Pasar una reserva inactiva (Cancelada) a un estado activo vuelve a ocupar la
+habitación: el UPDATE lleva entonces la misma guarda NOT EXISTS que
+disponibilidad.reservar() y falla con HabitacionNoDisponible si otra reserva
+activa se solapa.
+"""
+
+from disponibilidad import ESTADOS_ACTIVOS, HabitacionNoDisponible
+
+_ACTIVOS_SQL = ", ".join(f"'{estado}'" for estado in ESTADOS_ACTIVOS)
+
+# Condición añadida al UPDATE de reservas que pasan a un estado activo: las
+# que ya lo eran no cambian de ocupación; las demás necesitan las fechas libres
+_GUARDA_SOLAPE = f"""
+    AND (estado IN ({_ACTIVOS_SQL}) OR NOT EXISTS (
+        SELECT 1 FROM reservas AS otra
+        WHERE otra.habitacion = reservas.habitacion AND otra.id != reservas.id
+        AND otra.estado IN ({_ACTIVOS_SQL})
+        AND otra.fecha_entrada < reservas.fecha_salida AND otra.fecha_salida > reservas.fecha_entrada
+    ))"""
+
+# Una habitación Reservada vuelve a Disponible si ya no le queda ninguna
+# estancia activa presente o futura (al cancelar o borrar su reserva)
+_LIBERAR_HABITACION = f"""
+    UPDATE habitaciones SET estado = 'Disponible'
+    WHERE numero = ? AND estado = 'Reservada' AND NOT EXISTS (
+        SELECT 1 FROM reservas
+        WHERE reservas.habitacion = habitaciones.numero AND reservas.estado IN ({_ACTIVOS_SQL})
+        AND reservas.fecha_salida > date('now', 'localtime')
+    )
+    RETURNING *"""
+
+# estado: estados a los que puede pasar
+RESERVA = {
+    'Pendiente': ('Confirmada', 'Ocupada', 'Cancelada'),
+    'Confirmada': ('Pendiente', 'Ocupada', 'Cancelada'),
+    'Reservada': ('Confirmada', 'Ocupada', 'Cancelada'),  # estado antiguo, equivale a Confirmada
+    'Ocupada': ('Completada',),
+    'Completada': (),
+    'Cancelada': ('Pendiente',),
+}
+
+HABITACION = {
+    'Disponible': ('Reservada', 'Ocupada', 'Mantenimiento'),
+    'Reservada': ('Disponible', 'Ocupada', 'Mantenimiento'),
+    'Ocupada': ('Limpieza',),
+    'Limpieza': ('Disponible', 'Mantenimiento'),
+    'Mantenimiento': ('Disponible', 'Limpieza'),
+}
+
+# Estado que toma la habitación cuando la reserva pasa a cada estado
+EFECTO_HABITACION = {
+    'Ocupada': 'Ocupada',     # check-in
+    'Completada': 'Limpieza',  # check-out
+}
+
+# Estados con los que se puede crear un registro; a los demás se llega con transiciones
+INICIALES = {
+    'reservas': ('Pendiente', 'Confirmada'),
+    'habitaciones': ('Disponible',),
+}
+
+_MAQUINAS = {'reservas': RESERVA, 'habitaciones': HABITACION}
+_NOMBRES = {'reservas': 'Reserva', 'habitaciones': 'Habitación'}
+
+
+class TransicionNoPermitida(Exception):
+    """El registro no existe o su estado actual no permite pasar al pedido"""
+
+
+def validar_inicial(tabla, estado):
+    """ValueError si un registro nuevo de `tabla` no puede empezar en `estado`"""
+    if estado not in _MAQUINAS[tabla]:
+        raise ValueError(f"Estado no válido: {estado}")
+    if estado not in INICIALES[tabla]:
+        raise ValueError(f"{_NOMBRES[tabla]} nueva: el estado debe ser {' o '.join(INICIALES[tabla])}, no {estado}.")
+
+
+def origenes(maquina, destino):
+    """Estados desde los que se puede llegar a `destino`"""
+    return tuple(estado for estado, destinos in maquina.items() if destino in destinos)
+
+
+def _transicion(conn, tabla, maquina, destino, columna, valor, guarda=""):
+    desde = origenes(maquina, destino)
+    if not desde:
+        raise TransicionNoPermitida(f"Estado no válido: {destino}")
+    marcadores = ", ".join("?" for _ in desde)
+    fila = conn.execute(f"""
+        UPDATE {tabla} SET estado = ?
+        WHERE {columna} = ? AND estado IN ({marcadores}){guarda}
+        RETURNING *
+    """, (destino, valor, *desde)).fetchone()
+    if fila is None:
+        # Solo para el mensaje: el cambio ya no se ha aplicado
+        actual = conn.execute(f"SELECT * FROM {tabla} WHERE {columna} = ?", (valor,)).fetchone()
+        if actual is None:
+            raise TransicionNoPermitida(f"{_NOMBRES[tabla]} {valor} no encontrada.")
+        if guarda and actual['estado'] in desde:
+            raise HabitacionNoDisponible(
+                f"La habitación {actual['habitacion']} ya está reservada entre "
+                f"{actual['fecha_entrada']} y {actual['fecha_salida']}.")
+        raise TransicionNoPermitida(
+            f"{_NOMBRES[tabla]} {valor}: no se puede pasar de {actual['estado']} a {destino}.")
+    return fila
+
+
+def _empezar(conn):
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def cambiar_reserva(conn, reserva_id, destino):
+    """Pasa la reserva a `destino` y, en check-in, check-out y cancelación, también su habitación.
+
+    Devuelve (reserva, habitacion) tal como quedan; habitacion es None si no cambia.
+    Lanza HabitacionNoDisponible si la reserva vuelve a estar activa y otra
+    ocupa ya esas fechas.
+    """
+    _empezar(conn)
+    guarda = _GUARDA_SOLAPE if destino in ESTADOS_ACTIVOS else ""
+    reserva = _transicion(conn, 'reservas', RESERVA, destino, 'id', reserva_id, guarda)
+    habitacion = None
+    if destino in EFECTO_HABITACION:
+        habitacion = _transicion(conn, 'habitaciones', HABITACION, EFECTO_HABITACION[destino],
+                                 'numero', reserva['habitacion'])
+    elif destino == 'Cancelada':
+        # Solo si no le queda otra estancia activa; si no, la habitación no cambia
+        habitacion = liberar_habitacion(conn, reserva['habitacion'])
+    return reserva, habitacion
+
+
+def liberar_habitacion(conn, numero):
+    """Reservada -> Disponible si no le queda otra estancia activa; devuelve la fila o None"""
+    _empezar(conn)
+    return conn.execute(_LIBERAR_HABITACION, (numero,)).fetchone()
+
+
+def checkin(conn, reserva_id):
+    return cambiar_reserva(conn, reserva_id, 'Ocupada')
+
+
+def checkout(conn, reserva_id):
+    return cambiar_reserva(conn, reserva_id, 'Completada')
+
+
+def cambiar_habitacion(conn, habitacion_id, destino):
+    """Pasa la habitación a `destino`; devuelve la fila tal como queda"""
+    _empezar(conn)
+    return _transicion(conn, 'habitaciones', HABITACION, destino, 'id', habitacion_id)
+
+
+def cambiar_reservas(conn, ids, destino, todo_o_nada=False):
+    """Aplica la misma transición a varias reservas en una sola transacción.
+
+    Cada reserva va en su propio SAVEPOINT: las que no pueden cambiar se
+    deshacen sin afectar a las demás (o todas, con todo_o_nada). Devuelve una
+    lista de dicts {id, ok, reserva, habitacion, error} en el orden de `ids`.
+    """
+    _empezar(conn)
+    resultados = []
+    for reserva_id in ids:
+        conn.execute("SAVEPOINT transicion")
+        try:
+            reserva, habitacion = cambiar_reserva(conn, reserva_id, destino)
+        except (TransicionNoPermitida, HabitacionNoDisponible) as e:
+            conn.execute("ROLLBACK TO transicion")
+            conn.execute("RELEASE transicion")
+            if todo_o_nada:
+                raise
+            resultados.append({'id': reserva_id, 'ok': False, 'error': str(e)})
+            continue
+        conn.execute("RELEASE transicion")
+        resultados.append({'id': reserva_id, 'ok': True, 'reserva': reserva, 'habitacion': habitacion})
+    return resultados
+
+
+def reservas_filtradas(conn, estado=None, fecha_entrada=None, cliente_id=None, habitacion=None):
+    """Ids de las reservas que cumplen el filtro, p. ej. las Confirmada que llegan hoy de un cliente"""
+    condiciones, params = [], []
+    for columna, valor in (('estado', estado), ('cliente_id', cliente_id), ('habitacion', habitacion)):
+        if valor not in (None, ''):
+            condiciones.append(f"{columna} = ?")
+            params.append(valor)
+    if fecha_entrada:
+        # Rango sobre la columna para usar idx_reservas_estado_fecha
+        condiciones.append("fecha_entrada >= ? AND fecha_entrada < date(?, '+1 day')")
+        params += [fecha_entrada, fecha_entrada]
+    if not condiciones:
+        raise ValueError("El filtro necesita al menos un criterio.")
+    return [fila[0] for fila in conn.execute(
+        f"SELECT id FROM reservas WHERE {' AND '.join(condiciones)} ORDER BY id", params)]
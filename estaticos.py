@@ -0,0 +1,91 @@
+"""
+Archivos estáticos con URL con huella y caché de larga duración.
+
+url_for('static', filename=...) añade ?v=<huella del contenido>, así que
+cada versión de un archivo tiene su propia URL y el navegador (o un CDN)
+puede guardarla un año sin volver a preguntar. Las fotos guardadas por
+imagenes.py ya llevan el hash en el nombre y no necesitan el parámetro.
+
+Una URL con una huella que ya no corresponde al archivo (p. ej. una página
+vieja en caché) se sirve con revalidación normal, nunca como inmutable.
+Las peticiones condicionales (If-None-Match / If-Modified-Since) y por
+rangos (Range) las resuelve send_file de Werkzeug sin leer el archivo
+entero; con HOTEL_X_SENDFILE=1 el envío lo hace el servidor web delante.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, request
+
+UN_ANO = 365 * 24 * 3600
+# uploads/ab/<sha256>[-ancho].ext: el nombre ya es la huella
+_CON_HASH = re.compile(r'^uploads/[0-9a-f]{2}/[0-9a-f]{64}(-\d+)?\.\w+$')
+
+_huellas = {}  # ruta -> (mtime_ns, tamaño, huella)
+_huellas_lock = threading.Lock()
+
+
+def huella(ruta):
+    """Hash corto del contenido de `ruta`, o None si no existe; se recalcula solo si cambia"""
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return None
+    with _huellas_lock:
+        guardada = _huellas.get(ruta)
+    if guardada and guardada[:2] == (info.st_mtime_ns, info.st_size):
+        return guardada[2]
+    with open(ruta, 'rb') as archivo:
+        valor = hashlib.file_digest(archivo, 'sha256').hexdigest()[:16]
+    with _huellas_lock:
+        _huellas[ruta] = (info.st_mtime_ns, info.st_size, valor)
+    return valor
+
+
+def inmutable(filename, version):
+    """¿La URL pedida identifica un contenido que ya no puede cambiar?"""
+    if _CON_HASH.match(filename):
+        return True
+    return bool(version) and version == huella(_ruta(filename))
+
+
+def _ruta(filename):
+    return os.path.join(current_app.static_folder, filename)
+
+
+def registrar(app):
+    """Activa las URL con huella y las cabeceras de caché en `app`"""
+    if os.environ.get('HOTEL_X_SENDFILE') == '1':
+        app.config['USE_X_SENDFILE'] = True
+
+    @app.url_defaults
+    def _con_huella(endpoint, values):
+        if endpoint != 'static' or 'v' in values or not values.get('filename'):
+            return
+        filename = values['filename']
+        if not _CON_HASH.match(filename):
+            valor = huella(os.path.join(app.static_folder, filename))
+            if valor:
+                values['v'] = valor
+
+    @app.after_request
+    def _cache_estaticos(respuesta):
+        if request.endpoint != 'static' or respuesta.status_code not in (200, 206, 304):
+            return respuesta
+        filename = (request.view_args or {}).get('filename', '')
+        if inmutable(filename, request.args.get('v')):
+            respuesta.cache_control.public = True
+            respuesta.cache_control.max_age = UN_ANO
+            respuesta.cache_control.immutable = True
+            respuesta.cache_control.no_cache = None
+            respuesta.expires = datetime.now(timezone.utc) + timedelta(seconds=UN_ANO)
+        else:
+            # Sin huella válida: se puede guardar, pero revalidando (304 si no cambió)
+            respuesta.cache_control.no_cache = True
+        return respuesta
+
+    return app
@@ -0,0 +1,242 @@
+"""
+Registro de eventos: una fila por cada cambio hecho desde la aplicación
+(quién, qué acción, sobre qué registro, y la fila antes y después en JSON).
+
+Las peticiones no escriben en la tabla eventos: encolan el evento y un hilo
+escritor los guarda por lotes, en una sola transacción por lote. La cola es
+acotada; si se llena, registrar() espera un momento (contrapresión) y, si
+sigue llena, escribe el evento él mismo para no perderlo. Al salir del
+proceso se vacía la cola.
+
+Si un lote no se puede guardar tras REINTENTOS intentos (base bloqueada,
+disco lleno...), se añade a un archivo de pendientes junto a la base
+(hotel.db.eventos-pendientes, una línea JSON por evento) en lugar de
+perderse. El escritor vuelve a guardarlos al arrancar y tras cada lote que
+sí entra en la base.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import has_request_context, session
+
+import database
+
+MAX_PENDIENTES = 10000  # eventos en cola como máximo
+LOTE = 500              # eventos por transacción
+ESPERA_LOTE = 0.2       # segundos que se espera a juntar un lote
+ESPERA_COLA = 1.0       # segundos de contrapresión con la cola llena
+REINTENTOS = 5
+SUFIJO_PENDIENTES = '.eventos-pendientes'
+
+# Columnas que nunca se copian al registro
+OCULTAS = {'password'}
+
+_FIN = object()
+
+
+def fila(conn, tabla, valor, columna='id'):
+    """Fila actual como dict (sin columnas ocultas), o None si no existe"""
+    registro = conn.execute(f"SELECT * FROM {tabla} WHERE {columna} = ?", (valor,)).fetchone()
+    if registro is None:
+        return None
+    return {k: registro[k] for k in registro.keys() if k not in OCULTAS}
+
+
+def _json(valor):
+    return None if valor is None else json.dumps(valor, ensure_ascii=False, default=str)
+
+
+class RegistroEventos:
+    """Cola acotada de eventos y el hilo que los escribe por lotes"""
+
+    def __init__(self, maximo=MAX_PENDIENTES, lote=LOTE, espera=ESPERA_LOTE):
+        self.cola = queue.Queue(maxsize=maximo)
+        self.lote = lote
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self.escritos = 0
+        self.lotes = 0
+        self.sincronos = 0
+        self.aplazados = 0
+        self.recuperados = 0
+        self.perdidos = 0
+
+    def registrar(self, accion, tabla, registro_id, antes=None, despues=None,
+                  usuario_id=None, usuario=None):
+        evento = (
+            datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            usuario_id, usuario, accion, tabla, registro_id, _json(antes), _json(despues),
+        )
+        self._arrancar()
+        try:
+            self.cola.put(evento, timeout=ESPERA_COLA)
+        except queue.Full:
+            # El escritor no da abasto: este evento se escribe aquí mismo
+            self._escribir([evento])
+            with self._lock:
+                self.sincronos += 1
+
+    def _arrancar(self):
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Tras un fork la cola y el hilo del padre no sirven
+                self.cola = queue.Queue(maxsize=self.cola.maxsize)
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._escritor, name="eventos", daemon=True)
+            self._hilo.start()
+
+    def _escritor(self):
+        self._recuperar()
+        while True:
+            primero = self.cola.get()
+            if primero is _FIN:
+                self.cola.task_done()
+                return
+            pendientes = [primero]
+            fin = False
+            limite = time.monotonic() + self.espera
+            while len(pendientes) < self.lote:
+                restante = limite - time.monotonic()
+                try:
+                    evento = self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait()
+                except queue.Empty:
+                    break
+                if evento is _FIN:
+                    fin = True
+                    break
+                pendientes.append(evento)
+            self._escribir(pendientes)
+            for _ in range(len(pendientes) + fin):
+                self.cola.task_done()
+            if fin:
+                return
+
+    def _insertar(self, pendientes):
+        with database.conexion() as conn:
+            conn.executemany("""
+                INSERT INTO eventos (fecha, usuario_id, usuario, accion, tabla, registro_id, antes, despues)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, pendientes)
+            conn.commit()
+        with self._lock:
+            self.escritos += len(pendientes)
+            self.lotes += 1
+
+    def _escribir(self, pendientes):
+        for intento in range(REINTENTOS):
+            if intento:
+                time.sleep(0.1 * 2 ** (intento - 1))
+            try:
+                self._insertar(pendientes)
+            except Exception as e:
+                error = e
+                continue
+            self._recuperar()
+            return
+        self._aplazar(pendientes, error)
+
+    def _aplazar(self, pendientes, error):
+        """Guarda en el archivo de pendientes el lote que no entró en la base"""
+        try:
+            with open(database.DATABASE_NAME + SUFIJO_PENDIENTES, 'a', encoding='utf-8') as archivo:
+                archivo.write("".join(json.dumps(evento, ensure_ascii=False) + "\n" for evento in pendientes))
+                archivo.flush()
+                os.fsync(archivo.fileno())
+        except OSError as e:
+            with self._lock:
+                self.perdidos += len(pendientes)
+            print(f"❌ No se pudieron guardar {len(pendientes)} eventos: {error}; ni aplazarlos: {e}")
+            return
+        with self._lock:
+            self.aplazados += len(pendientes)
+        print(f"⚠️  {len(pendientes)} eventos aplazados a {database.DATABASE_NAME + SUFIJO_PENDIENTES}: {error}")
+
+    def _recuperar(self):
+        """Guarda los eventos del archivo de pendientes, si lo hay"""
+        ruta = database.DATABASE_NAME + SUFIJO_PENDIENTES
+        # Renombrado primero: otro proceso que aplace eventos crea un archivo nuevo
+        reclamado = f"{ruta}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.replace(ruta, reclamado)
+        except OSError:
+            return
+        with open(reclamado, encoding='utf-8') as archivo:
+            aplazados = [tuple(json.loads(linea)) for linea in archivo if linea.strip()]
+        try:
+            self._insertar(aplazados)
+        except Exception as e:
+            self._aplazar(aplazados, e)
+        else:
+            with self._lock:
+                self.recuperados += len(aplazados)
+        os.remove(reclamado)
+
+    def vaciar(self):
+        """Espera a que todos los eventos encolados estén escritos"""
+        if self._hilo is not None and self._hilo.is_alive():
+            self.cola.join()
+
+    def cerrar(self, timeout=10):
+        """Escribe lo pendiente y detiene el hilo escritor"""
+        if self._hilo is None or not self._hilo.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            # Con la cola llena y el escritor atascado, put() sin timeout no volvería
+            self.cola.put(_FIN, timeout=timeout)
+        except queue.Full:
+            return
+        self._hilo.join(timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'pendientes': self.cola.qsize(),
+                'maximo': self.cola.maxsize,
+                'escritos': self.escritos,
+                'lotes': self.lotes,
+                'sincronos': self.sincronos,
+                'aplazados': self.aplazados,
+                'recuperados': self.recuperados,
+                'perdidos': self.perdidos,
+                'activo': self._hilo is not None and self._hilo.is_alive(),
+            }
+
+
+_registro = RegistroEventos()
+atexit.register(_registro.cerrar)
+
+registrar = _registro.registrar
+vaciar = _registro.vaciar
+estadisticas = _registro.estadisticas
+
+
+def registrar_cambio(accion, tabla, antes=None, despues=None):
+    """Encola el evento de un cambio ya confirmado, con el usuario de la sesión"""
+    if antes is None and despues is None:
+        return
+    registro_id = (despues or antes)['id']
+    usuario_id = usuario = None
+    if has_request_context():
+        usuario_id, usuario = session.get('user_id'), session.get('username')
+    registrar(accion, tabla, registro_id, antes, despues, usuario_id, usuario)
+
+
+def historial(conn, tabla, registro_id, limite=100):
+    """Eventos de un registro, del más reciente al más antiguo"""
+    return conn.execute("""
+        SELECT * FROM eventos
+        WHERE tabla = ? AND registro_id = ?
+        ORDER BY id DESC LIMIT ?
+    """, (tabla, registro_id, limite)).fetchall()
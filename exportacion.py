@@ -0,0 +1,169 @@
+"""
+Exportación de listados completos a CSV y XLSX en streaming.
+
+Las filas se leen por lotes con la misma paginación por clave de los
+listados (cada lote usa el índice y devuelve la conexión al pool antes de
+enviarse) y se convierten en trozos de bytes a medida que llegan, así que la
+memoria del worker no depende del tamaño de la exportación y el primer byte
+sale con el primer lote.
+
+El XLSX se escribe a mano (un zip con las cinco partes mínimas y celdas
+inlineStr) porque zipfile ya sabe escribir en un flujo no posicionable.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import database
+import paginacion
+
+LOTE = 1000
+
+# Límite de filas de una hoja de Excel (incluida la cabecera)
+MAX_FILAS_XLSX = 1048576
+
+TIPOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Caracteres que XML 1.0 no admite
+_NO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def filas(listado, lote=LOTE):
+    """Genera (columnas, fila) de todo el listado, leyendo lote a lote"""
+    valores = None
+    columnas = None
+    while True:
+        with database.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute(*paginacion.sql_pagina(listado, valores, por_pagina=lote - 1))
+            bloque = cursor.fetchall()
+        if not bloque:
+            return
+        if columnas is None:
+            nombres = bloque[0].keys()
+            columnas = [nombre for nombre in nombres if not nombre.startswith('_clave')]
+            claves = [nombre for nombre in nombres if nombre.startswith('_clave')]
+        for fila in bloque:
+            yield columnas, [fila[nombre] for nombre in columnas]
+        if len(bloque) < lote:
+            return
+        valores = [bloque[-1][clave] for clave in claves]
+
+
+def csv_stream(listado):
+    """Bytes del CSV (UTF-8 con BOM para que Excel detecte la codificación)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    pendientes = 0
+    cabecera = False
+    for columnas, valores in filas(listado):
+        if not cabecera:
+            escritor.writerow(columnas)
+            cabecera = True
+        escritor.writerow(valores)
+        pendientes += 1
+        if pendientes >= LOTE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _Salida(io.RawIOBase):
+    """Destino no posicionable del zip: acumula lo escrito hasta que se recoge"""
+
+    def __init__(self):
+        self.trozos = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.trozos.append(bytes(datos))
+        return len(datos)
+
+    def recoger(self):
+        datos = b''.join(self.trozos)
+        self.trozos = []
+        return datos
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_NO_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila(valores):
+    return '<row>' + ''.join(_celda(valor) for valor in valores) + '</row>'
+
+
+def xlsx_stream(listado, hoja='Datos'):
+    """Bytes de un libro XLSX de una hoja, generados según avanzan las filas"""
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        libro.writestr('_rels/.rels', _RELS)
+        libro.writestr('xl/workbook.xml', _WORKBOOK.format(hoja=escape(hoja)))
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield salida.recoger()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                           b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                           b'<sheetData>')
+            escritas = 0
+            for columnas, valores in filas(listado):
+                if escritas == 0:
+                    hoja_xml.write(_fila(columnas).encode('utf-8'))
+                    escritas = 1
+                if escritas >= MAX_FILAS_XLSX:
+                    break
+                hoja_xml.write(_fila(valores).encode('utf-8'))
+                escritas += 1
+                if escritas % LOTE == 0:
+                    yield salida.recoger()
+            hoja_xml.write(b'</sheetData></worksheet>')
+    yield salida.recoger()
+
+
+def exportar(listado, formato, hoja='Datos'):
+    """Generador de bytes del listado en el formato pedido ('csv' o 'xlsx')"""
+    if formato == 'xlsx':
+        return xlsx_stream(listado, hoja)
+    return csv_stream(listado)
@@ -1,142 +1,299 @@
-#!/usr/bin/env python3
-"""
-Script para corregir la vinculación de pagos con reservas
-"""
-
-import sqlite3
-from datetime import datetime
-
-def fix_pagos_reservas():
-    """Corrige vinculación pagos-reservas"""
-    
-    print("🔧 Corrigiendo vinculación de pagos con reservas...")
-    print("=" * 50)
-    
-    try:
-        # Conectar a la base de datos
-        conn = sqlite3.connect('hotel.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 1. Limpiar pagos sin reservas
-        print("1. Limpiando pagos sin reservas...")
-        
-        cursor.execute("""
-            DELETE FROM pagos 
-            WHERE reserva_id IS NULL OR reserva_id NOT IN (SELECT id FROM reservas)
-        """)
-        
-        pagos_eliminados = cursor.rowcount
-        print(f"   🗑️  Eliminados {pagos_eliminados} pagos sin reservas válidas")
-        
-        # 2. Crear pagos para reservas sin pagos
-        print("\n2. Creando pagos para reservas sin pagos...")
-        
-        cursor.execute("""
-            SELECT r.id, r.cliente_id, r.precio_total, r.habitacion
-            FROM reservas r
-            WHERE NOT EXISTS (SELECT 1 FROM pagos p WHERE p.reserva_id = r.id)
-        """)
-        
-        reservas_sin_pagos = cursor.fetchall()
-        
-        for reserva in reservas_sin_pagos:
-            fecha_actual = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute("""
-                INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (reserva['id'], reserva['cliente_id'], reserva['precio_total'], fecha_actual, 
-                  'Pendiente', 'Pendiente', f'RES-{reserva["id"]}', 
-                  f'Pago automático por reserva #{reserva["id"]}'))
-        
-        print(f"   ✅ Creados {len(reservas_sin_pagos)} pagos para reservas")
-        
-        # 3. Corregir montos de pagos que no coinciden
-        print("\n3. Corrigiendo montos de pagos...")
-        
-        cursor.execute("""
-            SELECT r.id, r.precio_total, p.monto, p.id as pago_id
-            FROM reservas r
-            JOIN pagos p ON r.id = p.reserva_id
-            WHERE r.precio_total != p.monto
-        """)
-        
-        pagos_incorrectos = cursor.fetchall()
-        
-        for pago in pagos_incorrectos:
-            cursor.execute("""
-                UPDATE pagos 
-                SET monto = ? 
-                WHERE id = ?
-            """, (pago['precio_total'], pago['pago_id']))
-        
-        print(f"   ✅ Corregidos {len(pagos_incorrectos)} montos de pagos")
-        
-        # 4. Actualizar estados de habitaciones
-        print("\n4. Actualizando estados de habitaciones...")
-        
-        cursor.execute("""
-            UPDATE habitaciones 
-            SET estado = 'Reservada' 
-            WHERE numero IN (
-                SELECT DISTINCT habitacion 
-                FROM reservas 
-                WHERE estado IN ('Confirmada', 'Reservada')
-            )
-        """)
-        
-        habitaciones_actualizadas = cursor.rowcount
-        print(f"   ✅ Actualizadas {habitaciones_actualizadas} habitaciones a 'Reservada'")
-        
-        # 5. Verificar resultados
-        print("\n5. Verificando resultados...")
-        
-        cursor.execute("SELECT COUNT(*) as total FROM reservas")
-        total_reservas = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM pagos")
-        total_pagos = cursor.fetchone()['total']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as total
-            FROM reservas r
-            JOIN pagos p ON r.id = p.reserva_id
-        """)
-        reservas_con_pagos = cursor.fetchone()['total']
-        
-        print(f"   📊 Total reservas: {total_reservas}")
-        print(f"   💰 Total pagos: {total_pagos}")
-        print(f"   🔗 Reservas con pagos: {reservas_con_pagos}")
-        
-        if total_reservas == total_pagos and total_reservas == reservas_con_pagos:
-            print("   ✅ ¡Perfecto! Todas las reservas tienen pagos vinculados")
-        else:
-            print("   ⚠️  Aún hay inconsistencias")
-        
-        # 6. Mostrar resumen final
-        print("\n6. Resumen final:")
-        
-        cursor.execute("""
-            SELECT p.estado, COUNT(*) as cantidad
-            FROM pagos p
-            GROUP BY p.estado
-        """)
-        
-        estados = cursor.fetchall()
-        for estado in estados:
-            print(f"   📊 {estado['estado']}: {estado['cantidad']} pagos")
-        
-        conn.commit()
-        conn.close()
-        
-        print("\n" + "=" * 50)
-        print("✅ Corrección completada exitosamente")
-        
-    except Exception as e:
-        print(f"❌ Error durante la corrección: {e}")
-        return False
-    
-    return True
-
-if __name__ == "__main__":
-    fix_pagos_reservas() 
\ No newline at end of file
+#!/usr/bin/env python3
+"""
+Script para corregir la vinculación de pagos con reservas
+
+Cada paso es una sentencia por conjuntos (DELETE/INSERT ... SELECT/UPDATE ...
+FROM) que se aplica por lotes de ids: cada lote es una transacción corta, así
+que la recepción no queda bloqueada, y el último id procesado se guarda en
+progreso_tareas para reanudar si se interrumpe.
+
+    python fix_pagos_reservas.py               # aplica (o reanuda) la corrección
+    python fix_pagos_reservas.py --simular     # solo informa de lo que cambiaría
+    python fix_pagos_reservas.py --cada 3600   # repite cada hora
+
+Desde la aplicación: programar(3600) la ejecuta en un hilo en segundo plano.
+"""
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import database
+import fragmentos
+
+TAREA = 'fix_pagos_reservas'
+
+LOTE = 2000
+
+# Ejemplos de cada paso que se muestran al simular
+MUESTRA = 5
+
+# tabla/alias: tabla que se recorre por id; condicion: filas a corregir;
+# aplicar: sentencia del lote (usa :desde y :hasta sobre alias.id)
+Paso = namedtuple('Paso', 'nombre descripcion tabla alias condicion aplicar')
+
+PASOS = [
+    Paso('pagos_huerfanos', 'Pagos sin reserva válida (se eliminan)', 'pagos', 'p',
+         "(p.reserva_id IS NULL OR NOT EXISTS (SELECT 1 FROM reservas r WHERE r.id = p.reserva_id))",
+         """
+         DELETE FROM pagos WHERE id IN (
+             SELECT p.id FROM pagos p
+             WHERE p.id > :desde AND p.id <= :hasta
+             AND (p.reserva_id IS NULL OR NOT EXISTS (SELECT 1 FROM reservas r WHERE r.id = p.reserva_id))
+         )
+         """),
+    Paso('reservas_sin_pago', 'Reservas sin pago (se crea uno pendiente)', 'reservas', 'r',
+         "NOT EXISTS (SELECT 1 FROM pagos p WHERE p.reserva_id = r.id)",
+         """
+         INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia, notas, timestamp)
+         SELECT r.id, r.cliente_id, r.precio_total, date('now', 'localtime'), 'Pendiente', 'Pendiente',
+                'RES-' || r.id, 'Pago automático por reserva #' || r.id, CURRENT_TIMESTAMP
+         FROM reservas r
+         WHERE r.id > :desde AND r.id <= :hasta
+         AND NOT EXISTS (SELECT 1 FROM pagos p WHERE p.reserva_id = r.id)
+         """),
+    Paso('montos', 'Pagos con monto distinto al precio de la reserva', 'pagos', 'p',
+         "EXISTS (SELECT 1 FROM reservas r WHERE r.id = p.reserva_id AND r.precio_total != p.monto)",
+         """
+         UPDATE pagos AS p SET monto = r.precio_total
+         FROM reservas r
+         WHERE r.id = p.reserva_id AND r.precio_total != p.monto
+         AND p.id > :desde AND p.id <= :hasta
+         """),
+    # Solo habitaciones Disponible: una Ocupada, en Limpieza o en Mantenimiento
+    # sigue su propio ciclo (estados.py) aunque tenga reservas futuras
+    Paso('habitaciones', "Habitaciones disponibles con reservas confirmadas en curso o próximas", 'habitaciones', 'h',
+         """h.estado = 'Disponible' AND EXISTS (
+             SELECT 1 FROM reservas r WHERE r.habitacion = h.numero
+             AND r.estado IN ('Confirmada', 'Reservada') AND r.fecha_salida > date('now', 'localtime'))""",
+         """
+         UPDATE habitaciones AS h SET estado = 'Reservada'
+         WHERE h.id > :desde AND h.id <= :hasta
+         AND h.estado = 'Disponible' AND EXISTS (
+             SELECT 1 FROM reservas r WHERE r.habitacion = h.numero
+             AND r.estado IN ('Confirmada', 'Reservada') AND r.fecha_salida > date('now', 'localtime'))
+         """),
+]
+
+# Evita dos ejecuciones simultáneas en el mismo proceso (script y programador)
+_en_curso = threading.Lock()
+
+
+def _fin_lote(conn, paso, desde, lote):
+    """(id de la última fila del siguiente lote, filas del lote); id None si no quedan"""
+    fila = conn.execute(f"""
+        SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {paso.tabla} WHERE id > ? ORDER BY id LIMIT ?)
+    """, (desde, lote)).fetchone()
+    return fila[0], fila[1]
+
+
+def _progreso(conn, paso):
+    fila = conn.execute("""
+        SELECT ultimo_id, revisados, cambios, terminado FROM progreso_tareas
+        WHERE tarea = ? AND paso = ?
+    """, (TAREA, paso.nombre)).fetchone()
+    return tuple(fila) if fila else (0, 0, 0, 0)
+
+
+def _guardar_progreso(conn, paso, ultimo_id, revisados, cambios, terminado):
+    conn.execute("""
+        INSERT INTO progreso_tareas (tarea, paso, ultimo_id, revisados, cambios, terminado, actualizado)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (tarea, paso) DO UPDATE SET
+            ultimo_id = excluded.ultimo_id, revisados = excluded.revisados,
+            cambios = excluded.cambios, terminado = excluded.terminado,
+            actualizado = excluded.actualizado
+    """, (TAREA, paso.nombre, ultimo_id, revisados, cambios, terminado))
+
+
+def _aplicar_paso(conn, paso, lote, informar):
+    """Aplica el paso lote a lote desde su último punto de control"""
+    inicio = time.perf_counter()
+    ultimo_aviso = inicio
+    previos = None
+    while True:
+        # Cada lote lee el punto de control dentro de su transacción: varias
+        # ejecuciones a la vez simplemente se reparten los lotes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            desde, revisados, cambios, terminado = _progreso(conn, paso)
+            if previos is None:
+                previos = revisados
+            hasta, filas = (None, 0) if terminado else _fin_lote(conn, paso, desde, lote)
+            if hasta is None:
+                _guardar_progreso(conn, paso, desde, revisados, cambios, 1)
+                conn.commit()
+                break
+            cursor = conn.execute(paso.aplicar, {'desde': desde, 'hasta': hasta})
+            revisados += filas
+            cambios += max(cursor.rowcount, 0)
+            _guardar_progreso(conn, paso, hasta, revisados, cambios, 0)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if informar and time.perf_counter() - ultimo_aviso >= 1:
+            ultimo_aviso = time.perf_counter()
+            print(f"      ... id {hasta}: {revisados} revisados, {cambios} corregidos")
+
+    # Filas de esta ejecución (las anteriores al punto de control ya estaban hechas)
+    return revisados, cambios, time.perf_counter() - inicio, revisados - previos
+
+
+def _simular_paso(conn, paso, lote):
+    """Cuenta lote a lote lo que cambiaría el paso, sin escribir"""
+    inicio = time.perf_counter()
+    desde = revisados = pendientes = 0
+    while True:
+        hasta, _ = _fin_lote(conn, paso, desde, lote)
+        if hasta is None:
+            break
+        fila = conn.execute(f"""
+            SELECT COUNT(*), SUM({paso.condicion}) FROM {paso.tabla} {paso.alias}
+            WHERE {paso.alias}.id > ? AND {paso.alias}.id <= ?
+        """, (desde, hasta)).fetchone()
+        revisados += fila[0]
+        pendientes += fila[1] or 0
+        desde = hasta
+    ejemplos = conn.execute(f"""
+        SELECT * FROM {paso.tabla} {paso.alias} WHERE {paso.condicion}
+        ORDER BY {paso.alias}.id LIMIT ?
+    """, (MUESTRA,)).fetchall()
+    return revisados, pendientes, time.perf_counter() - inicio, ejemplos
+
+
+def reconciliar(simular=False, lote=LOTE, reiniciar=False, informar=True):
+    """Ejecuta (o reanuda) todos los pasos; devuelve {paso: (revisados, cambios)}.
+
+    Con simular=True no escribe nada: cambios es lo que se corregiría.
+    """
+    if not _en_curso.acquire(blocking=False):
+        if informar:
+            print("⏳ Ya hay una corrección en curso en este proceso")
+        return None
+
+    resumen = {}
+    try:
+        with database.conexion() as conn:
+            if conn.in_transaction:
+                conn.commit()
+            if reiniciar and not simular:
+                conn.execute("DELETE FROM progreso_tareas WHERE tarea = ?", (TAREA,))
+                conn.commit()
+
+            for numero, paso in enumerate(PASOS, 1):
+                if informar:
+                    print(f"{numero}. {paso.descripcion}...")
+                if simular:
+                    revisados, cambios, segundos, ejemplos = _simular_paso(conn, paso, lote)
+                    procesados = revisados
+                else:
+                    revisados, cambios, segundos, procesados = _aplicar_paso(conn, paso, lote, informar)
+                    ejemplos = []
+                resumen[paso.nombre] = (revisados, cambios)
+
+                if informar:
+                    por_segundo = procesados / segundos if segundos else 0
+                    accion = "por corregir" if simular else "corregidos"
+                    print(f"   ✅ {revisados} revisados, {cambios} {accion} "
+                          f"({segundos:.2f} s, {por_segundo:,.0f} filas/s)")
+                    for ejemplo in ejemplos:
+                        print(f"      · {dict(ejemplo)}")
+
+            # Corrección completa: la próxima ejecución empieza de cero
+            if not simular:
+                conn.execute("DELETE FROM progreso_tareas WHERE tarea = ?", (TAREA,))
+                conn.commit()
+        if not simular:
+            fragmentos.publicar()
+    finally:
+        _en_curso.release()
+    return resumen
+
+
+class Programador:
+    """Ejecuta reconciliar() cada `intervalo` segundos en un hilo en segundo plano"""
+
+    def __init__(self, intervalo, lote=LOTE):
+        self.intervalo = intervalo
+        self.lote = lote
+        self.ultima = None        # resumen de la última ejecución
+        self.error = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name=TAREA, daemon=True)
+
+    def _ejecutar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.ultima = reconciliar(lote=self.lote, informar=False)
+                self.error = None
+            except Exception as e:
+                # Se reintenta en la siguiente vuelta desde el punto de control
+                self.error = str(e)
+                print(f"❌ Error en la corrección programada: {e}")
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+
+def programar(intervalo, lote=LOTE):
+    """Inicia la corrección periódica dentro del proceso; devuelve el Programador"""
+    return Programador(intervalo, lote).iniciar()
+
+
+def fix_pagos_reservas(simular=False, lote=LOTE, reiniciar=False):
+    """Corrige vinculación pagos-reservas"""
+
+    print("🔧 Corrigiendo vinculación de pagos con reservas..." if not simular
+          else "🔍 Simulando la corrección de pagos y reservas (no se escribe nada)...")
+    print("=" * 50)
+
+    try:
+        database.init_db()
+        reconciliar(simular, lote, reiniciar)
+
+        with database.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM reservas),
+                       (SELECT COUNT(*) FROM pagos),
+                       (SELECT COUNT(DISTINCT reserva_id) FROM pagos
+                        WHERE reserva_id IN (SELECT id FROM reservas))
+            """)
+            total_reservas, total_pagos, reservas_con_pagos = cursor.fetchone()
+
+        print(f"\n   📊 Total reservas: {total_reservas}")
+        print(f"   💰 Total pagos: {total_pagos}")
+        print(f"   🔗 Reservas con pagos: {reservas_con_pagos}")
+
+        print("\n" + "=" * 50)
+        print("✅ Corrección completada exitosamente" if not simular else "✅ Simulación completada")
+
+    except Exception as e:
+        print(f"❌ Error durante la corrección (se reanudará desde el último lote): {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corrige la vinculación de pagos con reservas")
+    parser.add_argument("--simular", action="store_true", help="solo informa de lo que cambiaría")
+    parser.add_argument("--lote", type=int, default=LOTE, help=f"filas por lote (por defecto {LOTE})")
+    parser.add_argument("--reiniciar", action="store_true", help="descarta el progreso guardado")
+    parser.add_argument("--cada", type=int, metavar="SEGUNDOS", help="repite la corrección cada SEGUNDOS")
+    args = parser.parse_args()
+
+    fix_pagos_reservas(args.simular, args.lote, args.reiniciar)
+    if args.cada:
+        programador = programar(args.cada, args.lote)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            programador.parar()
@@ -0,0 +1,215 @@
+"""
+Caché de fragmentos renderizados, compartida entre los workers.
+
+La clave incluye un marcador por cada tabla de la que depende el fragmento,
+guardado en el mismo backend que los fragmentos, y la versión del código.
+Quien escribe publica un marcador nuevo (publicar(), tras cada petición de
+escritura y al final de las tareas que cambian datos) y la siguiente lectura
+genera una entrada nueva; las viejas caducan por TTL. Mientras nada cambie,
+una petición no toca SQLite: lee los marcadores y el fragmento de la caché.
+La consulta y la plantilla se ejecutan una vez por marcador (y worker como
+mucho, si llegan a la vez).
+
+Los marcadores caducan a los TTL_MARCADOR segundos: una escritura que no
+pase por publicar() (un script externo, la consola de sqlite3) se ve como
+mucho ese tiempo después.
+
+Backend: Redis si HOTEL_CACHE_REDIS tiene una URL (redis://...) y el paquete
+redis está instalado; si no, archivos en HOTEL_CACHE_DIR (por defecto un
+directorio en el temporal del sistema), escritos con os.replace para que
+ningún worker lea uno a medias.
+"""
+
+import hashlib
+import os
+import random
+import secrets
+import struct
+import tempfile
+import threading
+import time
+
+import condicional
+import database
+
+try:
+    import redis
+except ImportError:  # opcional: sin redis se usa el backend de archivos
+    redis = None
+
+TTL = 300
+TTL_MARCADOR = 60
+DIRECTORIO = os.environ.get('HOTEL_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'hotel-fragmentos')
+REDIS_URL = os.environ.get('HOTEL_CACHE_REDIS', '')
+
+_CABECERA = struct.Struct('<d')  # caducidad (epoch) delante del contenido
+
+
+class CacheArchivos:
+    """Un archivo por clave: caducidad + contenido"""
+
+    def __init__(self, directorio=DIRECTORIO):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def obtener(self, clave):
+        try:
+            with open(self._ruta(clave), 'rb') as archivo:
+                datos = archivo.read()
+        except OSError:
+            return None
+        if len(datos) < _CABECERA.size or _CABECERA.unpack_from(datos)[0] < time.time():
+            return None
+        return datos[_CABECERA.size:]
+
+    def guardar(self, clave, valor, ttl):
+        temporal = f"{self._ruta(clave)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as archivo:
+            archivo.write(_CABECERA.pack(time.time() + ttl) + valor)
+        os.replace(temporal, self._ruta(clave))
+        # De vez en cuando se borran las entradas caducadas
+        if random.random() < 0.01:
+            self.limpiar()
+
+    def limpiar(self):
+        ahora = time.time()
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                with open(ruta, 'rb') as archivo:
+                    cabecera = archivo.read(_CABECERA.size)
+                if len(cabecera) < _CABECERA.size or _CABECERA.unpack(cabecera)[0] < ahora:
+                    os.remove(ruta)
+            except OSError:
+                pass
+
+
+class CacheRedis:
+    def __init__(self, url=REDIS_URL):
+        self.cliente = redis.Redis.from_url(url)
+
+    def obtener(self, clave):
+        return self.cliente.get(f"hotel:fragmento:{clave}")
+
+    def guardar(self, clave, valor, ttl):
+        self.cliente.set(f"hotel:fragmento:{clave}", valor, ex=int(ttl))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_metricas = {'aciertos': 0, 'fallos': 0, 'errores': 0}
+_generando = {}  # clave -> [Lock, hilos que lo usan], para no generar lo mismo dos veces en un worker
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if REDIS_URL and redis is not None:
+                    _backend = CacheRedis(REDIS_URL)
+                else:
+                    _backend = CacheArchivos(DIRECTORIO)
+    return _backend
+
+
+def _contar(metrica):
+    with _backend_lock:
+        _metricas[metrica] += 1
+
+
+def _clave_marcador(tabla):
+    base = hashlib.sha1(os.path.abspath(database.DATABASE_NAME).encode()).hexdigest()[:16]
+    return f"marcador-{base}-{tabla}"
+
+
+def _nuevo_marcador(cache, tabla, version='-'):
+    """Publica un marcador nuevo para `tabla`: "versión:aleatorio" """
+    marcador = f"{version}:{secrets.token_hex(8)}"
+    cache.guardar(_clave_marcador(tabla), marcador.encode(), TTL_MARCADOR)
+    return marcador
+
+
+def marcadores(tablas):
+    """Marcador actual de cada tabla, creándolo si no hay (no consulta SQLite)"""
+    cache = backend()
+    resultado = []
+    for tabla in tablas:
+        guardado = cache.obtener(_clave_marcador(tabla))
+        resultado.append(guardado.decode() if guardado is not None else _nuevo_marcador(cache, tabla))
+    return tuple(resultado)
+
+
+def publicar():
+    """Tras confirmar una escritura: marcador nuevo para cada tabla que cambió.
+
+    Compara versiones_tabla con la versión anotada en cada marcador. La parte
+    aleatoria se genera después del commit, así que ningún fragmento guardado
+    con ella puede ser anterior al cambio, aunque dos escritores publiquen a
+    la vez en cualquier orden.
+    """
+    try:
+        with database.conexion() as conn:
+            versiones = conn.execute("SELECT tabla, version FROM versiones_tabla").fetchall()
+        cache = backend()
+        for tabla, version in versiones:
+            guardado = cache.obtener(_clave_marcador(tabla))
+            if guardado is None or guardado.decode().split(':')[0] != str(version):
+                _nuevo_marcador(cache, tabla, version)
+    except Exception:
+        # Sin caché los marcadores caducan solos a los TTL_MARCADOR segundos
+        _contar('errores')
+
+
+def clave(nombre, tablas):
+    datos = f"{os.path.abspath(database.DATABASE_NAME)}|{condicional.VERSION_CODIGO}|{nombre}|{marcadores(tablas)}"
+    return f"{nombre}-{hashlib.sha1(datos.encode()).hexdigest()}"
+
+
+def fragmento(nombre, tablas, generar, ttl=TTL):
+    """Texto de `generar()` para el marcador actual de `tablas`, de la caché si ya está"""
+    cache = backend()
+    try:
+        actual = clave(nombre, tablas)
+        guardado = cache.obtener(actual)
+    except Exception:
+        # Si la caché no responde (Redis caído) se genera sin ella
+        _contar('errores')
+        return generar()
+    if guardado is not None:
+        _contar('aciertos')
+        return guardado.decode()
+
+    with _backend_lock:
+        entrada = _generando.setdefault(actual, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            # Otro hilo pudo generarlo mientras esperábamos
+            guardado = cache.obtener(actual)
+            if guardado is not None:
+                _contar('aciertos')
+                return guardado.decode()
+            _contar('fallos')
+            texto = generar()
+            try:
+                cache.guardar(actual, texto.encode(), ttl)
+            except Exception:
+                _contar('errores')
+            return texto
+    finally:
+        # El lock se retira cuando lo suelta el último que lo esperaba
+        with _backend_lock:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                _generando.pop(actual, None)
+
+
+def estadisticas():
+    with _backend_lock:
+        datos = dict(_metricas)
+    datos['backend'] = type(backend()).__name__
+    return datos
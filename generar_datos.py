@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Genera una base de datos sintética del hotel para pruebas de carga.
+
+Habitaciones por planta y tipo, clientes con correo e identificación únicos
+y, por cada habitación, estancias consecutivas sin solaparse desde hace
+`anos` años hasta seis meses vista, con la mezcla de estados de un hotel
+real: las pasadas casi todas Completadas, las de hoy Ocupadas y las futuras
+Confirmadas o Pendientes, con alguna Cancelada en cada tramo. Cada reserva
+lleva su pago, como las que crea la aplicación. Con la misma semilla sale
+siempre la misma base.
+
+    python generar_datos.py bench.db --habitaciones 60 --clientes 5000 --anos 2
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import database
+
+# (tipo, capacidad, precio_noche, peso)
+TIPOS = (
+    ('Individual', 1, 120000.0, 35),
+    ('Doble', 2, 250000.0, 40),
+    ('Suite', 4, 380000.0, 15),
+    ('Familiar', 5, 450000.0, 10),
+)
+AMENIDADES = {
+    'Individual': 'WiFi, TV, A/C',
+    'Doble': 'WiFi, TV, A/C, Balcón',
+    'Suite': 'WiFi, TV, A/C, Jacuzzi, Balcón',
+    'Familiar': 'WiFi, TV, A/C, Cocina',
+}
+HABITACIONES_POR_PLANTA = 20
+
+NOMBRES = ('Ana', 'Luis', 'María', 'Carlos', 'Lucía', 'Jorge', 'Sofía', 'Pedro', 'Valentina', 'Andrés',
+           'Camila', 'Diego', 'Isabel', 'Miguel', 'Daniela', 'José', 'Paula', 'Juan', 'Laura', 'Mateo')
+APELLIDOS = ('García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez', 'Ramírez',
+             'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Vargas', 'Castro', 'Romero', 'Herrera')
+CIUDADES = ('Bogotá', 'Medellín', 'Cali', 'Caracas', 'Lima', 'Quito', 'Madrid', 'Ciudad de México')
+
+# Noches por estancia y sus pesos
+NOCHES = ((1, 25), (2, 25), (3, 18), (4, 10), (5, 8), (7, 8), (10, 4), (14, 2))
+# Días libres medios entre estancias (≈ 65 % de ocupación)
+HUECO_MEDIO = 2.0
+
+METODOS = (('Tarjeta', 55), ('Efectivo', 25), ('Transferencia', 20))
+
+USUARIO = 'bench'
+CLAVE = 'bench'
+
+
+def _elegir(rnd, opciones):
+    valores, pesos = zip(*opciones)
+    return rnd.choices(valores, pesos)[0]
+
+
+def _estado_reserva(rnd, entrada, salida, hoy):
+    if salida <= hoy:
+        return 'Completada' if rnd.random() < 0.88 else 'Cancelada'
+    if entrada <= hoy:
+        return 'Ocupada'
+    return _elegir(rnd, (('Confirmada', 65), ('Pendiente', 28), ('Cancelada', 7)))
+
+
+def _pago(rnd, estado_reserva, entrada, salida, hoy):
+    """(estado, fecha) del pago de una reserva según cómo va la estancia"""
+    antelacion = entrada - timedelta(days=rnd.randint(0, 60))
+    if estado_reserva == 'Cancelada':
+        return 'Cancelado', min(antelacion, hoy)
+    if estado_reserva == 'Completada':
+        return ('Completado' if rnd.random() < 0.97 else 'Pendiente'), salida
+    if estado_reserva == 'Ocupada':
+        return ('Completado' if rnd.random() < 0.6 else 'Pendiente'), min(entrada, hoy)
+    if estado_reserva == 'Confirmada' and rnd.random() < 0.4:
+        return 'Completado', min(antelacion, hoy)
+    return 'Pendiente', min(antelacion, hoy)
+
+
+def generar(ruta, habitaciones=60, clientes=5000, anos=2, semilla=1, hoy=None):
+    """Crea `ruta` desde cero; devuelve cuántas filas hay de cada tabla"""
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    for sufijo in ('', '-wal', '-shm'):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+    anterior = database.DATABASE_NAME
+    database.DATABASE_NAME = ruta
+    try:
+        database.init_db()
+        with database.conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Las habitaciones de ejemplo del esquema inicial se sustituyen
+            conn.execute("DELETE FROM habitaciones")
+            filas_habitaciones = []
+            for i in range(habitaciones):
+                tipo, capacidad, precio, _ = _elegir(rnd, [(t, t[3]) for t in TIPOS])
+                numero = f"{i // HABITACIONES_POR_PLANTA + 1}{i % HABITACIONES_POR_PLANTA + 1:02d}"
+                filas_habitaciones.append((numero, tipo, capacidad, round(precio * rnd.uniform(0.9, 1.15), -3),
+                                           AMENIDADES[tipo], f"Habitación {tipo.lower()} {numero}"))
+            conn.executemany("""
+                INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, amenidades, descripcion)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, filas_habitaciones)
+
+            conn.executemany("""
+                INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+                VALUES (?, ?, ?, ?, ?)
+            """, ((f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+                   str(10000000 + i * 7 + rnd.randint(0, 6)),
+                   f"Calle {rnd.randint(1, 150)} #{rnd.randint(1, 99)}-{rnd.randint(1, 99)}, {rnd.choice(CIUDADES)}",
+                   f"cliente{i}@ejemplo.com",
+                   f"3{rnd.randint(100000000, 199999999)}") for i in range(clientes)))
+            ids_clientes = [fila[0] for fila in conn.execute("SELECT id FROM clientes")]
+
+            inicio, fin = hoy - timedelta(days=365 * anos), hoy + timedelta(days=180)
+            reservas, ocupadas = [], set()
+            for numero, _, capacidad, precio, _, _ in filas_habitaciones:
+                dia = inicio + timedelta(days=rnd.randint(0, 3))
+                while dia < fin:
+                    noches = _elegir(rnd, NOCHES)
+                    entrada, salida = dia, dia + timedelta(days=noches)
+                    estado = _estado_reserva(rnd, entrada, salida, hoy)
+                    if estado == 'Ocupada':
+                        ocupadas.add(numero)
+                    reservas.append((rnd.choice(ids_clientes), numero, entrada, salida,
+                                     rnd.randint(1, capacidad), precio * noches, estado))
+                    dia = salida + timedelta(days=int(rnd.expovariate(1 / HUECO_MEDIO)))
+
+            pagos = []
+            for cliente_id, numero, entrada, salida, personas, total, estado in reservas:
+                cursor = conn.execute("""
+                    INSERT INTO reservas (cliente_id, habitacion, fecha_entrada, fecha_salida, num_personas,
+                                          precio_total, estado, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (cliente_id, numero, entrada.isoformat(), salida.isoformat(), personas, total, estado,
+                      f"{min(entrada, hoy).isoformat()} 12:00:00"))
+                estado_pago, fecha_pago = _pago(rnd, estado, entrada, salida, hoy)
+                pagos.append((cursor.lastrowid, cliente_id, total, fecha_pago.isoformat(), _elegir(rnd, METODOS),
+                              estado_pago, f"RES-{cursor.lastrowid}"))
+            conn.executemany("""
+                INSERT INTO pagos (reserva_id, cliente_id, monto, fecha, metodo, estado, referencia)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, pagos)
+
+            # Con el mismo generador que el resto: la misma semilla da la misma base
+            mantenimiento = [numero for numero, *_ in filas_habitaciones
+                             if numero not in ocupadas and rnd.random() < 0.03]
+            conn.executemany("UPDATE habitaciones SET estado = 'Ocupada' WHERE numero = ?",
+                             ((numero,) for numero in ocupadas))
+            conn.executemany("UPDATE habitaciones SET estado = 'Mantenimiento' WHERE numero = ?",
+                             ((numero,) for numero in mantenimiento))
+            conn.execute("INSERT INTO usuarios (username, password) VALUES (?, ?)",
+                         (USUARIO, generate_password_hash(CLAVE)))
+            conn.commit()
+            conn.execute("ANALYZE")
+            return {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                    for tabla in ('habitaciones', 'clientes', 'reservas', 'pagos')}
+    finally:
+        database.cerrar_pool()
+        database.DATABASE_NAME = anterior
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una base de datos sintética del hotel")
+    parser.add_argument("ruta", help="archivo de la base (se sobrescribe)")
+    parser.add_argument("--habitaciones", type=int, default=60)
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--anos", type=int, default=2, help="años de historial de reservas")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.abspath(args.ruta) == os.path.abspath(database.DATABASE_NAME):
+        parser.error(f"no se sobrescribe la base de la aplicación ({database.DATABASE_NAME})")
+    print(f"🏗️  Generando {args.ruta}...")
+    inicio = time.perf_counter()
+    totales = generar(args.ruta, args.habitaciones, args.clientes, args.anos, args.semilla)
+    for tabla, total in totales.items():
+        print(f"   {tabla}: {total}")
+    print(f"✅ Listo en {time.perf_counter() - inicio:.1f} s")
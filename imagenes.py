@@ -0,0 +1,315 @@
+"""
+Fotos de habitaciones: almacenamiento por hash de contenido y variantes en
+segundo plano.
+
+Al subir una foto solo se calcula su SHA-256 mientras se copia a disco y se
+registra en la tabla imagenes; la petición vuelve enseguida. Un pool de
+hilos genera después las variantes WebP (miniatura, mediana, grande) sin
+metadatos (EXIF, GPS...), aplicando antes la orientación de la cámara, y
+apunta habitaciones.imagen a la variante mediana, que es la que muestran los
+listados. Subir dos veces la misma foto no ocupa espacio dos veces.
+
+    static/uploads/ab/abcdef...-320.webp
+    static/uploads/ab/abcdef...-640.webp
+    static/uploads/ab/abcdef...-1280.webp
+
+Sin Pillow (dependencia opcional) la foto se guarda tal cual, también por
+hash, y esa es su única variante.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import fragmentos
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # opcional: sin Pillow no hay variantes ni limpieza de metadatos
+    Image = None
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(RAIZ, 'static')
+CARPETA = 'uploads'
+# Las subidas sin procesar no se sirven: pueden llevar metadatos
+PENDIENTES = os.path.join(RAIZ, 'subidas_pendientes')
+
+EXTENSIONES = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+ANCHOS = {'miniatura': 320, 'mediana': 640, 'grande': 1280}
+VARIANTE_LISTADOS = 'mediana'
+CALIDAD = 80
+HILOS = 2
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class ImagenNoValida(ValueError):
+    """El archivo subido no es una imagen aceptada"""
+
+
+def _ejecutor():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='imagenes')
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _ruta_publica(hash_, sufijo):
+    """Ruta relativa a static/ (la que se guarda en la base)"""
+    return f"{CARPETA}/{hash_[:2]}/{hash_}{sufijo}"
+
+
+def _escribir(ruta_relativa, escribir):
+    """Escribe en un temporal y lo mueve con os.replace: nunca se sirve un archivo a medias"""
+    destino = os.path.join(STATIC, ruta_relativa)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            escribir(archivo)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def recibir(archivo):
+    """Guarda la subida por su hash y encola su procesado; devuelve el hash o None sin archivo.
+
+    Lanza ImagenNoValida si la extensión no está permitida.
+    """
+    if not archivo or not archivo.filename:
+        return None
+    extension = archivo.filename.rsplit('.', 1)[-1].lower() if '.' in archivo.filename else ''
+    if extension not in EXTENSIONES:
+        raise ImagenNoValida('Formato de imagen no permitido (png, jpg, jpeg, gif, webp).')
+    extension = 'jpg' if extension == 'jpeg' else extension
+
+    # Copia a disco calculando el hash por bloques, sin cargarla en memoria
+    os.makedirs(PENDIENTES, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=PENDIENTES, suffix='.tmp')
+    sha, total = hashlib.sha256(), 0
+    with os.fdopen(descriptor, 'wb') as destino:
+        for bloque in iter(lambda: archivo.stream.read(1 << 16), b''):
+            sha.update(bloque)
+            destino.write(bloque)
+            total += len(bloque)
+    hash_ = sha.hexdigest()
+
+    with database.conexion() as conn:
+        nueva = conn.execute("""
+            INSERT INTO imagenes (hash, extension, bytes) VALUES (?, ?, ?)
+            ON CONFLICT (hash) DO NOTHING
+        """, (hash_, extension, total)).rowcount
+        if not nueva:
+            # Ya la teníamos; se reintenta si había fallado
+            nueva = conn.execute("""
+                UPDATE imagenes SET estado = 'pendiente', error = NULL
+                WHERE hash = ? AND estado = 'error'
+            """, (hash_,)).rowcount
+        conn.commit()
+    if not nueva:
+        os.unlink(temporal)
+        return hash_
+
+    os.replace(temporal, os.path.join(PENDIENTES, hash_))
+    if Image is None:
+        _procesar(hash_)
+    else:
+        _ejecutor().submit(_procesar, hash_)
+    return hash_
+
+
+def _variantes(hash_, original):
+    """Variantes WebP de la foto pendiente; devuelve ({nombre: ruta}, ancho, alto)"""
+    with Image.open(original) as imagen:
+        imagen.load()
+        # Aplica la orientación EXIF antes de descartar los metadatos
+        imagen = ImageOps.exif_transpose(imagen)
+        ancho, alto = imagen.size
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'P') else 'RGB')
+        variantes = {}
+        for nombre, maximo in ANCHOS.items():
+            copia = imagen.copy()
+            copia.thumbnail((maximo, maximo))  # mantiene la proporción y nunca amplía
+            ruta = _ruta_publica(hash_, f"-{maximo}.webp")
+            # Sin exif= ni icc_profile= el archivo sale sin metadatos
+            _escribir(ruta, lambda archivo: copia.save(archivo, 'WEBP', quality=CALIDAD, method=4))
+            variantes[nombre] = ruta
+    return variantes, ancho, alto
+
+
+def _procesar(hash_):
+    original = os.path.join(PENDIENTES, hash_)
+    with database.conexion() as conn:
+        extension = conn.execute("SELECT extension FROM imagenes WHERE hash = ?", (hash_,)).fetchone()[0]
+    try:
+        if Image is not None:
+            variantes, ancho, alto = _variantes(hash_, original)
+        else:
+            ruta = _ruta_publica(hash_, f".{extension}")
+            with open(original, 'rb') as origen:
+                _escribir(ruta, lambda archivo: shutil.copyfileobj(origen, archivo))
+            variantes, ancho, alto = {VARIANTE_LISTADOS: ruta}, None, None
+        estado, error = 'lista', None
+    except Exception as e:
+        variantes, ancho, alto = None, None, None
+        estado, error = 'error', str(e)
+        print(f"❌ No se pudo procesar la imagen {hash_}: {e}")
+
+    with database.conexion() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            UPDATE imagenes SET estado = ?, variantes = ?, ancho = ?, alto = ?, error = ?
+            WHERE hash = ?
+        """, (estado, json.dumps(variantes) if variantes else None, ancho, alto, error, hash_))
+        # Las habitaciones que ya apuntan a esta foto pasan a mostrar su variante
+        if variantes:
+            conn.execute("UPDATE habitaciones SET imagen = ? WHERE imagen_hash = ?",
+                         (variantes[VARIANTE_LISTADOS], hash_))
+        conn.commit()
+    if variantes:
+        fragmentos.publicar()
+    if os.path.exists(original):
+        os.unlink(original)
+
+
+# Para los INSERT/UPDATE de habitaciones: la variante de los listados si ya
+# está lista (si no, la pondrá _procesar al terminar)
+SQL_IMAGEN = f"""(SELECT json_extract(variantes, '$.{VARIANTE_LISTADOS}')
+                 FROM imagenes WHERE hash = ? AND estado = 'lista')"""
+
+
+def variantes(conn, hash_):
+    """{nombre: ruta} de una foto procesada, o {} si aún no lo está"""
+    fila = conn.execute("SELECT variantes FROM imagenes WHERE hash = ? AND estado = 'lista'",
+                        (hash_,)).fetchone()
+    return json.loads(fila[0]) if fila and fila[0] else {}
+
+
+def liberar(hash_):
+    """Borra la foto y sus variantes si ya ninguna habitación la usa"""
+    if not hash_:
+        return False
+    with database.conexion() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        fila = conn.execute("""
+            DELETE FROM imagenes
+            WHERE hash = ? AND estado != 'pendiente'
+            AND NOT EXISTS (SELECT 1 FROM habitaciones WHERE imagen_hash = ?)
+            RETURNING variantes
+        """, (hash_, hash_)).fetchone()
+        conn.commit()
+    if fila is None:
+        return False
+    for ruta in json.loads(fila[0] or '{}').values():
+        try:
+            os.remove(os.path.join(STATIC, ruta))
+        except OSError:
+            pass
+    return True
+
+
+def liberar_habitacion(fila):
+    """Libera la foto de una habitación ya borrada o con foto nueva.
+
+    Las subidas anteriores a imagenes (sin imagen_hash) se borran por ruta si
+    ninguna otra habitación la usa.
+    """
+    if not fila:
+        return False
+    if fila['imagen_hash']:
+        return liberar(fila['imagen_hash'])
+    if not fila['imagen']:
+        return False
+    with database.conexion() as conn:
+        en_uso = conn.execute("SELECT 1 FROM habitaciones WHERE imagen = ?", (fila['imagen'],)).fetchone()
+    if en_uso:
+        return False
+    try:
+        os.remove(os.path.join(STATIC, fila['imagen']))
+        return True
+    except OSError:
+        return False
+
+
+def limpiar(antiguedad=3600, simular=False):
+    """Borra fotos que ya no usa ninguna habitación; devuelve las rutas borradas.
+
+    Solo toca archivos con más de `antiguedad` segundos, para no llevarse una
+    subida que aún no llegó a su habitación.
+    """
+    limite = time.time() - antiguedad
+    borradas = []
+    with database.conexion() as conn:
+        sin_uso = {fila[0]: json.loads(fila[1] or '{}').values() for fila in conn.execute("""
+            SELECT hash, variantes FROM imagenes
+            WHERE estado != 'pendiente' AND creada < datetime(?, 'unixepoch')
+            AND hash NOT IN (SELECT imagen_hash FROM habitaciones WHERE imagen_hash IS NOT NULL)
+        """, (limite,))}
+        en_uso = {fila[0] for fila in conn.execute("SELECT imagen FROM habitaciones WHERE imagen IS NOT NULL")}
+        en_uso.update(fila[1] for fila in conn.execute(
+            "SELECT imagenes.hash, v.value FROM imagenes, json_each(imagenes.variantes) AS v")
+            if fila[0] not in sin_uso)
+        pendientes = {fila[0] for fila in conn.execute("SELECT hash FROM imagenes WHERE estado = 'pendiente'")}
+    for hash_, rutas in sin_uso.items():
+        if simular or liberar(hash_):
+            borradas.extend(os.path.join(STATIC, ruta) for ruta in rutas)
+        # Ya contadas (o vuelven a usarse): el recorrido de archivos no las toca
+        en_uso.update(rutas)
+
+    candidatos = []
+    for carpeta, _, archivos in os.walk(os.path.join(STATIC, CARPETA)):
+        for nombre in archivos:
+            ruta = os.path.join(carpeta, nombre)
+            if os.path.relpath(ruta, STATIC).replace(os.sep, '/') not in en_uso:
+                candidatos.append(ruta)
+    if os.path.isdir(PENDIENTES):
+        candidatos.extend(os.path.join(PENDIENTES, nombre) for nombre in os.listdir(PENDIENTES)
+                          if nombre not in pendientes)
+    for ruta in candidatos:
+        try:
+            if os.path.getmtime(ruta) >= limite:
+                continue
+            if not simular:
+                os.remove(ruta)
+            borradas.append(ruta)
+        except OSError:
+            pass
+    return borradas
+
+
+def reanudar():
+    """Vuelve a encolar las fotos que quedaron pendientes (p. ej. tras un reinicio)"""
+    with database.conexion() as conn:
+        pendientes = [fila[0] for fila in conn.execute("SELECT hash FROM imagenes WHERE estado = 'pendiente'")]
+    for hash_ in pendientes:
+        if os.path.exists(os.path.join(PENDIENTES, hash_)):
+            _ejecutor().submit(_procesar, hash_)
+    return len(pendientes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Borra las fotos de habitaciones que ya no se usan")
+    parser.add_argument("--simular", action="store_true", help="solo lista lo que se borraría")
+    parser.add_argument("--antiguedad", type=int, default=3600, metavar="SEGUNDOS",
+                        help="no toca archivos más recientes (por defecto 3600)")
+    args = parser.parse_args()
+
+    database.init_db()
+    borradas = limpiar(args.antiguedad, args.simular)
+    for ruta in borradas:
+        print(f"   🗑️  {os.path.relpath(ruta, RAIZ)}")
+    print(f"{'🔍 Se borrarían' if args.simular else '✅ Borrados'} {len(borradas)} archivos sin uso")
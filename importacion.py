@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Importación masiva de clientes, reservas, pagos, habitaciones y usuarios.
+
+    python importacion.py data.json
+    python importacion.py huespedes.csv --tabla clientes
+    python importacion.py reservas.jsonl --tabla reservas --rechazos errores.jsonl
+
+Formatos:
+- JSON con secciones {"clientes": [...], "pagos": [...]} como data.json; las
+  secciones que no son tablas del esquema se omiten.
+- JSON con un array de filas, JSON Lines o CSV con cabecera (requieren --tabla).
+
+El archivo se lee en streaming (los arrays JSON elemento a elemento), las
+filas se validan con las mismas reglas que los formularios y se insertan con
+executemany en lotes. Los índices y triggers de las tablas afectadas se
+eliminan al empezar y se recrean al final, y lo que mantenían los triggers
+(búsqueda, calendario de ocupación, resumen de ingresos, versiones) se
+recalcula de una vez. Todo ocurre en una sola transacción: otros workers
+nunca ven las tablas sin sus triggers, y un error deja la base como estaba.
+Las filas rechazadas se escriben, con el motivo, en un archivo JSON Lines.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+import database
+import disponibilidad
+import fragmentos
+import ingresos
+import ocupacion
+import validaciones
+
+LOTE = 5000
+
+# Tamaño de lectura del archivo JSON
+BLOQUE_LECTURA = 1 << 16
+
+VALIDADORES = {
+    'clientes': validaciones.validar_cliente,
+    'habitaciones': validaciones.validar_habitacion,
+    'usuarios': validaciones.validar_usuario,
+    'reservas': validaciones.validar_reserva,
+    'pagos': validaciones.validar_pago,
+}
+
+# (columna, tabla referenciada): las claves foráneas no están activadas en
+# SQLite, así que se comprueban por lote antes de insertar
+REFERENCIAS = {
+    'reservas': [('cliente_id', 'clientes')],
+    'pagos': [('cliente_id', 'clientes'), ('reserva_id', 'reservas')],
+}
+
+
+# ========== LECTURA ==========
+
+class _LectorJSON:
+    """Recorre un documento JSON sin cargarlo entero: los valores de cada
+    sección o del array principal se decodifican de uno en uno"""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.buffer = ''
+        self.pos = 0
+        self.fin = False
+        self.decoder = json.JSONDecoder()
+
+    def _leer(self):
+        if self.pos > BLOQUE_LECTURA:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        datos = self.archivo.read(BLOQUE_LECTURA)
+        if not datos:
+            self.fin = True
+        self.buffer += datos
+
+    def caracter(self):
+        """Siguiente carácter significativo (sin consumirlo) o '' al final"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.fin:
+                return self.buffer[self.pos:self.pos + 1]
+            self._leer()
+
+    def esperar(self, esperado):
+        encontrado = self.caracter()
+        if encontrado != esperado:
+            raise ValueError(f"JSON inválido: se esperaba {esperado!r} y llegó {encontrado!r}")
+        self.pos += 1
+
+    def valor(self):
+        """Decodifica el siguiente valor completo, leyendo más si hace falta"""
+        self.caracter()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un número al final del buffer podría continuar en la lectura siguiente
+                if fin < len(self.buffer) or self.fin:
+                    self.pos = fin
+                    return valor
+            except json.JSONDecodeError:
+                if self.fin:
+                    raise
+            self._leer()
+
+    def elementos(self):
+        """Elementos del array que empieza en la posición actual"""
+        self.esperar('[')
+        if self.caracter() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.valor()
+            separador = self.caracter()
+            self.pos += 1
+            if separador == ']':
+                return
+            if separador != ',':
+                raise ValueError(f"JSON inválido: se esperaba ',' o ']' y llegó {separador!r}")
+
+    def saltar(self):
+        """Descarta el valor siguiente (los arrays, elemento a elemento)"""
+        if self.caracter() == '[':
+            for _ in self.elementos():
+                pass
+        else:
+            self.valor()
+
+    def secciones(self):
+        """(nombre, lector de la sección) de un objeto JSON de primer nivel"""
+        self.esperar('{')
+        if self.caracter() == '}':
+            return
+        while True:
+            nombre = self.valor()
+            self.esperar(':')
+            yield nombre
+            separador = self.caracter()
+            self.pos += 1
+            if separador == '}':
+                return
+            if separador != ',':
+                raise ValueError(f"JSON inválido: se esperaba ',' o '}}' y llegó {separador!r}")
+
+
+# Línea de JSON Lines que no se pudo decodificar: se rechaza como una fila no válida
+LineaInvalida = namedtuple('LineaInvalida', 'numero texto error')
+
+
+def _lineas_json(archivo):
+    """Objetos de un archivo JSON Lines; las líneas mal formadas no detienen la lectura"""
+    for numero, linea in enumerate(archivo, 1):
+        if not linea.strip():
+            continue
+        try:
+            yield json.loads(linea)
+        except ValueError as e:
+            yield LineaInvalida(numero, linea.rstrip('\r\n'), str(e))
+
+
+def leer(ruta, tabla=None):
+    """Genera (tabla, filas) del archivo; filas es un iterador de dicts"""
+    extension = os.path.splitext(ruta)[1].lower()
+    with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+        if extension == '.csv':
+            if not tabla:
+                raise ValueError("Los CSV requieren --tabla")
+            yield tabla, csv.DictReader(archivo)
+            return
+
+        if extension in ('.jsonl', '.ndjson'):
+            if not tabla:
+                raise ValueError("Los JSON Lines requieren --tabla")
+            yield tabla, _lineas_json(archivo)
+            return
+
+        lector = _LectorJSON(archivo)
+        if lector.caracter() == '[':
+            if not tabla:
+                raise ValueError("Un array JSON requiere --tabla")
+            yield tabla, lector.elementos()
+            return
+
+        for seccion in lector.secciones():
+            if lector.caracter() == '[' and (not tabla or seccion == tabla):
+                yield seccion, lector.elementos()
+            else:
+                # configuracion, estadisticas u otras tablas
+                lector.saltar()
+
+
+# ========== IMPORTACIÓN ==========
+
+class Importacion:
+
+    def __init__(self, conn, ruta_rechazos, lote=LOTE):
+        self.conn = conn
+        self.ruta_rechazos = ruta_rechazos
+        self.lote = lote
+        self._rechazos = None
+        self._diferidos = []      # SQL de índices y triggers eliminados
+        self.tablas = []          # tablas importadas, en orden
+        self.resultados = {}      # tabla -> {'aceptadas', 'rechazadas', 'segundos'}
+        self.segundos_finalizar = 0.0
+
+    def rechazar(self, tabla, fila, motivo):
+        if self._rechazos is None:
+            self._rechazos = open(self.ruta_rechazos, 'w', encoding='utf-8')
+        self._rechazos.write(json.dumps({'tabla': tabla, 'motivo': motivo, 'fila': fila},
+                                        ensure_ascii=False, default=str) + '\n')
+        self.resultados[tabla]['rechazadas'] += 1
+
+    def _diferir(self, tabla):
+        """Elimina los índices y triggers de la tabla y guarda su SQL para recrearlos"""
+        objetos = self.conn.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            AND sql NOT LIKE 'CREATE UNIQUE%'
+        """, (tabla,)).fetchall()
+        for objeto in objetos:
+            self.conn.execute(f'DROP {objeto["type"].upper()} "{objeto["name"]}"')
+            self._diferidos.append(objeto['sql'])
+
+    def _referencias_validas(self, tabla, filas):
+        """Separa las filas cuyas claves foráneas no existen"""
+        for columna, referida in REFERENCIAS.get(tabla, []):
+            ids = sorted({fila[columna] for fila in filas})
+            existentes = set()
+            for inicio in range(0, len(ids), 500):
+                parte = ids[inicio:inicio + 500]
+                marcadores = ", ".join("?" for _ in parte)
+                existentes.update(f[0] for f in self.conn.execute(
+                    f"SELECT id FROM {referida} WHERE id IN ({marcadores})", parte))
+            validas = []
+            for fila in filas:
+                if fila[columna] in existentes:
+                    validas.append(fila)
+                else:
+                    self.rechazar(tabla, fila, f"{columna} {fila[columna]} no existe en {referida}")
+            filas = validas
+        return filas
+
+    def _insertar(self, tabla, filas):
+        filas = self._referencias_validas(tabla, filas)
+        if not filas:
+            return
+        columnas = list(filas[0])
+        sql = (f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+               f"VALUES ({', '.join(':' + columna for columna in columnas)})")
+        self.conn.execute("SAVEPOINT lote")
+        try:
+            self.conn.executemany(sql, filas)
+            aceptadas = len(filas)
+        except sqlite3.IntegrityError:
+            # Algún duplicado en el lote: se repite fila a fila para aislarlo
+            self.conn.execute("ROLLBACK TO lote")
+            aceptadas = 0
+            for fila in filas:
+                try:
+                    self.conn.execute(sql, fila)
+                    aceptadas += 1
+                except sqlite3.IntegrityError as e:
+                    self.rechazar(tabla, fila, str(e))
+        self.conn.execute("RELEASE lote")
+        self.resultados[tabla]['aceptadas'] += aceptadas
+
+    def importar(self, tabla, filas):
+        validar = VALIDADORES[tabla]
+        if tabla not in self.tablas:
+            self.tablas.append(tabla)
+            self.resultados[tabla] = {'aceptadas': 0, 'rechazadas': 0, 'segundos': 0.0}
+            self._diferir(tabla)
+
+        inicio = time.perf_counter()
+        pendientes = []
+        for fila in filas:
+            if isinstance(fila, LineaInvalida):
+                self.rechazar(tabla, fila.texto, f"línea {fila.numero}: JSON inválido ({fila.error})")
+                continue
+            try:
+                if not isinstance(fila, dict):
+                    raise ValueError("la fila no es un objeto")
+                pendientes.append(validar(fila))
+            except ValueError as e:
+                self.rechazar(tabla, fila, str(e))
+                continue
+            if len(pendientes) >= self.lote:
+                self._insertar(tabla, pendientes)
+                pendientes = []
+        if pendientes:
+            self._insertar(tabla, pendientes)
+        self.resultados[tabla]['segundos'] += time.perf_counter() - inicio
+
+    def finalizar(self):
+        """Recrea índices y triggers y recalcula lo que mantenían los triggers"""
+        for sql in self._diferidos:
+            self.conn.execute(sql)
+        if 'clientes' in self.tablas:
+            self.conn.execute("INSERT INTO clientes_fts(clientes_fts) VALUES ('rebuild')")
+        if 'reservas' in self.tablas:
+            ocupacion.reconstruir(self.conn)
+            disponibilidad.forzar_reconstruccion(self.conn)
+        if 'pagos' in self.tablas:
+            ingresos.recalcular(self.conn)
+        for tabla in self.tablas:
+            self.conn.execute("UPDATE versiones_tabla SET version = version + 1 WHERE tabla = ?", (tabla,))
+
+    def cerrar(self):
+        if self._rechazos is not None:
+            self._rechazos.close()
+
+
+def importar(ruta, tabla=None, ruta_rechazos=None, lote=LOTE):
+    """Importa el archivo en una transacción; devuelve los resultados por tabla"""
+    if tabla and tabla not in VALIDADORES:
+        raise ValueError(f"Tabla no soportada: {tabla}")
+    ruta_rechazos = ruta_rechazos or ruta + '.rechazados.jsonl'
+    omitidas = []
+
+    with database.conexion() as conn:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        importacion = Importacion(conn, ruta_rechazos, lote)
+        try:
+            for seccion, filas in leer(ruta, tabla):
+                if seccion in VALIDADORES:
+                    importacion.importar(seccion, filas)
+                else:
+                    # Sin tabla en el esquema (p. ej. servicios_hotel): se recorre y se descarta
+                    omitidas.append((seccion, sum(1 for _ in filas)))
+            inicio = time.perf_counter()
+            importacion.finalizar()
+            conn.commit()
+            importacion.segundos_finalizar = time.perf_counter() - inicio
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            importacion.cerrar()
+
+    fragmentos.publicar()
+    return importacion, omitidas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa clientes, reservas, pagos, habitaciones y usuarios")
+    parser.add_argument("archivo", help="JSON, JSON Lines o CSV")
+    parser.add_argument("--tabla", choices=sorted(VALIDADORES), help="tabla de destino (CSV, JSON Lines o array JSON)")
+    parser.add_argument("--rechazos", help="archivo JSON Lines de filas rechazadas (por defecto <archivo>.rechazados.jsonl)")
+    parser.add_argument("--lote", type=int, default=LOTE, help=f"filas por executemany (por defecto {LOTE})")
+    args = parser.parse_args()
+
+    database.init_db()
+    print(f"📥 Importando {args.archivo}...")
+    try:
+        resultado, omitidas = importar(args.archivo, args.tabla, args.rechazos, args.lote)
+    except (OSError, ValueError) as e:
+        print(f"❌ Importación cancelada, no se guardó nada: {e}")
+        sys.exit(1)
+
+    for tabla in resultado.tablas:
+        datos = resultado.resultados[tabla]
+        por_segundo = datos['aceptadas'] / datos['segundos'] if datos['segundos'] else 0
+        print(f"   ✅ {tabla}: {datos['aceptadas']} importadas, {datos['rechazadas']} rechazadas "
+              f"({por_segundo:,.0f} filas/s)")
+    for seccion, cantidad in omitidas:
+        print(f"   ⏭️  {seccion}: {cantidad} filas omitidas (no es una tabla del esquema)")
+    print(f"   🔧 Índices, triggers y datos derivados rehechos en {resultado.segundos_finalizar:.2f} s")
+    if any(datos['rechazadas'] for datos in resultado.resultados.values()):
+        print(f"   📝 Filas rechazadas en {resultado.ruta_rechazos}")
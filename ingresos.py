@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Resumen mensual de pagos (tabla ingresos_mensuales).
+
+Los triggers de pagos lo mantienen al día fila a fila; este módulo lo lee
+para el reporte financiero y permite reconstruirlo desde cero o comprobar
+que coincide con la tabla pagos:
+
+    python ingresos.py --verificar
+    python ingresos.py --reconstruir
+"""
+
+import sys
+
+import database
+
+# El resumen calculado directamente desde pagos (misma clave que los triggers)
+AGRUPADO = """
+    SELECT COALESCE(strftime('%Y-%m', fecha), '') AS mes, COALESCE(metodo, '') AS metodo,
+           COALESCE(estado, '') AS estado, COUNT(*) AS cantidad, COALESCE(SUM(monto), 0) AS total
+    FROM pagos
+    GROUP BY 1, 2, 3
+"""
+
+# Diferencia admitida en los totales (sumas y restas de REAL acumulan redondeo)
+TOLERANCIA = 0.005
+
+
+def mensuales(conn, meses=12, estado='Completado'):
+    """Ingresos por mes de los últimos `meses` meses (incluido el actual)"""
+    return conn.execute("""
+        SELECT mes, SUM(total) AS ingresos, SUM(cantidad) AS cantidad
+        FROM ingresos_mensuales
+        WHERE estado = ? AND mes > strftime('%Y-%m', 'now', ?)
+        GROUP BY mes
+        ORDER BY mes DESC
+    """, (estado, f'-{meses} months')).fetchall()
+
+
+def por_metodo(conn, estado='Completado'):
+    """Cantidad y total por método de pago, de mayor a menor total"""
+    return conn.execute("""
+        SELECT metodo, SUM(cantidad) AS cantidad, SUM(total) AS total
+        FROM ingresos_mensuales
+        WHERE estado = ?
+        GROUP BY metodo
+        ORDER BY total DESC
+    """, (estado,)).fetchall()
+
+
+def recalcular(conn):
+    """Reemplaza el resumen por el calculado desde pagos, dentro de la transacción actual"""
+    conn.execute("DELETE FROM ingresos_mensuales")
+    cursor = conn.execute(f"""
+        INSERT INTO ingresos_mensuales (mes, metodo, estado, cantidad, total) {AGRUPADO}
+    """)
+    return cursor.rowcount
+
+
+def reconstruir(conn):
+    """Vuelve a calcular el resumen completo desde pagos; devuelve las filas escritas"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        filas = recalcular(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return filas
+
+
+def verificar(conn):
+    """Diferencias entre el resumen y pagos: [(mes, metodo, estado, esperado, guardado)]"""
+    esperado = {(f['mes'], f['metodo'], f['estado']): (f['cantidad'], f['total'])
+                for f in conn.execute(AGRUPADO)}
+    guardado = {(f['mes'], f['metodo'], f['estado']): (f['cantidad'], f['total'])
+                for f in conn.execute("SELECT mes, metodo, estado, cantidad, total FROM ingresos_mensuales")}
+
+    diferencias = []
+    for clave in sorted(esperado.keys() | guardado.keys()):
+        a, b = esperado.get(clave, (0, 0)), guardado.get(clave, (0, 0))
+        if a[0] != b[0] or abs(a[1] - b[1]) > TOLERANCIA:
+            diferencias.append((*clave, a, b))
+    return diferencias
+
+
+if __name__ == "__main__":
+    database.init_db()
+    with database.conexion() as conn:
+        if "--reconstruir" in sys.argv:
+            print(f"✅ Resumen reconstruido: {reconstruir(conn)} filas")
+        diferencias = verificar(conn)
+        for mes, metodo, estado, esperado, guardado in diferencias:
+            print(f"   ❌ {mes} {metodo} {estado}: pagos={esperado} resumen={guardado}")
+        if diferencias:
+            print(f"❌ {len(diferencias)} diferencias (python ingresos.py --reconstruir)")
+            sys.exit(1)
+        print("✅ El resumen coincide con la tabla pagos")
@@ -0,0 +1,330 @@
+"""
+Métricas por ruta: latencia, sentencias SQL, filas y consultas lentas.
+
+Cada petición se mide entre before_request y teardown_request (incluye el
+streaming de las plantillas), y cada execute de las conexiones del pool
+pasa por CursorMedido, que suma sentencias, tiempo y filas leídas a la ruta
+que se está atendiendo en ese hilo ('-' fuera de una petición: hilos de
+eventos, imágenes...). /metrics lo publica en formato de texto de
+Prometheus; /admin/metricas, en JSON con las últimas consultas lentas.
+
+Las consultas lentas (HOTEL_SQL_LENTA_MS, 100 por defecto) se guardan con la
+forma de sus parámetros (tipos y longitudes), nunca con los valores.
+
+Con HOTEL_PERFILADOR_MS=<ms> cada petición se muestrea (pila del hilo cada
+INTERVALO_MUESTREO s) y las que superan ese tiempo dejan en HOTEL_PERFILES_DIR
+un archivo .folded (formato de flamegraph.pl / speedscope).
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from flask import g, request
+
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_LENTA = float(os.environ.get('HOTEL_SQL_LENTA_MS', 100)) / 1000
+MAX_LENTAS = 50
+SIN_PETICION = '-'
+
+PERFILADOR = float(os.environ.get('HOTEL_PERFILADOR_MS', 0)) / 1000
+PERFILES_DIR = os.environ.get('HOTEL_PERFILES_DIR') or os.path.join(tempfile.gettempdir(), 'hotel-perfiles')
+INTERVALO_MUESTREO = 0.005
+
+
+def _ruta_nueva():
+    return {
+        'peticiones': Counter(),  # (método, estado) -> n
+        'cubetas': [0] * (len(CUBETAS) + 1),
+        'duracion': 0.0,
+        'errores': 0,
+        'sentencias': 0,
+        'tiempo_sql': 0.0,
+        'filas': 0,
+        'lentas': 0,
+    }
+
+
+_rutas = defaultdict(_ruta_nueva)
+_lentas = deque(maxlen=MAX_LENTAS)
+_lock = threading.Lock()
+_peticion = threading.local()
+
+
+def _ruta_actual():
+    return getattr(_peticion, 'ruta', None) or SIN_PETICION
+
+
+def forma(parametros):
+    """Tipos (y longitud de los textos) de los parámetros, sin sus valores"""
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {clave: forma([valor])[0] for clave, valor in parametros.items()}
+    return [f"{type(p).__name__}({len(p)})" if isinstance(p, (str, bytes)) else type(p).__name__
+            for p in parametros]
+
+
+def registrar_sql(sql, parametros, segundos, filas=0):
+    ruta = _ruta_actual()
+    with _lock:
+        datos = _rutas[ruta]
+        datos['sentencias'] += 1
+        datos['tiempo_sql'] += segundos
+        datos['filas'] += filas
+        if segundos >= SQL_LENTA:
+            datos['lentas'] += 1
+            _lentas.append({
+                'ruta': ruta,
+                'ms': round(segundos * 1000, 2),
+                'sql': re.sub(r'\s+', ' ', sql).strip()[:500],
+                'parametros': forma(parametros),
+                'momento': time.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+
+
+def registrar_filas(n, segundos=0.0):
+    with _lock:
+        datos = _rutas[_ruta_actual()]
+        datos['filas'] += n
+        datos['tiempo_sql'] += segundos
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que anota cada sentencia (tiempo, filas) en la ruta en curso.
+
+    El tiempo de fetchone/fetchmany/fetchall también cuenta: SQLite avanza la
+    consulta al leer. Al recorrer el cursor con for solo se cuentan las filas,
+    de una vez al terminar, para no pagar un bloqueo por fila.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._recorridas = 0
+
+    def _contar_recorridas(self):
+        if self._recorridas:
+            registrar_filas(self._recorridas)
+            self._recorridas = 0
+
+    def execute(self, sql, parametros=()):
+        self._contar_recorridas()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registrar_sql(sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, parametros):
+        self._contar_recorridas()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            registrar_sql(sql, None, time.perf_counter() - inicio)
+
+    def executescript(self, script):
+        self._contar_recorridas()
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            registrar_sql(script, None, time.perf_counter() - inicio)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        registrar_filas(fila is not None, time.perf_counter() - inicio)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        registrar_filas(len(filas), time.perf_counter() - inicio)
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        registrar_filas(len(filas), time.perf_counter() - inicio)
+        return filas
+
+    def __next__(self):
+        try:
+            fila = super().__next__()
+        except StopIteration:
+            self._contar_recorridas()
+            raise
+        self._recorridas += 1
+        return fila
+
+    def close(self):
+        self._contar_recorridas()
+        super().close()
+
+
+# ========== PERFILADOR POR MUESTREO ==========
+
+class Muestreo(threading.Thread):
+    """Toma la pila de un hilo cada `intervalo` segundos mientras dura la petición"""
+
+    def __init__(self, hilo, intervalo=INTERVALO_MUESTREO):
+        super().__init__(daemon=True, name='metricas-muestreo')
+        self.hilo = hilo
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{marco.f_lineno})")
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        return self.pilas
+
+
+def _guardar_perfil(ruta, segundos, pilas):
+    os.makedirs(PERFILES_DIR, exist_ok=True)
+    nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{ruta}-{int(segundos * 1000)}ms.folded"
+    with open(os.path.join(PERFILES_DIR, nombre), 'w', encoding='utf-8') as archivo:
+        for pila, muestras in pilas.most_common():
+            archivo.write(f"{pila} {muestras}\n")
+
+
+# ========== ENGANCHE EN FLASK ==========
+
+def _inicio():
+    ruta = request.endpoint or 'desconocida'
+    # En el hilo, para que CursorMedido sepa a qué ruta sumar; el resto, en g
+    _peticion.ruta = ruta
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_estado = None
+    g.metricas_muestreo = None
+    if PERFILADOR:
+        g.metricas_muestreo = Muestreo(threading.get_ident())
+        g.metricas_muestreo.start()
+
+
+def _estado(respuesta):
+    g.metricas_estado = respuesta.status_code
+    return respuesta
+
+
+def _fin(error=None):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is None:
+        return
+    segundos = time.perf_counter() - inicio
+    ruta = request.endpoint or 'desconocida'
+    estado = g.get('metricas_estado') or 500
+    # GeneratorExit: el cliente cortó una respuesta en streaming, no es un fallo nuestro
+    if error is not None and not isinstance(error, GeneratorExit):
+        estado = 500
+    with _lock:
+        datos = _rutas[ruta]
+        datos['peticiones'][(request.method, estado)] += 1
+        datos['duracion'] += segundos
+        datos['cubetas'][next((i for i, limite in enumerate(CUBETAS) if segundos <= limite), len(CUBETAS))] += 1
+        if estado >= 500:
+            datos['errores'] += 1
+    muestreo = g.get('metricas_muestreo')
+    if muestreo is not None:
+        pilas = muestreo.parar()
+        if segundos >= PERFILADOR and pilas:
+            _guardar_perfil(ruta, segundos, pilas)
+    _peticion.ruta = None
+
+
+def registrar(app):
+    """Mide todas las vistas de `app` (y de sus blueprints)"""
+    app.before_request(_inicio)
+    app.after_request(_estado)
+    app.teardown_request(_fin)
+    return app
+
+
+# ========== EXPORTACIÓN ==========
+
+def estadisticas():
+    """Por ruta: peticiones, latencia media, SQL y las últimas consultas lentas"""
+    with _lock:
+        rutas = {}
+        for ruta, datos in _rutas.items():
+            peticiones = sum(datos['peticiones'].values())
+            rutas[ruta] = {
+                'peticiones': peticiones,
+                'errores': datos['errores'],
+                'latencia_media_ms': round(datos['duracion'] / peticiones * 1000, 2) if peticiones else None,
+                'sentencias': datos['sentencias'],
+                'sentencias_por_peticion': round(datos['sentencias'] / peticiones, 2) if peticiones else None,
+                'tiempo_sql_ms': round(datos['tiempo_sql'] * 1000, 2),
+                'filas': datos['filas'],
+                'lentas': datos['lentas'],
+            }
+        return {'rutas': rutas, 'consultas_lentas': list(_lentas)}
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus(extra=None):
+    """Texto para /metrics. `extra`: {nombre: (tipo, ayuda, valor)} de otros módulos"""
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+
+    with _lock:
+        rutas = {ruta: {**datos, 'peticiones': Counter(datos['peticiones']), 'cubetas': list(datos['cubetas'])}
+                 for ruta, datos in _rutas.items()}
+
+    metrica('hotel_http_peticiones_total', 'counter', 'Peticiones atendidas por ruta, método y estado')
+    for ruta, datos in sorted(rutas.items()):
+        for (metodo, estado), n in sorted(datos['peticiones'].items()):
+            lineas.append(f'hotel_http_peticiones_total{{ruta="{_etiqueta(ruta)}",metodo="{metodo}",estado="{estado}"}} {n}')
+
+    metrica('hotel_http_duracion_segundos', 'histogram', 'Duración de las peticiones por ruta')
+    for ruta, datos in sorted(rutas.items()):
+        total = sum(datos['peticiones'].values())
+        if not total:
+            continue
+        acumulado = 0
+        for limite, n in zip(CUBETAS + ('+Inf',), datos['cubetas']):
+            acumulado += n
+            lineas.append(f'hotel_http_duracion_segundos_bucket{{ruta="{_etiqueta(ruta)}",le="{limite}"}} {acumulado}')
+        lineas.append(f'hotel_http_duracion_segundos_sum{{ruta="{_etiqueta(ruta)}"}} {datos["duracion"]:.6f}')
+        lineas.append(f'hotel_http_duracion_segundos_count{{ruta="{_etiqueta(ruta)}"}} {total}')
+
+    for nombre, clave, tipo, ayuda in (
+        ('hotel_http_errores_total', 'errores', 'counter', 'Respuestas 5xx y excepciones por ruta'),
+        ('hotel_sql_sentencias_total', 'sentencias', 'counter', 'Sentencias SQL ejecutadas por ruta'),
+        ('hotel_sql_segundos_total', 'tiempo_sql', 'counter', 'Tiempo en SQLite (execute y fetch) por ruta'),
+        ('hotel_sql_filas_total', 'filas', 'counter', 'Filas leídas por ruta'),
+        ('hotel_sql_lentas_total', 'lentas', 'counter', f'Sentencias de más de {SQL_LENTA * 1000:g} ms por ruta'),
+    ):
+        metrica(nombre, tipo, ayuda)
+        for ruta, datos in sorted(rutas.items()):
+            valor = datos[clave]
+            lineas.append(f'{nombre}{{ruta="{_etiqueta(ruta)}"}} {valor:.6f}' if isinstance(valor, float)
+                          else f'{nombre}{{ruta="{_etiqueta(ruta)}"}} {valor}')
+
+    for nombre, (tipo, ayuda, valor) in (extra or {}).items():
+        metrica(nombre, tipo, ayuda)
+        lineas.append(f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
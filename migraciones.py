@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Migraciones versionadas del esquema de la base de datos.
+
+La versión aplicada se guarda en PRAGMA user_version. Cada migración es una
+función numerada que recibe un cursor; las pendientes se aplican una sola vez,
+en orden, dentro de una única transacción BEGIN IMMEDIATE.
+"""
+
+
+def _columnas(cursor, tabla):
+    """Nombres de las columnas de una tabla"""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    return {fila[1] for fila in cursor.fetchall()}
+
+
+def _agregar_columna(cursor, tabla, columna, definicion):
+    """ALTER TABLE ... ADD COLUMN solo si la columna no existe"""
+    if columna not in _columnas(cursor, tabla):
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+def _m001_esquema_inicial(cursor):
+    """Tablas base, columnas añadidas en versiones anteriores y habitaciones de ejemplo"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS clientes(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        identificacion TEXT NOT NULL,
+        direccion TEXT NOT NULL,
+        correo TEXT NOT NULL,
+        telefono TEXT NOT NULL
+    )
+    """)
+    # Bases creadas antes de que existieran estas columnas
+    _agregar_columna(cursor, "clientes", "direccion", "TEXT NOT NULL DEFAULT ''")
+    _agregar_columna(cursor, "clientes", "correo", "TEXT NOT NULL DEFAULT ''")
+    _agregar_columna(cursor, "clientes", "telefono", "TEXT NOT NULL DEFAULT ''")
+
+    # Tabla pagos
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pagos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reserva_id INTEGER NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        monto REAL NOT NULL,
+        fecha TEXT NOT NULL,
+        metodo TEXT NOT NULL,
+        estado TEXT DEFAULT 'Pendiente',
+        referencia TEXT,
+        notas TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(reserva_id) REFERENCES reservas(id),
+        FOREIGN KEY(cliente_id) REFERENCES clientes(id)
+    )
+    """)
+    _agregar_columna(cursor, "pagos", "reserva_id", "INTEGER")
+    _agregar_columna(cursor, "pagos", "estado", "TEXT DEFAULT 'Pendiente'")
+    _agregar_columna(cursor, "pagos", "referencia", "TEXT")
+    _agregar_columna(cursor, "pagos", "notas", "TEXT")
+    # ADD COLUMN no admite DEFAULT CURRENT_TIMESTAMP
+    _agregar_columna(cursor, "pagos", "timestamp", "DATETIME")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS usuarios(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    )
+    """)
+
+    # Tabla reservas
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS reservas(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cliente_id INTEGER NOT NULL,
+        habitacion TEXT NOT NULL,
+        fecha_entrada TEXT NOT NULL,
+        fecha_salida TEXT NOT NULL,
+        num_personas INTEGER NOT NULL,
+        precio_total REAL NOT NULL,
+        estado TEXT DEFAULT 'Confirmada',
+        notas TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(cliente_id) REFERENCES clientes(id)
+    )
+    """)
+
+    # Tabla habitaciones
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS habitaciones(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT NOT NULL UNIQUE,
+        tipo TEXT NOT NULL,
+        capacidad INTEGER NOT NULL,
+        precio_noche REAL NOT NULL,
+        estado TEXT DEFAULT 'Disponible',
+        amenidades TEXT,
+        descripcion TEXT,
+        imagen TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    _agregar_columna(cursor, "habitaciones", "imagen", "TEXT")
+
+    # Habitaciones de ejemplo
+    cursor.execute("SELECT COUNT(*) FROM habitaciones")
+    if cursor.fetchone()[0] == 0:
+        habitaciones_ejemplo = [
+            ('101', 'Individual', 1, 120000.00, 'Disponible', 'WiFi, TV, A/C', 'Habitación individual con vista al jardín'),
+            ('102', 'Individual', 1, 120000.00, 'Disponible', 'WiFi, TV, A/C', 'Habitación individual con vista al jardín'),
+            ('201', 'Doble', 2, 250000.00, 'Disponible', 'WiFi, TV, A/C, Balcón', 'Habitación doble con balcón'),
+            ('202', 'Doble', 2, 250000.00, 'Disponible', 'WiFi, TV, A/C, Balcón', 'Habitación doble con balcón'),
+            ('301', 'Suite', 4, 380000.00, 'Disponible', 'WiFi, TV, A/C, Jacuzzi, Balcón', 'Suite de lujo con jacuzzi'),
+            ('302', 'Suite', 4, 380000.00, 'Disponible', 'WiFi, TV, A/C, Jacuzzi, Balcón', 'Suite de lujo con jacuzzi')
+        ]
+        cursor.executemany("""
+            INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, habitaciones_ejemplo)
+
+
+def _m002_indices(cursor):
+    """Índices para las columnas de JOIN, filtro y orden usadas por las rutas"""
+    indices = [
+        # pagos: JOIN con reservas/clientes, filtros por estado/método ordenados por fecha
+        "CREATE INDEX IF NOT EXISTS idx_pagos_reserva ON pagos(reserva_id)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_cliente ON pagos(cliente_id)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_fecha ON pagos(fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_estado_fecha ON pagos(estado, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_metodo_fecha ON pagos(metodo, fecha)",
+        # Parcial y cubriente para los reportes de ingresos
+        """CREATE INDEX IF NOT EXISTS idx_pagos_completados ON pagos(fecha, metodo, monto)
+           WHERE estado = 'Completado'""",
+        # reservas: JOIN con clientes, filtros por estado/fecha y consultas por habitación
+        "CREATE INDEX IF NOT EXISTS idx_reservas_cliente ON reservas(cliente_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reservas_fecha_entrada ON reservas(fecha_entrada)",
+        "CREATE INDEX IF NOT EXISTS idx_reservas_estado_fecha ON reservas(estado, fecha_entrada)",
+        """CREATE INDEX IF NOT EXISTS idx_reservas_habitacion_fechas
+           ON reservas(habitacion, fecha_entrada, fecha_salida)""",
+        # habitaciones: filtros por estado/tipo ordenados por número
+        "CREATE INDEX IF NOT EXISTS idx_habitaciones_estado_numero ON habitaciones(estado, numero)",
+        "CREATE INDEX IF NOT EXISTS idx_habitaciones_tipo_numero ON habitaciones(tipo, numero)",
+        # clientes: listado ordenado por nombre
+        "CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)",
+    ]
+    for sql in indices:
+        cursor.execute(sql)
+
+
+def _m003_busqueda_clientes(cursor):
+    """Índice de texto completo FTS5 sobre clientes, sincronizado por triggers"""
+    # remove_diacritics 2: "Pérez" y "perez" producen el mismo token
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+        nombre, identificacion, correo, telefono, direccion,
+        content='clientes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """)
+    # El nombre pesa más que la identificación y ésta más que el resto
+    cursor.execute("""
+        INSERT INTO clientes_fts(clientes_fts, rank)
+        VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 2.0, 1.0)')
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO clientes_fts(rowid, nombre, identificacion, correo, telefono, direccion)
+        VALUES (new.id, new.nombre, new.identificacion, new.correo, new.telefono, new.direccion);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre, identificacion, correo, telefono, direccion)
+        VALUES ('delete', old.id, old.nombre, old.identificacion, old.correo, old.telefono, old.direccion);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE ON clientes BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre, identificacion, correo, telefono, direccion)
+        VALUES ('delete', old.id, old.nombre, old.identificacion, old.correo, old.telefono, old.direccion);
+        INSERT INTO clientes_fts(rowid, nombre, identificacion, correo, telefono, direccion)
+        VALUES (new.id, new.nombre, new.identificacion, new.correo, new.telefono, new.direccion);
+    END
+    """)
+    # Indexar los clientes existentes
+    cursor.execute("INSERT INTO clientes_fts(clientes_fts) VALUES ('rebuild')")
+
+
+def _m004_versiones_y_cambios(cursor):
+    """Contador de versión por tabla y registro de reservas modificadas.
+
+    Permiten a cada worker saber, con una lectura por clave primaria, si otra
+    conexión cambió los datos que tiene en memoria, y qué reservas releer.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS versiones_tabla(
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+    for tabla in ("clientes", "reservas", "habitaciones", "pagos"):
+        cursor.execute("INSERT OR IGNORE INTO versiones_tabla (tabla, version) VALUES (?, 0)", (tabla,))
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS version_{tabla}_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+                UPDATE versiones_tabla SET version = version + 1 WHERE tabla = '{tabla}';
+            END
+            """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cambios_reservas(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        reserva_id INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS cambios_reservas_ai AFTER INSERT ON reservas BEGIN
+        INSERT INTO cambios_reservas (reserva_id) VALUES (new.id);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS cambios_reservas_au
+    AFTER UPDATE OF habitacion, fecha_entrada, fecha_salida, estado ON reservas BEGIN
+        INSERT INTO cambios_reservas (reserva_id) VALUES (new.id);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS cambios_reservas_ad AFTER DELETE ON reservas BEGIN
+        INSERT INTO cambios_reservas (reserva_id) VALUES (old.id);
+    END
+    """)
+
+
+
+def _m005_calendario_ocupacion(cursor):
+    """Calendario de ocupación: una fila por noche y habitación ocupada.
+
+    Lo mantienen los triggers de reservas, así que los reportes de ocupación
+    leen un rango de fechas en lugar de agregar todas las reservas. Los
+    triggers no admiten CTE recursivas, por eso las noches de cada estancia
+    salen de la tabla fechas (2000-2099).
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fechas(
+        fecha TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    INSERT OR IGNORE INTO fechas (fecha)
+    WITH RECURSIVE dias(fecha) AS (
+        SELECT '2000-01-01'
+        UNION ALL
+        SELECT date(fecha, '+1 day') FROM dias WHERE fecha < '2099-12-31'
+    )
+    SELECT fecha FROM dias
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ocupacion(
+        fecha TEXT NOT NULL,
+        habitacion TEXT NOT NULL,
+        reserva_id INTEGER NOT NULL,
+        PRIMARY KEY (fecha, habitacion, reserva_id)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ocupacion_reserva ON ocupacion(reserva_id)")
+
+    # Estados en los que la habitación cuenta como ocupada esa noche
+    ocupan = "('Confirmada', 'Ocupada', 'Completada')"
+    noches = """
+        INSERT OR IGNORE INTO ocupacion (fecha, habitacion, reserva_id)
+        SELECT f.fecha, new.habitacion, new.id FROM fechas f
+        WHERE f.fecha >= date(new.fecha_entrada) AND f.fecha < date(new.fecha_salida)
+    """
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ocupacion_ai AFTER INSERT ON reservas
+    WHEN new.estado IN {ocupan} BEGIN
+        {noches};
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ocupacion_au
+    AFTER UPDATE OF habitacion, fecha_entrada, fecha_salida, estado ON reservas BEGIN
+        DELETE FROM ocupacion WHERE reserva_id = old.id;
+        {noches} AND new.estado IN {ocupan};
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS ocupacion_ad AFTER DELETE ON reservas BEGIN
+        DELETE FROM ocupacion WHERE reserva_id = old.id;
+    END
+    """)
+
+    # Reservas existentes
+    cursor.execute(f"""
+    INSERT OR IGNORE INTO ocupacion (fecha, habitacion, reserva_id)
+    SELECT f.fecha, r.habitacion, r.id
+    FROM reservas r
+    JOIN fechas f ON f.fecha >= date(r.fecha_entrada) AND f.fecha < date(r.fecha_salida)
+    WHERE r.estado IN {ocupan}
+    """)
+
+
+def _m006_ingresos_mensuales(cursor):
+    """Resumen de pagos por (mes, método, estado) mantenido por triggers.
+
+    El reporte financiero lee unas decenas de filas en lugar de agrupar toda
+    la tabla pagos. ingresos.py reconstruye y verifica el resumen.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingresos_mensuales(
+        mes TEXT NOT NULL,
+        metodo TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (mes, metodo, estado)
+    ) WITHOUT ROWID
+    """)
+
+    def sumar(fila):
+        return f"""
+        INSERT INTO ingresos_mensuales (mes, metodo, estado, cantidad, total)
+        VALUES (COALESCE(strftime('%Y-%m', {fila}.fecha), ''), COALESCE({fila}.metodo, ''),
+                COALESCE({fila}.estado, ''), 1, COALESCE({fila}.monto, 0))
+        ON CONFLICT (mes, metodo, estado) DO UPDATE
+        SET cantidad = cantidad + 1, total = total + excluded.total;
+        """
+
+    def restar(fila):
+        return f"""
+        UPDATE ingresos_mensuales
+        SET cantidad = cantidad - 1, total = total - COALESCE({fila}.monto, 0)
+        WHERE mes = COALESCE(strftime('%Y-%m', {fila}.fecha), '') AND metodo = COALESCE({fila}.metodo, '')
+        AND estado = COALESCE({fila}.estado, '');
+        DELETE FROM ingresos_mensuales
+        WHERE mes = COALESCE(strftime('%Y-%m', {fila}.fecha), '') AND metodo = COALESCE({fila}.metodo, '')
+        AND estado = COALESCE({fila}.estado, '') AND cantidad <= 0;
+        """
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_ai AFTER INSERT ON pagos BEGIN
+        {sumar("new")}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_au
+    AFTER UPDATE OF monto, fecha, metodo, estado ON pagos BEGIN
+        {restar("old")}
+        {sumar("new")}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_ad AFTER DELETE ON pagos BEGIN
+        {restar("old")}
+    END
+    """)
+
+    # Pagos existentes
+    cursor.execute("""
+    INSERT OR REPLACE INTO ingresos_mensuales (mes, metodo, estado, cantidad, total)
+    SELECT COALESCE(strftime('%Y-%m', fecha), ''), COALESCE(metodo, ''), COALESCE(estado, ''),
+           COUNT(*), COALESCE(SUM(monto), 0)
+    FROM pagos
+    GROUP BY 1, 2, 3
+    """)
+
+
+def _m007_progreso_tareas(cursor):
+    """Último id procesado por cada paso de las tareas por lotes (reanudables)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS progreso_tareas(
+        tarea TEXT NOT NULL,
+        paso TEXT NOT NULL,
+        ultimo_id INTEGER NOT NULL DEFAULT 0,
+        revisados INTEGER NOT NULL DEFAULT 0,
+        cambios INTEGER NOT NULL DEFAULT 0,
+        terminado INTEGER NOT NULL DEFAULT 0,
+        actualizado DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (tarea, paso)
+    ) WITHOUT ROWID
+    """)
+
+
+def _m008_eventos(cursor):
+    """Registro de eventos de solo inserción: quién cambió qué, antes y después"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS eventos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TEXT NOT NULL,
+        usuario_id INTEGER,
+        usuario TEXT,
+        accion TEXT NOT NULL,
+        tabla TEXT NOT NULL,
+        registro_id INTEGER,
+        antes TEXT,
+        despues TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_eventos_registro ON eventos(tabla, registro_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_eventos_fecha ON eventos(fecha)")
+    for evento in ("UPDATE", "DELETE"):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS eventos_sin_{evento.lower()} BEFORE {evento} ON eventos BEGIN
+            SELECT RAISE(ABORT, 'eventos es de solo inserción');
+        END
+        """)
+
+
+def _m009_solicitudes_reserva(cursor):
+    """Claves de idempotencia de reserva_rapida y búsqueda de visitantes por correo/teléfono"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS solicitudes_reserva(
+        clave TEXT PRIMARY KEY,
+        reserva_id INTEGER,
+        cliente_id INTEGER,
+        precio_total REAL,
+        creada TEXT DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_correo ON clientes(correo COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_telefono ON clientes(telefono)")
+
+
+def _m010_imagenes(cursor):
+    """Imágenes de habitaciones por hash de contenido, con sus variantes redimensionadas"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS imagenes(
+        hash TEXT PRIMARY KEY,
+        extension TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        variantes TEXT,
+        ancho INTEGER,
+        alto INTEGER,
+        bytes INTEGER,
+        error TEXT,
+        creada TEXT DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+    """)
+    _agregar_columna(cursor, "habitaciones", "imagen_hash", "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_habitaciones_imagen_hash ON habitaciones(imagen_hash)")
+
+
+def _m011_ocupacion_estados_activos(cursor):
+    """El calendario de ocupación cuenta las mismas reservas que bloquean la habitación.
+
+    Los estados son los de ocupacion.ESTADOS_OCUPAN: los activos de
+    disponibilidad.py (Pendiente y la antigua Reservada incluidas) más
+    Completada, las estancias ya terminadas.
+    """
+    ocupan = "('Pendiente', 'Confirmada', 'Reservada', 'Ocupada', 'Completada')"
+    noches = """
+        INSERT OR IGNORE INTO ocupacion (fecha, habitacion, reserva_id)
+        SELECT f.fecha, new.habitacion, new.id FROM fechas f
+        WHERE f.fecha >= date(new.fecha_entrada) AND f.fecha < date(new.fecha_salida)
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS ocupacion_ai")
+    cursor.execute("DROP TRIGGER IF EXISTS ocupacion_au")
+    cursor.execute(f"""
+    CREATE TRIGGER ocupacion_ai AFTER INSERT ON reservas
+    WHEN new.estado IN {ocupan} BEGIN
+        {noches};
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER ocupacion_au
+    AFTER UPDATE OF habitacion, fecha_entrada, fecha_salida, estado ON reservas BEGIN
+        DELETE FROM ocupacion WHERE reserva_id = old.id;
+        {noches} AND new.estado IN {ocupan};
+    END
+    """)
+
+    # Noches de las reservas Pendiente y Reservada que ya existían
+    cursor.execute(f"""
+    INSERT OR IGNORE INTO ocupacion (fecha, habitacion, reserva_id)
+    SELECT f.fecha, r.habitacion, r.id
+    FROM reservas r
+    JOIN fechas f ON f.fecha >= date(r.fecha_entrada) AND f.fecha < date(r.fecha_salida)
+    WHERE r.estado IN ('Pendiente', 'Reservada')
+    """)
+
+
+# Teléfono sin separadores, como reserva_publica.normalizar_telefono() (la
+# consulta debe usar esta misma expresión para aprovechar el índice)
+TELEFONO_NORMALIZADO = ("replace(replace(replace(replace(replace(replace("
+                        "telefono, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '/', '')")
+
+
+def _m012_telefono_normalizado(cursor):
+    """Búsqueda de visitantes por teléfono sin tener en cuenta espacios ni guiones"""
+    cursor.execute("DROP INDEX IF EXISTS idx_clientes_telefono")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_clientes_telefono_normalizado ON clientes({TELEFONO_NORMALIZADO})")
+
+
+# (número, descripción, función). Solo se agregan al final, nunca se renumeran.
+MIGRACIONES = [
+    (1, "Esquema inicial", _m001_esquema_inicial),
+    (2, "Índices secundarios", _m002_indices),
+    (3, "Búsqueda de texto completo en clientes", _m003_busqueda_clientes),
+    (4, "Versiones de tablas y registro de cambios de reservas", _m004_versiones_y_cambios),
+    (5, "Calendario de ocupación por noche y habitación", _m005_calendario_ocupacion),
+    (6, "Resumen mensual de ingresos por método y estado", _m006_ingresos_mensuales),
+    (7, "Progreso de tareas por lotes", _m007_progreso_tareas),
+    (8, "Registro de eventos", _m008_eventos),
+    (9, "Solicitudes de reserva idempotentes", _m009_solicitudes_reserva),
+    (10, "Imágenes por hash de contenido", _m010_imagenes),
+    (11, "Ocupación con los estados activos de disponibilidad", _m011_ocupacion_estados_activos),
+    (12, "Índice de teléfonos de clientes sin separadores", _m012_telefono_normalizado),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Versión del esquema aplicada en la base de datos"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    """Aplica las migraciones pendientes y devuelve las que se aplicaron.
+
+    Si el esquema está al día solo se lee PRAGMA user_version. En otro caso
+    se toma el bloqueo de escritura (BEGIN IMMEDIATE), se vuelve a leer la
+    versión por si otro worker ya migró y se aplica el resto en una única
+    transacción.
+    """
+    if version_esquema(conn) >= VERSION_ACTUAL:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    aplicadas = []
+    try:
+        version = version_esquema(conn)
+        cursor = conn.cursor()
+        for numero, descripcion, funcion in MIGRACIONES:
+            if numero <= version:
+                continue
+            funcion(cursor)
+            cursor.execute(f"PRAGMA user_version = {numero}")
+            aplicadas.append((numero, descripcion))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return aplicadas
+
+
+if __name__ == "__main__":
+    import database
+
+    with database.conexion() as conn:
+        print(f"Versión del esquema: {version_esquema(conn)} (última: {VERSION_ACTUAL})")
+        for numero, descripcion in migrar(conn):
+            print(f"   ✅ Migración {numero:03d}: {descripcion}")
+        print(f"Versión del esquema: {version_esquema(conn)}")
@@ -0,0 +1,103 @@
+"""
+Consultas sobre el calendario de ocupación (tabla ocupacion).
+
+Cada fila es una noche ocupada de una habitación por una reserva; los
+triggers de reservas la mantienen al crear, cambiar o eliminar reservas. Una
+tasa de ocupación sobre cualquier ventana es una lectura por rango de fechas
+de la clave primaria.
+"""
+
+from datetime import date, timedelta
+
+from disponibilidad import ESTADOS_ACTIVOS
+
+# Estados en los que una reserva ocupa la habitación esa noche: los que la
+# bloquean en disponibilidad.py más las estancias ya terminadas. Los triggers
+# de la migración 011 usan la misma lista (test_reservas.py lo comprueba).
+ESTADOS_OCUPAN = ESTADOS_ACTIVOS + ('Completada',)
+
+
+def ventana(dias, hasta=None):
+    """(desde, hasta) en YYYY-MM-DD para los últimos `dias` días incluyendo hoy"""
+    hasta = hasta or date.today()
+    return (hasta - timedelta(days=dias - 1)).isoformat(), hasta.isoformat()
+
+
+def _dias(desde, hasta):
+    return (date.fromisoformat(hasta) - date.fromisoformat(desde)).days + 1
+
+
+def ocupacion_diaria(conn, desde, hasta):
+    """Habitaciones ocupadas cada noche del rango, incluidas las noches sin ocupación"""
+    return conn.execute("""
+        SELECT f.fecha,
+               COUNT(DISTINCT o.habitacion) AS habitaciones_ocupadas,
+               (SELECT COUNT(*) FROM habitaciones) AS total_habitaciones
+        FROM fechas f
+        LEFT JOIN ocupacion o ON o.fecha = f.fecha
+        WHERE f.fecha BETWEEN ? AND ?
+        GROUP BY f.fecha
+        ORDER BY f.fecha DESC
+    """, (desde, hasta)).fetchall()
+
+
+def ocupacion_por_tipo(conn, desde, hasta):
+    """Noches ocupadas, porcentaje y reservas de cada tipo de habitación en el rango"""
+    return conn.execute("""
+        WITH noches AS (
+            SELECT habitacion, COUNT(DISTINCT fecha) AS noches
+            FROM ocupacion WHERE fecha BETWEEN :desde AND :hasta
+            GROUP BY habitacion
+        ),
+        reservas_tipo AS (
+            SELECT h.tipo, COUNT(*) AS reservas, AVG(r.precio_total) AS precio_promedio
+            FROM (SELECT DISTINCT reserva_id FROM ocupacion WHERE fecha BETWEEN :desde AND :hasta) e
+            JOIN reservas r ON r.id = e.reserva_id
+            JOIN habitaciones h ON h.numero = r.habitacion
+            GROUP BY h.tipo
+        )
+        SELECT h.tipo,
+               COUNT(*) AS habitaciones,
+               COALESCE(SUM(n.noches), 0) AS noches_ocupadas,
+               ROUND(100.0 * COALESCE(SUM(n.noches), 0) / (COUNT(*) * :dias), 1) AS porcentaje,
+               COALESCE(t.reservas, 0) AS reservas,
+               t.precio_promedio
+        FROM habitaciones h
+        LEFT JOIN noches n ON n.habitacion = h.numero
+        LEFT JOIN reservas_tipo t ON t.tipo = h.tipo
+        GROUP BY h.tipo
+        ORDER BY h.tipo
+    """, {'desde': desde, 'hasta': hasta, 'dias': _dias(desde, hasta)}).fetchall()
+
+
+def tasa_ocupacion(conn, desde, hasta, tipo=None):
+    """Porcentaje de noches-habitación ocupadas en el rango (opcionalmente de un tipo)"""
+    filtro = " AND tipo = ?" if tipo else ""
+    params = [tipo] if tipo else []
+    fila = conn.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM (
+                SELECT DISTINCT o.fecha, o.habitacion FROM ocupacion o
+                WHERE o.fecha BETWEEN ? AND ?
+                AND o.habitacion IN (SELECT numero FROM habitaciones WHERE 1=1{filtro})
+            )),
+            (SELECT COUNT(*) FROM habitaciones WHERE 1=1{filtro})
+    """, [desde, hasta] + params + params).fetchone()
+    noches, habitaciones = fila[0], fila[1]
+    if not habitaciones:
+        return 0.0
+    return round(100.0 * noches / (habitaciones * _dias(desde, hasta)), 1)
+
+
+def reconstruir(conn):
+    """Vuelve a llenar el calendario desde reservas, dentro de la transacción actual"""
+    marcadores = ", ".join("?" for _ in ESTADOS_OCUPAN)
+    conn.execute("DELETE FROM ocupacion")
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO ocupacion (fecha, habitacion, reserva_id)
+        SELECT f.fecha, r.habitacion, r.id
+        FROM reservas r
+        JOIN fechas f ON f.fecha >= date(r.fecha_entrada) AND f.fecha < date(r.fecha_salida)
+        WHERE r.estado IN ({marcadores})
+    """, ESTADOS_OCUPAN)
+    return cursor.rowcount
@@ -0,0 +1,146 @@
+"""
+Paginación por clave (keyset) de los listados de consultas.py.
+
+En lugar de OFFSET, cada página continúa desde la clave de orden de la última
+fila de la anterior: WHERE (clave) > (última) ORDER BY clave LIMIT n, que el
+índice resuelve sin recorrer las filas ya mostradas. El cursor que viaja en
+la URL es la clave codificada en base64.
+"""
+
+import base64
+import json
+import threading
+import time
+
+POR_PAGINA = 50
+POR_PAGINA_MAX = 500
+
+# Los totales (COUNT(*)) se cachean por consulta y parámetros
+TTL_TOTAL = 60
+MAX_TOTALES = 256
+
+_totales = {}
+_totales_lock = threading.Lock()
+
+
+class Pagina:
+    """Filas de una página y cursores hacia la siguiente/anterior.
+
+    Se comporta como la lista de filas, así que las plantillas pueden
+    recorrerla igual que el resultado de fetchall().
+    """
+
+    def __init__(self, filas, siguiente, anterior, por_pagina, total=None):
+        self.filas = filas
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self.por_pagina = por_pagina
+        self.total = total
+        # Las rutas las completan conservando los filtros de la petición
+        self.url_siguiente = None
+        self.url_anterior = None
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    def __getitem__(self, indice):
+        return self.filas[indice]
+
+
+def codificar_cursor(direccion, valores):
+    datos = json.dumps([direccion, list(valores)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve (dirección, valores) o (None, None) si el cursor no es válido"""
+    if not token:
+        return None, None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        direccion, valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+        if direccion not in ('sig', 'ant') or not isinstance(valores, list):
+            return None, None
+        return direccion, valores
+    except (ValueError, TypeError):
+        return None, None
+
+
+def leer_por_pagina(valor, defecto=POR_PAGINA):
+    try:
+        return max(1, min(int(valor), POR_PAGINA_MAX))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def contar(cursor, listado):
+    """COUNT(*) del listado, cacheado TTL_TOTAL segundos"""
+    clave = (listado.desde, tuple(listado.params))
+    ahora = time.monotonic()
+    with _totales_lock:
+        guardado = _totales.get(clave)
+        if guardado and ahora - guardado[1] < TTL_TOTAL:
+            return guardado[0]
+
+    cursor.execute(f"SELECT COUNT(*) {listado.desde}", listado.params)
+    total = cursor.fetchone()[0]
+
+    with _totales_lock:
+        if len(_totales) >= MAX_TOTALES:
+            _totales.clear()
+        _totales[clave] = (total, ahora)
+    return total
+
+
+def sql_pagina(listado, valores=None, hacia_atras=False, por_pagina=POR_PAGINA):
+    """SELECT de una página: desde la clave `valores` (o el principio), por_pagina + 1 filas"""
+    claves = listado.claves
+    # Hacia atrás se recorre en el orden inverso y luego se da la vuelta
+    descendente = listado.descendente != hacia_atras
+    orden = "DESC" if descendente else "ASC"
+
+    columnas = listado.columnas + "".join(f", {clave} AS _clave{i}" for i, clave in enumerate(claves))
+    query = f"SELECT {columnas} {listado.desde}"
+    params = list(listado.params)
+    if valores is not None:
+        comparacion = "<" if descendente else ">"
+        marcadores = ", ".join("?" for _ in claves)
+        query += f" AND ({', '.join(claves)}) {comparacion} ({marcadores})"
+        params.extend(valores)
+    query += " ORDER BY " + ", ".join(f"{clave} {orden}" for clave in claves)
+    query += " LIMIT ?"
+    params.append(por_pagina + 1)
+    return query, params
+
+
+def paginar(cursor, listado, token=None, por_pagina=POR_PAGINA, con_total=False):
+    """Ejecuta una página del listado a partir del cursor recibido"""
+    direccion, valores = decodificar_cursor(token)
+    if valores is not None and len(valores) != len(listado.claves):
+        direccion, valores = None, None
+    hacia_atras = direccion == 'ant'
+
+    cursor.execute(*sql_pagina(listado, valores, hacia_atras, por_pagina))
+    filas = cursor.fetchall()
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+
+    def clave_de(fila):
+        return [fila[f"_clave{i}"] for i in range(len(listado.claves))]
+
+    siguiente = anterior = None
+    if filas:
+        hay_siguiente = hay_mas if not hacia_atras else True
+        hay_anterior = hay_mas if hacia_atras else valores is not None
+        if hay_siguiente:
+            siguiente = codificar_cursor('sig', clave_de(filas[-1]))
+        if hay_anterior:
+            anterior = codificar_cursor('ant', clave_de(filas[0]))
+
+    total = contar(cursor, listado) if con_total else None
+    return Pagina(filas, siguiente, anterior, por_pagina, total)
@@ -0,0 +1,207 @@
+"""
+Reserva pública (reserva_rapida): idempotente y segura con mucha concurrencia.
+
+- Idempotencia: cada solicitud tiene una clave (la del formulario o cabecera
+  Idempotency-Key, o un hash de correo, teléfono, habitación y fechas). Un
+  reenvío o doble clic con la misma clave devuelve la reserva ya creada. La
+  clave deja de valer si su reserva se borra o se cancela y, las derivadas de
+  los datos, pasadas TTL_CLAVE_DERIVADA: entonces se vuelve a reservar.
+- Visitantes: se reutiliza el cliente con el mismo correo o teléfono.
+- Precio: precio_noche de la habitación × noches, calculado en el servidor.
+- Disponibilidad: primero contra el índice en memoria de disponibilidad.py,
+  sin tomar el bloqueo de escritura; luego, dentro de BEGIN IMMEDIATE, con
+  el INSERT ... WHERE NOT EXISTS de reservar(), que es la comprobación que
+  cuenta. Dentro de un worker las solicitudes de una misma habitación se
+  atienden de una en una, así que los perdedores se descartan en memoria en
+  lugar de hacer cola por el bloqueo de SQLite. Se espera el turno sin
+  retener una conexión del pool, para no agotarlo con una ráfaga.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+
+import database
+import disponibilidad
+import eventos
+from migraciones import TELEFONO_NORMALIZADO
+from validaciones import sanitize_input, validate_email, validate_phone
+
+REINTENTOS = 5
+
+# Vigencia de las claves calculadas a partir de los datos de la solicitud
+TTL_CLAVE_DERIVADA = 24 * 3600
+
+# Una clave vale mientras su reserva exista y no esté cancelada (y, si es
+# derivada, durante TTL_CLAVE_DERIVADA); parámetros: clave, -TTL en segundos
+_CLAVE_VIGENTE = """
+    s.clave = ? AND r.estado != 'Cancelada'
+    AND (s.clave NOT LIKE 'h:%' OR s.creada > datetime('now', ? || ' seconds'))
+"""
+
+# repetida: la clave ya tenía una reserva (no se creó nada)
+# cambios: eventos a registrar (accion, tabla, antes, despues)
+Resultado = namedtuple('Resultado', 'reserva_id cliente_id precio_total noches repetida cambios')
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock_habitacion(habitacion):
+    with _locks_lock:
+        return _locks.setdefault(habitacion, threading.Lock())
+
+
+def normalizar_telefono(telefono):
+    return re.sub(r'[^\d+]', '', telefono or '')
+
+
+def clave_solicitud(clave, correo, telefono, habitacion, entrada, salida):
+    """Clave de idempotencia: la recibida o, si no hay, la de los datos de la solicitud"""
+    clave = sanitize_input(clave or '')[:100]
+    if clave:
+        return f"c:{clave}"
+    datos = f"{correo.lower()}|{normalizar_telefono(telefono)}|{habitacion}|{entrada}|{salida}"
+    return f"h:{hashlib.sha1(datos.encode()).hexdigest()}"
+
+
+def _repetida(conn, clave):
+    """Resultado de la reserva ya creada con `clave`, o None si la clave no está vigente"""
+    fila = conn.execute(f"""
+        SELECT s.reserva_id, s.cliente_id, s.precio_total, r.fecha_entrada, r.fecha_salida
+        FROM solicitudes_reserva s JOIN reservas r ON r.id = s.reserva_id
+        WHERE {_CLAVE_VIGENTE}
+    """, (clave, -TTL_CLAVE_DERIVADA)).fetchone()
+    if fila is None:
+        return None
+    entrada, salida = disponibilidad.validar_fechas(fila['fecha_entrada'], fila['fecha_salida'])
+    noches = (date.fromisoformat(salida) - date.fromisoformat(entrada)).days
+    return Resultado(fila['reserva_id'], fila['cliente_id'], fila['precio_total'], noches, True, [])
+
+
+def _cliente(conn, nombre, correo, telefono, cambios):
+    """Id del visitante con ese correo o teléfono (normalizado); si no existe, se crea"""
+    fila = conn.execute(f"""
+        SELECT id FROM clientes WHERE correo = ? COLLATE NOCASE
+        UNION ALL
+        SELECT id FROM clientes WHERE {TELEFONO_NORMALIZADO} = ?
+        LIMIT 1
+    """, (correo, telefono)).fetchone()
+    if fila:
+        return fila['id']
+    cursor = conn.execute("""
+        INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+        VALUES (?, 'VISITANTE', 'N/A', ?, ?)
+    """, (nombre, correo, telefono))
+    cambios.append(('crear', 'clientes', None, eventos.fila(conn, 'clientes', cursor.lastrowid)))
+    return cursor.lastrowid
+
+
+def _empezar(conn):
+    """BEGIN IMMEDIATE reintentando si otro proceso retiene el bloqueo más allá de busy_timeout"""
+    for intento in range(REINTENTOS):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or intento == REINTENTOS - 1:
+                raise
+            time.sleep(0.05 * 2 ** intento)
+
+
+def reservar_visitante(nombre, correo, telefono, habitacion, fecha_entrada, fecha_salida,
+                       num_personas, notas='', clave=None):
+    """Crea (o devuelve, si la clave ya se usó) la reserva pendiente de un visitante.
+
+    Lanza ValueError si los datos no son válidos y HabitacionNoDisponible si la
+    habitación ya está ocupada en esas fechas.
+    """
+    nombre, correo = sanitize_input(nombre), sanitize_input(correo).lower()
+    telefono = normalizar_telefono(sanitize_input(telefono))
+    habitacion, notas = sanitize_input(habitacion), sanitize_input(notas)
+    if len(nombre) < 2:
+        raise ValueError('El nombre debe tener al menos 2 caracteres.')
+    if not validate_email(correo):
+        raise ValueError('Email inválido.')
+    if not validate_phone(telefono):
+        raise ValueError('Teléfono inválido.')
+    try:
+        num_personas = int(num_personas)
+    except (TypeError, ValueError):
+        raise ValueError('El número de personas no es válido.')
+    if num_personas < 1:
+        raise ValueError('El número de personas no es válido.')
+    entrada, salida = disponibilidad.validar_fechas(fecha_entrada, fecha_salida)
+    noches = (date.fromisoformat(salida) - date.fromisoformat(entrada)).days
+    clave = clave_solicitud(clave, correo, telefono, habitacion, entrada, salida)
+
+    with database.conexion() as conn:
+        # Caminos rápidos, sin bloqueo de escritura: reenvío o habitación ya tomada
+        anterior = _repetida(conn, clave)
+        if anterior:
+            return anterior
+        habitacion_fila = conn.execute(
+            "SELECT capacidad, estado FROM habitaciones WHERE numero = ?", (habitacion,)).fetchone()
+        if habitacion_fila is None:
+            raise ValueError(f'La habitación {habitacion} no existe.')
+        if habitacion_fila['estado'] in disponibilidad.ESTADOS_NO_RESERVABLES:
+            raise disponibilidad.HabitacionNoDisponible(
+                f"La habitación {habitacion} no se puede reservar ahora ({habitacion_fila['estado']}).")
+        if habitacion_fila['capacidad'] and num_personas > habitacion_fila['capacidad']:
+            raise ValueError(f"La habitación {habitacion} admite como máximo {habitacion_fila['capacidad']} personas.")
+
+    # El turno de la habitación se espera sin conexión: si no, una ráfaga sobre
+    # la misma habitación retendría todo el pool y bloquearía otras páginas
+    with _lock_habitacion(habitacion), database.conexion() as conn:
+        anterior = _repetida(conn, clave)
+        if anterior:
+            return anterior
+        if not disponibilidad.esta_libre(conn, habitacion, entrada, salida):
+            raise disponibilidad.HabitacionNoDisponible(
+                f"La habitación {habitacion} ya está reservada entre {entrada} y {salida}.")
+
+        _empezar(conn)
+        try:
+            # Una clave caducada o de una reserva borrada/cancelada se sustituye
+            conn.execute(f"""
+                DELETE FROM solicitudes_reserva WHERE clave = ? AND NOT EXISTS (
+                    SELECT 1 FROM solicitudes_reserva s JOIN reservas r ON r.id = s.reserva_id
+                    WHERE {_CLAVE_VIGENTE})
+            """, (clave, clave, -TTL_CLAVE_DERIVADA))
+            cursor = conn.execute(
+                "INSERT INTO solicitudes_reserva (clave) VALUES (?) ON CONFLICT (clave) DO NOTHING", (clave,))
+            if cursor.rowcount == 0:
+                # Otro worker la completó entre la comprobación y el bloqueo; con
+                # el bloqueo tomado, la clave que queda es vigente
+                anterior = _repetida(conn, clave)
+                conn.rollback()
+                return anterior
+
+            cambios = []
+            cliente_id = _cliente(conn, nombre, correo, telefono, cambios)
+            precio_noche = conn.execute("SELECT precio_noche FROM habitaciones WHERE numero = ?",
+                                        (habitacion,)).fetchone()[0]
+            precio_total = round(precio_noche * noches, 2)
+            habitacion_antes = eventos.fila(conn, 'habitaciones', habitacion, 'numero')
+            reserva_id, pago_id = disponibilidad.reservar_con_pago(
+                conn, cliente_id, habitacion, entrada, salida, num_personas, precio_total, 'Pendiente', notas)
+            conn.execute("""
+                UPDATE solicitudes_reserva SET reserva_id = ?, cliente_id = ?, precio_total = ?
+                WHERE clave = ?
+            """, (reserva_id, cliente_id, precio_total, clave))
+
+            habitacion_despues = eventos.fila(conn, 'habitaciones', habitacion, 'numero')
+            cambios.append(('crear', 'reservas', None, eventos.fila(conn, 'reservas', reserva_id)))
+            cambios.append(('crear', 'pagos', None, eventos.fila(conn, 'pagos', pago_id)))
+            if habitacion_despues != habitacion_antes:
+                cambios.append(('actualizar', 'habitaciones', habitacion_antes, habitacion_despues))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return Resultado(reserva_id, cliente_id, precio_total, noches, False, cambios)
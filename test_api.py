@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la API JSON y del lote de reservas sobre una base temporal
+"""
+
+import sqlite3
+from contextlib import contextmanager
+
+from jinja2 import ChoiceLoader, DictLoader
+
+import database
+import estadisticas
+import eventos
+from test_reservas import base_temporal
+
+
+@contextmanager
+def cliente():
+    """Cliente de pruebas con sesión iniciada sobre una base temporal"""
+    with base_temporal() as conn:
+        # app migra la base al importarse: solo con la base temporal ya activa
+        from app import app
+        app.config['TESTING'] = True
+        try:
+            with app.test_client() as c:
+                with c.session_transaction() as sesion:
+                    sesion['user_id'] = 1
+                    sesion['username'] = 'pruebas'
+                yield c, conn
+        finally:
+            # Los eventos pendientes van a la base temporal, no a la de después
+            eventos.vaciar()
+
+
+@contextmanager
+def plantillas(app, **textos):
+    """Plantillas mínimas en memoria (el repositorio no incluye templates/)"""
+    cargador = app.jinja_env.loader
+    app.jinja_env.loader = ChoiceLoader([DictLoader({f"{nombre}.html": texto for nombre, texto in textos.items()}),
+                                         cargador])
+    try:
+        yield
+    finally:
+        app.jinja_env.loader = cargador
+
+
+RESERVA = {'cliente_id': 1, 'habitacion': '101', 'fecha_entrada': '2030-08-01',
+           'fecha_salida': '2030-08-03', 'num_personas': 1, 'precio_total': 240000}
+
+
+def test_api_alta_en_estado_inicial():
+    """Las altas solo admiten los estados iniciales de estados.INICIALES"""
+    with cliente() as (c, conn):
+        for estado in ('Completada', 'Cancelada', 'Ocupada', 'Inventado'):
+            respuesta = c.post('/api/v1/reservas', json=dict(RESERVA, estado=estado))
+            assert respuesta.status_code == 400, (estado, respuesta.json)
+        respuesta = c.post('/api/v1/habitaciones', json={'numero': '999', 'tipo': 'Doble', 'capacidad': 2,
+                                                         'precio_noche': 1000, 'estado': 'Ocupada'})
+        assert respuesta.status_code == 400
+        assert conn.execute("SELECT COUNT(*) FROM reservas").fetchone()[0] == 0
+
+        respuesta = c.post('/api/v1/reservas', json=dict(RESERVA, estado='Pendiente'))
+        assert respuesta.status_code == 201 and respuesta.json['estado'] == 'Pendiente'
+        # Ni el estado ni las fechas permiten una segunda reserva encima
+        respuesta = c.post('/api/v1/reservas', json=RESERVA)
+        assert respuesta.status_code == 409
+
+
+def test_api_alta_con_referencias_inexistentes():
+    """Sin cliente o habitación existentes no se guarda la reserva ni su pago"""
+    with cliente() as (c, conn):
+        for cambios in ({'cliente_id': 99999}, {'habitacion': 'NOEXISTE'}):
+            respuesta = c.post('/api/v1/reservas', json=dict(RESERVA, **cambios))
+            assert respuesta.status_code == 422, respuesta.json
+        assert conn.execute("SELECT COUNT(*) FROM reservas").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM pagos").fetchone()[0] == 0
+
+
+def test_api_cuerpo_que_no_es_objeto():
+    with cliente() as (c, _):
+        assert c.post('/api/v1/reservas', json=[RESERVA]).status_code == 400
+        assert c.post('/api/v1/reservas/1/estado', json=['Ocupada']).status_code == 404
+        assert c.post('/reservas/lote/estado', json=[1, 2]).status_code == 400
+        assert c.post('/reservas/lote/checkin', json='1').status_code == 400
+
+
+def test_lote_no_reactiva_con_solape():
+    with cliente() as (c, _):
+        cancelada = c.post('/api/v1/reservas', json=RESERVA).json['id']
+        assert c.post(f'/api/v1/reservas/{cancelada}/estado', json={'estado': 'Cancelada'}).status_code == 200
+        assert c.post('/api/v1/reservas', json=RESERVA).status_code == 201
+
+        respuesta = c.post(f'/api/v1/reservas/{cancelada}/estado', json={'estado': 'Pendiente'})
+        assert respuesta.status_code == 409
+        respuesta = c.post('/reservas/lote/estado', json={'ids': [cancelada], 'estado': 'Pendiente',
+                                                          'todo_o_nada': True})
+        assert respuesta.status_code == 409
+        respuesta = c.post('/reservas/lote/estado', json={'ids': [cancelada], 'estado': 'Pendiente'})
+        assert respuesta.status_code == 200 and respuesta.json['aplicadas'] == 0
+
+
+def test_reportes_etag_tras_escritura_de_otro_worker():
+    """Una escritura de otro worker no da un ETag nuevo a las cifras viejas de la caché"""
+    with cliente() as (c, _):
+        from app import app
+        with plantillas(app, reportes='clientes={{ total_clientes }}'):
+            primera = c.get('/reportes')
+            assert primera.status_code == 200 and primera.text == 'clientes=1'
+
+            # Otro worker escribe con su propia conexión: este no llama a invalidar()
+            otra = sqlite3.connect(database.DATABASE_NAME)
+            otra.execute("""
+                INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+                VALUES ('Luis Gómez', '1002', 'Calle 2', 'luis@ejemplo.com', '3109876543')
+            """)
+            otra.commit()
+            otra.close()
+
+            # Dentro del TTL se sirven las cifras viejas, con el ETag de esas cifras
+            durante_ttl = c.get('/reportes')
+            assert durante_ttl.text == 'clientes=1' and durante_ttl.get_etag() == primera.get_etag()
+
+            # Vencido el TTL, la copia del navegador ya no vale
+            with estadisticas._lock:
+                estadisticas._cache[database.DATABASE_NAME]['verificado'] -= estadisticas.TTL
+            nueva = c.get('/reportes', headers={'If-None-Match': durante_ttl.headers['ETag']})
+            assert nueva.status_code == 200 and nueva.text == 'clientes=2'
+            assert c.get('/reportes', headers={'If-None-Match': nueva.headers['ETag']}).status_code == 304
+
+
+def test_habitacion_solo_cambia_por_transiciones():
+    """Ni editar la habitación ni borrar una reserva saltan la máquina de estados"""
+    with cliente() as (c, conn):
+        from app import app
+
+        def habitacion(numero):
+            return conn.execute("SELECT id, estado FROM habitaciones WHERE numero = ?", (numero,)).fetchone()
+
+        formulario = {'numero': '101', 'tipo': 'Doble', 'capacidad': 2, 'precio_noche': 1000,
+                      'amenidades': '', 'descripcion': ''}
+        conn.execute("UPDATE habitaciones SET estado = 'Limpieza' WHERE numero = '101'")
+        conn.commit()
+        with plantillas(app, editar_habitacion='{{ habitacion.estado }}'):
+            respuesta = c.post(f"/editar_habitacion/{habitacion('101')['id']}", data=dict(formulario, estado='Ocupada'))
+        assert respuesta.status_code == 200 and habitacion('101')['estado'] == 'Limpieza'
+        c.post(f"/editar_habitacion/{habitacion('101')['id']}", data=dict(formulario, estado='Disponible'))
+        assert habitacion('101')['estado'] == 'Disponible'
+
+        # Borrar una reserva no libera una habitación ocupada por otro huésped
+        reserva = c.post('/api/v1/reservas', json=dict(RESERVA, habitacion='102')).json['id']
+        conn.execute("UPDATE habitaciones SET estado = 'Ocupada' WHERE numero = '102'")
+        conn.commit()
+        c.post(f'/eliminar_reserva/{reserva}')
+        assert habitacion('102')['estado'] == 'Ocupada'
+
+        reserva = c.post('/api/v1/reservas', json=dict(RESERVA, habitacion='201')).json['id']
+        assert habitacion('201')['estado'] == 'Reservada'
+        c.post(f'/eliminar_reserva/{reserva}')
+        assert habitacion('201')['estado'] == 'Disponible'
+
+
+if __name__ == "__main__":
+    test_api_alta_en_estado_inicial()
+    test_api_alta_con_referencias_inexistentes()
+    test_api_cuerpo_que_no_es_objeto()
+    test_lote_no_reactiva_con_solape()
+    test_reportes_etag_tras_escritura_de_otro_worker()
+    test_habitacion_solo_cambia_por_transiciones()
+    print("✅ API: altas, cuerpos, lotes, ETag de reportes y estados de habitación correctos")
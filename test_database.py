@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Pruebas del pool de conexiones, las migraciones y el registro de eventos
+sobre bases temporales
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import database
+import eventos
+import migraciones
+
+
+def test_pool_conexiones():
+    """Reutiliza conexiones, comparte la del hilo en llamadas anidadas y respeta el tamaño"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = database.PoolConexiones(os.path.join(directorio, "pool.db"), tamano=1, timeout=0.2)
+        try:
+            conn = pool.obtener()
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert pool.obtener() is conn  # anidada: la misma conexión
+            conn.close()
+            assert pool.estadisticas()['en_uso'] == 1
+            conn.execute("CREATE TABLE t (x)")
+            conn.execute("INSERT INTO t VALUES (1)")
+            conn.close()  # la más externa: vuelve al pool y se descarta lo no confirmado
+            assert pool.estadisticas()['en_uso'] == 0
+
+            errores = []
+
+            def sin_conexion_libre():
+                try:
+                    pool.obtener()
+                except sqlite3.OperationalError as e:
+                    errores.append(str(e))
+
+            otra = pool.obtener()
+            assert otra is conn and otra.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+            hilo = threading.Thread(target=sin_conexion_libre)
+            hilo.start()
+            hilo.join()
+            assert errores == ["No hay conexiones libres en el pool"]
+            otra.close()
+            estadisticas = pool.estadisticas()
+            assert estadisticas['creadas'] == 1 and estadisticas['timeouts'] == 1
+        finally:
+            pool.cerrar()
+
+
+def test_migraciones():
+    """Una base nueva queda en la última versión y volver a migrar no cambia nada"""
+    ruta_original = database.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as directorio:
+        database.DATABASE_NAME = os.path.join(directorio, "migraciones.db")
+        try:
+            database.init_db()
+            with database.conexion() as conn:
+                assert migraciones.version_esquema(conn) == migraciones.VERSION_ACTUAL
+                assert migraciones.migrar(conn) == []
+                habitaciones = conn.execute("SELECT COUNT(*) FROM habitaciones").fetchone()[0]
+                esquema = conn.execute("SELECT type, name FROM sqlite_master ORDER BY 1, 2").fetchall()
+
+                # Una base anterior a las migraciones (user_version 0) con las
+                # tablas ya creadas: todas deben poder aplicarse sobre ella
+                conn.execute("PRAGMA user_version = 0")
+                aplicadas = migraciones.migrar(conn)
+                assert [numero for numero, _ in aplicadas] == [m[0] for m in migraciones.MIGRACIONES]
+                assert conn.execute("SELECT COUNT(*) FROM habitaciones").fetchone()[0] == habitaciones
+                assert conn.execute("SELECT type, name FROM sqlite_master ORDER BY 1, 2").fetchall() == esquema
+        finally:
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+
+def test_eventos_no_se_pierden():
+    """Un lote que no entra en la base se aplaza a un archivo y se guarda después"""
+    ruta_original, reintentos = database.DATABASE_NAME, eventos.REINTENTOS
+    with tempfile.TemporaryDirectory() as directorio:
+        database.DATABASE_NAME = os.path.join(directorio, "eventos.db")
+        registro = eventos.RegistroEventos(espera=0)
+        try:
+            database.init_db()
+            eventos.REINTENTOS = 2
+            with database.conexion() as conn:
+                conn.execute("ALTER TABLE eventos RENAME TO eventos_fuera")
+                conn.commit()
+            registro.registrar('crear', 'clientes', 1, despues={'id': 1})
+            registro.vaciar()
+            assert os.path.exists(database.DATABASE_NAME + eventos.SUFIJO_PENDIENTES)
+            assert registro.estadisticas()['aplazados'] == 1
+
+            with database.conexion() as conn:
+                conn.execute("ALTER TABLE eventos_fuera RENAME TO eventos")
+                conn.commit()
+            registro.registrar('crear', 'clientes', 2, despues={'id': 2})
+            registro.vaciar()
+            with database.conexion() as conn:
+                guardados = [fila[0] for fila in conn.execute("SELECT registro_id FROM eventos ORDER BY fecha")]
+            assert guardados == [1, 2]
+            assert not os.path.exists(database.DATABASE_NAME + eventos.SUFIJO_PENDIENTES)
+            estadisticas = registro.estadisticas()
+            assert estadisticas['recuperados'] == 1 and estadisticas['perdidos'] == 0
+        finally:
+            registro.cerrar()
+            eventos.REINTENTOS = reintentos
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+
+def test_eventos_cerrar_con_cola_llena():
+    """cerrar() no se queda colgado si la cola está llena y el escritor no la vacía"""
+    registro = eventos.RegistroEventos(maximo=1)
+    atascado = threading.Event()
+    registro._hilo = threading.Thread(target=atascado.wait, daemon=True)
+    registro._hilo.start()
+    registro._pid = os.getpid()
+    registro.cola.put(('evento',))
+    try:
+        hilo = threading.Thread(target=registro.cerrar, kwargs={'timeout': 0.2}, daemon=True)
+        hilo.start()
+        hilo.join(2)
+        assert not hilo.is_alive()
+    finally:
+        atascado.set()
+
+
+if __name__ == "__main__":
+    test_pool_conexiones()
+    test_migraciones()
+    test_eventos_no_se_pierden()
+    test_eventos_cerrar_con_cola_llena()
+    print("✅ Pool, migraciones y eventos correctos")
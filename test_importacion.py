@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Importación de JSON Lines sobre una base temporal: las líneas mal formadas
+se rechazan sin deshacer el resto
+"""
+
+import json
+import os
+import tempfile
+
+import database
+import importacion
+
+
+def test_jsonl_con_linea_mal_formada():
+    ruta_original = database.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as directorio:
+        database.DATABASE_NAME = os.path.join(directorio, "importacion.db")
+        archivo = os.path.join(directorio, "clientes.jsonl")
+        with open(archivo, 'w', encoding='utf-8') as salida:
+            salida.write(json.dumps({'nombre': 'Ana Pérez', 'identificacion': '1001', 'direccion': 'Calle 1',
+                                     'correo': 'ana@ejemplo.com', 'telefono': '3001234567'}) + "\n")
+            salida.write('{"nombre": "Luis", "identificacion": \n')
+            salida.write("\n")
+            salida.write(json.dumps({'nombre': 'Marta Ruiz', 'identificacion': '1003', 'direccion': 'Calle 3',
+                                     'correo': 'marta@ejemplo.com', 'telefono': '3007654321'}) + "\n")
+        try:
+            database.init_db()
+            resultado, _ = importacion.importar(archivo, 'clientes')
+            assert resultado.resultados['clientes']['aceptadas'] == 2
+            assert resultado.resultados['clientes']['rechazadas'] == 1
+            with open(archivo + '.rechazados.jsonl', encoding='utf-8') as rechazos:
+                rechazo = json.loads(rechazos.readline())
+            assert rechazo['motivo'].startswith("línea 2: JSON inválido")
+            with database.conexion() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0] == 2
+        finally:
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+
+if __name__ == "__main__":
+    test_jsonl_con_linea_mal_formada()
+    print("✅ Importación de JSON Lines correcta")
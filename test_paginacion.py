@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+La paginación por clave recorre cada listado entero, sin repetir ni saltar
+filas, hacia delante y hacia atrás
+"""
+
+import os
+import tempfile
+
+import consultas
+import database
+import generar_datos
+import paginacion
+
+LISTADOS = [
+    ("reservas", consultas.listado_reservas()),
+    ("reservas Confirmada", consultas.listado_reservas(estado="Confirmada")),
+    ("pagos", consultas.listado_pagos()),
+    ("pagos Pendiente", consultas.listado_pagos(estado="Pendiente")),
+    ("clientes", consultas.listado_clientes()),
+    ("habitaciones", consultas.listado_habitaciones()),
+]
+
+
+def claves(filas, listado):
+    return [tuple(fila[f"_clave{i}"] for i in range(len(listado.claves))) for fila in filas]
+
+
+def recorrer(cursor, listado, por_pagina):
+    """Claves de todas las páginas hacia delante y, desde la última, hacia atrás"""
+    adelante, paginas, token = [], [], None
+    while True:
+        pagina = paginacion.paginar(cursor, listado, token, por_pagina)
+        paginas.append(pagina)
+        adelante += claves(pagina.filas, listado)
+        if not pagina.siguiente:
+            break
+        token = pagina.siguiente
+
+    atras, pagina = [], paginas[-1]
+    while pagina.anterior:
+        pagina = paginacion.paginar(cursor, listado, pagina.anterior, por_pagina)
+        atras = claves(pagina.filas, listado) + atras
+    return adelante, claves(paginas[-1].filas, listado), atras, len(paginas)
+
+
+def test_paginacion_por_clave():
+    ruta_original = database.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "paginas.db")
+        try:
+            generar_datos.generar(ruta, habitaciones=24, clientes=40, anos=1)
+            database.DATABASE_NAME = ruta
+            with database.conexion() as conn:
+                cursor = conn.cursor()
+                for nombre, listado in LISTADOS:
+                    # Orden completo: el mismo SELECT sin paginar
+                    columnas = ", ".join(f"{clave} AS _clave{i}" for i, clave in enumerate(listado.claves))
+                    cursor.execute(consultas.sql_listado(listado._replace(columnas=columnas)), listado.params)
+                    esperado = claves(cursor.fetchall(), listado)
+                    assert len(esperado) > 20, nombre
+
+                    adelante, ultima, atras, paginas = recorrer(cursor, listado, 7)
+                    assert adelante == esperado, nombre
+                    assert paginas == -(-len(esperado) // 7), nombre
+                    assert atras + ultima == esperado, nombre
+
+                # Un cursor manipulado vuelve a la primera página
+                primera = paginacion.paginar(cursor, LISTADOS[0][1], "no-es-un-cursor", 7)
+                assert primera.anterior is None and len(primera) == 7
+        finally:
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+
+if __name__ == "__main__":
+    test_paginacion_por_clave()
+    print("✅ Paginación por clave correcta")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Verifica con EXPLAIN QUERY PLAN que las consultas de las rutas usan índices
+"""
+
+import os
+import re
+import tempfile
+
+import consultas
+import database
+import disponibilidad
+import estadisticas
+import estados
+import ingresos
+import ocupacion
+import paginacion
+import reserva_publica
+
+# Tablas de catálogo, acotadas por el número de habitaciones/usuarios del hotel:
+# recorrerlas completas es más barato que cualquier índice.
+TABLAS_PEQUENAS = {"habitaciones", "usuarios"}
+# Igual que el resumen de ingresos: una fila por (mes, método, estado)
+TABLAS_PEQUENAS.add("ingresos_mensuales")
+
+# Consultas escritas en las rutas de app.py, que no se pueden llamar sin una
+# petición: (ruta, consulta, parámetros) tal como están allí
+CONSULTAS = [
+    ("login", "SELECT * FROM usuarios WHERE username = ?", ("admin",)),
+    ("crear_reserva", "SELECT * FROM clientes WHERE id = ?", (1,)),
+    ("eliminar_reserva", "DELETE FROM pagos WHERE reserva_id = ?", (1,)),
+    ("eliminar_reserva", "DELETE FROM reservas WHERE id = ?", (1,)),
+    ("checkin_reserva", "SELECT habitacion FROM reservas WHERE id = ?", (1,)),
+    ("registrar_pago", """
+        SELECT r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono
+        FROM reservas r
+        JOIN clientes c ON r.cliente_id = c.id
+        WHERE r.id = ?
+    """, (1,)),
+    ("registrar_pago", "SELECT id, estado FROM pagos WHERE reserva_id = ?", (1,)),
+    ("reporte_financiero", """
+        SELECT p.monto, c.nombre as cliente, r.habitacion, p.fecha
+        FROM pagos p
+        JOIN clientes c ON p.cliente_id = c.id
+        JOIN reservas r ON p.reserva_id = r.id
+        WHERE p.estado = 'Pendiente'
+        ORDER BY p.fecha DESC
+    """, ()),
+    ("reserva_rapida", """
+        SELECT id, numero, tipo, capacidad, precio_noche, estado, amenidades, descripcion, imagen
+        FROM habitaciones WHERE estado = 'Disponible' ORDER BY numero LIMIT 3
+    """, ()),
+]
+
+
+def _reactivar(conn):
+    reserva_id = disponibilidad.reservar(conn, 1, "102", "2030-02-01", "2030-02-03", 1, 240000)
+    estados.cambiar_reserva(conn, reserva_id, 'Cancelada')
+    estados.cambiar_reserva(conn, reserva_id, 'Pendiente')
+
+
+def _checkin_checkout(conn):
+    reserva_id = disponibilidad.reservar(conn, 1, "201", "2030-03-01", "2030-03-03", 1, 500000)
+    estados.checkin(conn, reserva_id)
+    estados.checkout(conn, reserva_id)
+
+
+# El resto se comprueba con las sentencias que ejecutan los propios módulos:
+# (ruta, función que recibe la conexión), capturadas con set_trace_callback
+EJECUCIONES = [
+    ("crear_reserva", lambda conn: disponibilidad.reservar_con_pago(
+        conn, 1, "101", "2030-01-01", "2030-01-05", 1, 480000)),
+    ("disponibilidad", lambda conn: disponibilidad.habitaciones_libres(conn, "2030-01-02", "2030-01-04")),
+    ("cambiar_estado_reserva", _reactivar),
+    ("checkin_reserva", _checkin_checkout),
+    ("reserva_rapida", lambda conn: reserva_publica.reservar_visitante(
+        "Ana Pérez", "ana@ejemplo.com", "3001234567", "202", "2030-04-01", "2030-04-03", 1)),
+    ("reportes", lambda conn: estadisticas.calcular(conn, "2025-01-01", "2025-02-01")),
+    ("reporte_ocupacion", lambda conn: ocupacion.ocupacion_diaria(conn, "2025-01-01", "2025-01-30")),
+    ("reporte_ocupacion", lambda conn: ocupacion.ocupacion_por_tipo(conn, "2025-01-01", "2025-01-30")),
+    ("reporte_ocupacion", lambda conn: ocupacion.tasa_ocupacion(conn, "2025-01-01", "2025-01-30", "Suite")),
+    ("reporte_financiero", lambda conn: ingresos.mensuales(conn)),
+    ("reporte_financiero", lambda conn: ingresos.por_metodo(conn)),
+]
+
+# Recorridos completos que son la consulta misma, no un índice que falte
+RECORRIDOS_PERMITIDOS = {
+    # Top de clientes del panel: una pasada por clientes, cacheada en estadisticas.py
+    ("reportes", "clientes"),
+    # Total sin filtros de paginacion.contar (solo con total=1, cacheado TTL_TOTAL)
+    ("lista_pagos", "p"),
+}
+
+# Listados paginados: primera página y página siguiente (keyset) de cada uno
+LISTADOS = [
+    ("lista_clientes", consultas.listado_clientes(), ["Ana", 1]),
+    ("lista_clientes (búsqueda)", consultas.listado_clientes("perez"), [-1.5, 1]),
+    ("lista_reservas", consultas.listado_reservas(), ["2025-01-01", 1, 1]),
+    ("lista_reservas (estado y fechas)",
+     consultas.listado_reservas(estado="Confirmada", fecha_desde="2025-01-01", fecha_hasta="2025-12-31"),
+     ["2025-01-01", 1, 1]),
+    ("lista_habitaciones", consultas.listado_habitaciones("Disponible", "Suite"), ["101"]),
+    ("lista_pagos", consultas.listado_pagos(), ["2025-01-01", 1]),
+    ("lista_pagos (estado)", consultas.listado_pagos(estado="Pendiente"), ["2025-01-01", 1]),
+    ("lista_pagos (método)", consultas.listado_pagos(metodo="Efectivo"), ["2025-01-01", 1]),
+]
+for ruta, listado, clave in LISTADOS:
+    EJECUCIONES.append((ruta, lambda conn, listado=listado: paginacion.paginar(
+        conn.cursor(), listado, con_total=True)))
+    EJECUCIONES.append((ruta + " siguiente", lambda conn, listado=listado, clave=clave: paginacion.paginar(
+        conn.cursor(), listado, paginacion.codificar_cursor('sig', clave))))
+
+# "SCAN tabla" o "SCAN tabla AS alias" sin índice
+PATRON_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# Subconsultas materializadas: su SCAN recorre el resultado, no una tabla
+PATRON_SUBCONSULTA = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)$")
+
+
+def recorridos_completos(conn, sql, params):
+    """Tablas que la consulta recorre completas sin usar ningún índice"""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    subconsultas = {c.group(1) for c in (PATRON_SUBCONSULTA.match(fila["detail"]) for fila in plan) if c}
+    tablas = []
+    for fila in plan:
+        coincidencia = PATRON_SCAN.match(fila["detail"])
+        if coincidencia and coincidencia.group(1) not in TABLAS_PEQUENAS | subconsultas:
+            tablas.append(coincidencia.group(1))
+    return tablas
+
+
+def sentencias_ejecutadas(conn, funcion):
+    """Sentencias (con los parámetros ya sustituidos) que ejecuta `funcion(conn)`"""
+    ejecutadas = []
+    conn.set_trace_callback(ejecutadas.append)
+    try:
+        funcion(conn)
+        conn.commit()
+    finally:
+        conn.set_trace_callback(None)
+    # Las sentencias de los triggers repiten la que los disparó
+    return [sql for sql in dict.fromkeys(ejecutadas)
+            if sql.split(None, 1)[0].upper() in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")]
+
+
+def test_planes_consulta():
+    """Ninguna consulta de las rutas debe recorrer una tabla completa"""
+    ruta_original = database.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as directorio:
+        database.DATABASE_NAME = os.path.join(directorio, "planes.db")
+        try:
+            database.init_db()
+            fallos = []
+            with database.conexion() as conn:
+                conn.execute("""
+                    INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+                    VALUES ('Ana Pérez', '1001', 'Calle 1', 'ana@ejemplo.com', '3001234567')
+                """)
+                conn.commit()
+                consultas_ruta = list(CONSULTAS)
+                for ruta, funcion in EJECUCIONES:
+                    consultas_ruta.extend((ruta, sql, ()) for sql in sentencias_ejecutadas(conn, funcion))
+                for ruta, sql, params in consultas_ruta:
+                    tablas = [tabla for tabla in recorridos_completos(conn, sql, params)
+                              if (ruta, tabla) not in RECORRIDOS_PERMITIDOS]
+                    if tablas:
+                        fallos.append(f"{ruta}: SCAN {', '.join(tablas)}\n{sql.strip()}")
+        finally:
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+    assert not fallos, "Consultas sin índice:\n" + "\n".join(fallos)
+
+
+if __name__ == "__main__":
+    test_planes_consulta()
+    print(f"✅ {len(CONSULTAS)} consultas de rutas y {len(EJECUCIONES)} ejecuciones usan índices")
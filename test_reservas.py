@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Pruebas de reservas sobre una base temporal: solapes, transiciones de estado,
+reserva pública idempotente
+"""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import database
+import disponibilidad
+import estados
+import fix_pagos_reservas
+import ocupacion
+import reserva_publica
+
+
+@contextmanager
+def base_temporal():
+    """Base recién migrada en un directorio temporal, con un cliente (id 1)"""
+    ruta_original = database.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as directorio:
+        database.DATABASE_NAME = os.path.join(directorio, "reservas.db")
+        try:
+            database.init_db()
+            with database.conexion() as conn:
+                conn.execute("""
+                    INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+                    VALUES ('Ana Pérez', '1001', 'Calle 1', 'ana@ejemplo.com', '3001234567')
+                """)
+                conn.commit()
+                yield conn
+        finally:
+            database.cerrar_pool()
+            database.DATABASE_NAME = ruta_original
+
+
+def reservar(conn, entrada, salida, habitacion='101'):
+    reserva_id = disponibilidad.reservar(conn, 1, habitacion, entrada, salida, 1, 120000)
+    conn.commit()
+    return reserva_id
+
+
+def estado(conn, reserva_id):
+    return conn.execute("SELECT estado FROM reservas WHERE id = ?", (reserva_id,)).fetchone()[0]
+
+
+def cambiar(conn, reserva_id, destino):
+    try:
+        estados.cambiar_reserva(conn, reserva_id, destino)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def test_reserva_solapada_rechazada():
+    """Una reserva activa bloquea sus noches; las contiguas y otras habitaciones no"""
+    with base_temporal() as conn:
+        reservar(conn, "2030-01-10", "2030-01-15")
+        for entrada, salida in (("2030-01-12", "2030-01-13"), ("2030-01-08", "2030-01-11"),
+                                ("2030-01-14", "2030-01-20"), ("2030-01-01", "2030-02-01")):
+            try:
+                reservar(conn, entrada, salida)
+            except disponibilidad.HabitacionNoDisponible:
+                conn.rollback()
+            else:
+                raise AssertionError(f"Solape aceptado: {entrada} - {salida}")
+
+        reservar(conn, "2030-01-05", "2030-01-10")
+        reservar(conn, "2030-01-15", "2030-01-18")
+        reservar(conn, "2030-01-12", "2030-01-13", habitacion='102')
+        assert not disponibilidad.esta_libre(conn, '101', "2030-01-09", "2030-01-16")
+        assert disponibilidad.esta_libre(conn, '101', "2030-01-18", "2030-01-20")
+
+
+def test_habitaciones_no_reservables():
+    """Las habitaciones en Mantenimiento o Limpieza no salen libres ni se reservan"""
+    with base_temporal() as conn:
+        def libres():
+            return {h['numero'] for h in disponibilidad.habitaciones_libres(conn, "2030-02-01", "2030-02-03")}
+        assert {'101', '201'} <= libres()
+
+        conn.execute("UPDATE habitaciones SET estado = 'Mantenimiento' WHERE numero = '201'")
+        conn.execute("UPDATE habitaciones SET estado = 'Limpieza' WHERE numero = '101'")
+        conn.commit()
+        assert not {'101', '201'} & libres()
+        try:
+            reserva_visitante("2030-02-01", "2030-02-03")
+        except disponibilidad.HabitacionNoDisponible as e:
+            assert "Mantenimiento" in str(e)
+        else:
+            raise AssertionError("Reserva pública aceptada en una habitación en mantenimiento")
+
+
+def test_reactivar_cancelada_sin_doble_reserva():
+    """Cancelada -> Pendiente falla si otra reserva ocupó las fechas entretanto"""
+    with base_temporal() as conn:
+        cancelada = reservar(conn, "2030-03-01", "2030-03-05")
+        cambiar(conn, cancelada, 'Cancelada')
+        nueva = reservar(conn, "2030-03-03", "2030-03-06")
+
+        try:
+            cambiar(conn, cancelada, 'Pendiente')
+        except disponibilidad.HabitacionNoDisponible:
+            pass
+        else:
+            raise AssertionError("La reserva cancelada volvió a estar activa con solape")
+        assert estado(conn, cancelada) == 'Cancelada'
+
+        # Liberadas las fechas, sí puede volver
+        cambiar(conn, nueva, 'Cancelada')
+        cambiar(conn, cancelada, 'Pendiente')
+        assert estado(conn, cancelada) == 'Pendiente'
+
+
+def test_transiciones_no_permitidas():
+    with base_temporal() as conn:
+        reserva = reservar(conn, "2030-04-01", "2030-04-03")
+        for destino in ('Completada', 'Desconocido', 'Reservada'):
+            try:
+                cambiar(conn, reserva, destino)
+            except estados.TransicionNoPermitida:
+                pass
+            else:
+                raise AssertionError(f"Confirmada -> {destino} aceptada")
+        assert estado(conn, reserva) == 'Confirmada'
+
+        cambiar(conn, reserva, 'Ocupada')
+        cambiar(conn, reserva, 'Completada')
+        habitacion = conn.execute("SELECT estado FROM habitaciones WHERE numero = '101'").fetchone()[0]
+        assert habitacion == 'Limpieza'
+        try:
+            cambiar(conn, reserva, 'Pendiente')
+        except estados.TransicionNoPermitida:
+            pass
+        else:
+            raise AssertionError("Completada -> Pendiente aceptada")
+
+        try:
+            cambiar(conn, 999, 'Cancelada')
+        except estados.TransicionNoPermitida as e:
+            assert "no encontrada" in str(e)
+        else:
+            raise AssertionError("Transición de una reserva inexistente aceptada")
+
+
+def test_cancelar_libera_habitacion():
+    """Cancelar devuelve la habitación Reservada a Disponible si no le queda otra estancia"""
+    with base_temporal() as conn:
+        def habitacion(numero='101'):
+            return conn.execute("SELECT estado FROM habitaciones WHERE numero = ?", (numero,)).fetchone()[0]
+
+        primera, _ = disponibilidad.reservar_con_pago(conn, 1, '101', "2099-02-01", "2099-02-03", 1, 240000)
+        segunda, _ = disponibilidad.reservar_con_pago(conn, 1, '101', "2099-03-01", "2099-03-03", 1, 240000)
+        conn.commit()
+        assert habitacion() == 'Reservada'
+
+        cambiar(conn, primera, 'Cancelada')
+        assert habitacion() == 'Reservada'
+        cambiar(conn, segunda, 'Cancelada')
+        assert habitacion() == 'Disponible'
+
+        # Una habitación ocupada por otro huésped no cambia
+        otra, _ = disponibilidad.reservar_con_pago(conn, 1, '102', "2099-04-01", "2099-04-03", 1, 240000)
+        conn.execute("UPDATE habitaciones SET estado = 'Ocupada' WHERE numero = '102'")
+        conn.commit()
+        cambiar(conn, otra, 'Cancelada')
+        assert habitacion('102') == 'Ocupada'
+
+
+def test_lote_con_solape():
+    """En un lote, la reserva que no puede reactivarse no impide las demás"""
+    with base_temporal() as conn:
+        primera = reservar(conn, "2030-05-01", "2030-05-04")
+        segunda = reservar(conn, "2030-05-01", "2030-05-04", habitacion='102')
+        for reserva_id in (primera, segunda):
+            cambiar(conn, reserva_id, 'Cancelada')
+        reservar(conn, "2030-05-02", "2030-05-03")
+
+        resultados = estados.cambiar_reservas(conn, [primera, segunda], 'Pendiente')
+        conn.commit()
+        assert [r['ok'] for r in resultados] == [False, True]
+        assert "ya está reservada" in resultados[0]['error']
+        assert estado(conn, primera) == 'Cancelada'
+        assert estado(conn, segunda) == 'Pendiente'
+
+
+def test_reconciliador_respeta_habitaciones_ocupadas():
+    """El paso habitaciones solo marca Reservada las Disponible con reservas por llegar"""
+    with base_temporal() as conn:
+        reservar(conn, "2099-01-01", "2099-01-05", habitacion='101')
+        reservar(conn, "2099-01-01", "2099-01-05", habitacion='102')
+        reservar(conn, "2000-01-01", "2000-01-05", habitacion='201')
+        conn.execute("UPDATE habitaciones SET estado = 'Ocupada' WHERE numero = '101'")
+        conn.commit()
+
+        fix_pagos_reservas.reconciliar(informar=False)
+        estados_habitacion = dict(conn.execute(
+            "SELECT numero, estado FROM habitaciones WHERE numero IN ('101', '102', '201')").fetchall())
+        assert estados_habitacion == {'101': 'Ocupada', '102': 'Reservada', '201': 'Disponible'}
+
+
+def test_calendario_ocupacion_con_estados_activos():
+    """Los triggers del calendario cuentan exactamente los estados de ocupacion.ESTADOS_OCUPAN"""
+    with base_temporal() as conn:
+        ids = {}
+        for estado_reserva in estados.RESERVA:
+            ids[estado_reserva] = conn.execute("""
+                INSERT INTO reservas (cliente_id, habitacion, fecha_entrada, fecha_salida,
+                                      num_personas, precio_total, estado)
+                VALUES (1, '101', '2030-09-01', '2030-09-03', 1, 240000, ?)
+            """, (estado_reserva,)).lastrowid
+        conn.commit()
+
+        def en_calendario():
+            return {fila[0] for fila in conn.execute(
+                "SELECT r.estado FROM ocupacion o JOIN reservas r ON r.id = o.reserva_id")}
+        assert en_calendario() == set(ocupacion.ESTADOS_OCUPAN)
+        assert set(disponibilidad.ESTADOS_ACTIVOS) <= en_calendario()
+
+        conn.execute("UPDATE reservas SET estado = 'Cancelada' WHERE id = ?", (ids['Pendiente'],))
+        conn.commit()
+        assert 'Pendiente' not in en_calendario()
+        # reconstruir() coincide con lo que mantienen los triggers
+        antes = conn.execute("SELECT COUNT(*) FROM ocupacion").fetchone()[0]
+        ocupacion.reconstruir(conn)
+        conn.commit()
+        assert conn.execute("SELECT COUNT(*) FROM ocupacion").fetchone()[0] == antes
+
+
+def reserva_visitante(entrada="2030-06-01", salida="2030-06-03", clave=None):
+    return reserva_publica.reservar_visitante(
+        'Luis Gómez', 'luis@ejemplo.com', '310 555 1234', '201', entrada, salida, 2, clave=clave)
+
+
+def test_reserva_publica_idempotente():
+    """Los reintentos con la misma clave devuelven la misma reserva"""
+    with base_temporal() as conn:
+        primera = reserva_visitante()
+        assert not primera.repetida and primera.noches == 2
+        repetida = reserva_visitante()
+        assert repetida.repetida and repetida.reserva_id == primera.reserva_id
+
+        con_clave = reserva_visitante("2030-07-01", "2030-07-02", clave="formulario-1")
+        assert reserva_visitante("2030-07-01", "2030-07-02", clave="formulario-1").reserva_id == con_clave.reserva_id
+        total = conn.execute("SELECT COUNT(*) FROM reservas").fetchone()[0]
+        assert total == 2
+
+
+def test_reserva_publica_clave_sin_reserva_vigente():
+    """Si la reserva de la clave se borra o se cancela, el reintento reserva de nuevo"""
+    with base_temporal() as conn:
+        borrada = reserva_visitante()
+        conn.execute("DELETE FROM pagos WHERE reserva_id = ?", (borrada.reserva_id,))
+        conn.execute("DELETE FROM reservas WHERE id = ?", (borrada.reserva_id,))
+        conn.commit()
+        nueva = reserva_visitante()
+        assert not nueva.repetida and nueva.reserva_id != borrada.reserva_id
+
+        cambiar(conn, nueva.reserva_id, 'Cancelada')
+        otra = reserva_visitante()
+        assert not otra.repetida and otra.reserva_id != nueva.reserva_id
+
+        # Clave derivada caducada: ya no devuelve la reserva, que sigue ocupando las fechas
+        conn.execute("UPDATE solicitudes_reserva SET creada = datetime('now', '-2 days')")
+        conn.commit()
+        try:
+            reserva_visitante()
+        except disponibilidad.HabitacionNoDisponible:
+            pass
+        else:
+            raise AssertionError("La clave caducada devolvió la reserva anterior")
+
+
+def test_reserva_publica_cliente_por_telefono():
+    """El teléfono se compara sin separadores en los dos lados"""
+    with base_temporal() as conn:
+        conn.execute("""
+            INSERT INTO clientes (nombre, identificacion, direccion, correo, telefono)
+            VALUES ('Luis Gómez', '1002', 'Calle 2', 'otro@ejemplo.com', '310 555-1234')
+        """)
+        conn.commit()
+        assert reserva_visitante().cliente_id == 2
+        assert conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0] == 2
+
+
+def test_reserva_publica_espera_sin_conexion():
+    """Mientras espera el turno de la habitación, la solicitud no retiene una conexión del pool"""
+    with base_temporal():
+        resultados = []
+        with reserva_publica._lock_habitacion('201'):
+            hilo = threading.Thread(target=lambda: resultados.append(reserva_visitante()))
+            hilo.start()
+            time.sleep(0.2)
+            assert hilo.is_alive() and database.estadisticas_pool()['en_uso'] == 1  # solo la de la prueba
+        hilo.join()
+        assert len(resultados) == 1 and not resultados[0].repetida
+
+
+if __name__ == "__main__":
+    test_reserva_solapada_rechazada()
+    test_habitaciones_no_reservables()
+    test_reactivar_cancelada_sin_doble_reserva()
+    test_transiciones_no_permitidas()
+    test_cancelar_libera_habitacion()
+    test_lote_con_solape()
+    test_reconciliador_respeta_habitaciones_ocupadas()
+    test_calendario_ocupacion_con_estados_activos()
+    test_reserva_publica_idempotente()
+    test_reserva_publica_clave_sin_reserva_vigente()
+    test_reserva_publica_cliente_por_telefono()
+    test_reserva_publica_espera_sin_conexion()
+    print("✅ Reservas: solapes, transiciones e idempotencia correctos")
@@ -0,0 +1,148 @@
+"""
+Reglas de validación compartidas por los formularios y la importación masiva
+"""
+
+import re
+from datetime import date
+
+
+def validate_email(email):
+    """Valida formato de email"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+def validate_phone(phone):
+    """Valida formato de teléfono"""
+    clean_phone = re.sub(r'[^\d+]', '', phone)
+    return len(clean_phone) >= 7
+
+def sanitize_input(text):
+    """Sanitiza texto de entrada"""
+    if not text:
+        return ""
+    text = re.sub(r'[<>"\']', '', text)
+    return text.strip()
+
+
+# ========== VALIDACIÓN DE FILAS (importación y API) ==========
+# Cada función recibe un dict con los valores crudos (JSON o CSV) y devuelve
+# el dict limpio listo para insertar, o lanza ValueError con el motivo.
+
+def _texto(fila, campo, requerido=True):
+    valor = sanitize_input(str(fila.get(campo) or ''))
+    if requerido and not valor:
+        raise ValueError(f"{campo} vacío")
+    return valor
+
+
+def _entero(fila, campo, requerido=True, minimo=None):
+    valor = fila.get(campo)
+    if valor in (None, ''):
+        if requerido:
+            raise ValueError(f"{campo} vacío")
+        return None
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} no es un entero: {valor!r}")
+    if minimo is not None and numero < minimo:
+        raise ValueError(f"{campo} menor que {minimo}")
+    return numero
+
+
+def _numero(fila, campo, minimo=0):
+    try:
+        numero = float(fila.get(campo))
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} no es un número: {fila.get(campo)!r}")
+    if numero < minimo:
+        raise ValueError(f"{campo} menor que {minimo}")
+    return numero
+
+
+def _fecha(fila, campo):
+    valor = str(fila.get(campo) or '')
+    try:
+        date.fromisoformat(valor[:10])
+    except ValueError:
+        raise ValueError(f"{campo} no es una fecha YYYY-MM-DD: {valor!r}")
+    return valor
+
+
+def validar_cliente(fila):
+    nombre = _texto(fila, 'nombre')
+    if len(nombre) < 2:
+        raise ValueError("nombre con menos de 2 caracteres")
+    correo = _texto(fila, 'correo')
+    if not validate_email(correo):
+        raise ValueError(f"correo inválido: {correo!r}")
+    telefono = _texto(fila, 'telefono')
+    if not validate_phone(telefono):
+        raise ValueError(f"teléfono inválido: {telefono!r}")
+    return {
+        'id': _entero(fila, 'id', requerido=False, minimo=1),
+        'nombre': nombre,
+        'identificacion': _texto(fila, 'identificacion'),
+        'direccion': _texto(fila, 'direccion', requerido=False),
+        'correo': correo,
+        'telefono': telefono,
+    }
+
+
+def validar_reserva(fila):
+    entrada, salida = _fecha(fila, 'fecha_entrada'), _fecha(fila, 'fecha_salida')
+    if salida[:10] <= entrada[:10]:
+        raise ValueError("fecha_salida no es posterior a fecha_entrada")
+    return {
+        'id': _entero(fila, 'id', requerido=False, minimo=1),
+        'cliente_id': _entero(fila, 'cliente_id', minimo=1),
+        'habitacion': _texto(fila, 'habitacion'),
+        'fecha_entrada': entrada,
+        'fecha_salida': salida,
+        'num_personas': _entero(fila, 'num_personas', minimo=1),
+        'precio_total': _numero(fila, 'precio_total'),
+        'estado': _texto(fila, 'estado', requerido=False) or 'Confirmada',
+        'notas': _texto(fila, 'notas', requerido=False),
+    }
+
+
+def validar_pago(fila):
+    return {
+        'id': _entero(fila, 'id', requerido=False, minimo=1),
+        'reserva_id': _entero(fila, 'reserva_id', minimo=1),
+        'cliente_id': _entero(fila, 'cliente_id', minimo=1),
+        'monto': _numero(fila, 'monto'),
+        'fecha': _fecha(fila, 'fecha'),
+        'metodo': _texto(fila, 'metodo'),
+        'estado': _texto(fila, 'estado', requerido=False) or 'Pendiente',
+        'referencia': _texto(fila, 'referencia', requerido=False),
+        'notas': _texto(fila, 'notas', requerido=False),
+    }
+
+
+def validar_habitacion(fila):
+    return {
+        'id': _entero(fila, 'id', requerido=False, minimo=1),
+        'numero': _texto(fila, 'numero'),
+        'tipo': _texto(fila, 'tipo'),
+        'capacidad': _entero(fila, 'capacidad', minimo=1),
+        'precio_noche': _numero(fila, 'precio_noche'),
+        'estado': _texto(fila, 'estado', requerido=False) or 'Disponible',
+        'amenidades': _texto(fila, 'amenidades', requerido=False),
+        'descripcion': _texto(fila, 'descripcion', requerido=False),
+    }
+
+
+def validar_usuario(fila):
+    password = str(fila.get('password') or '')
+    # Solo se aceptan contraseñas ya cifradas con werkzeug (método:params$sal$hash)
+    if not re.match(r'^(pbkdf2|scrypt):[^$]+\$[^$]+\$[0-9a-f]+$', password):
+        raise ValueError("password sin hash de werkzeug")
+    username = _texto(fila, 'username')
+    if len(username) < 3:
+        raise ValueError("username con menos de 3 caracteres")
+    return {
+        'id': _entero(fila, 'id', requerido=False, minimo=1),
+        'username': username,
+        'password': password,
+    }